@@ -11,6 +11,99 @@ MAX_POINTS = int(os.getenv("MAX_POINTS"))
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
 DEBUG_CARDS = os.getenv("DEBUG_CARDS", "False") == "True"
+REDIS_URL = f"redis://:{REDIS_PASSWORD}@{REDIS_HOST}:6379/0"
+
+# Matchmaking queue: "memory" (single process) or "redis" (shared)
+MATCHMAKING_BACKEND = os.getenv("MATCHMAKING_BACKEND", "memory")
+MATCHMAKING_STALE_SECONDS = int(os.getenv("MATCHMAKING_STALE_SECONDS", "30"))
+
+# Matchmaking pairs every tick the players of the same region within a
+# rating window that grows with the wait (any region and rating after the
+# max wait)
+MATCHMAKING_TICK_SECONDS = float(os.getenv("MATCHMAKING_TICK_SECONDS", "0.25"))
+MATCHMAKING_DEFAULT_RATING = int(os.getenv("MATCHMAKING_DEFAULT_RATING", "1000"))
+MATCHMAKING_DEFAULT_REGION = os.getenv("MATCHMAKING_DEFAULT_REGION", "default")
+MATCHMAKING_RATING_WINDOW = int(os.getenv("MATCHMAKING_RATING_WINDOW", "100"))
+MATCHMAKING_WINDOW_GROWTH = float(os.getenv("MATCHMAKING_WINDOW_GROWTH", "20"))
+MATCHMAKING_MAX_WAIT_SECONDS = float(os.getenv("MATCHMAKING_MAX_WAIT_SECONDS", "60"))
+
+# Players without an opponent after these seconds play against a bot of
+# the process (0 disables the bots, players get a timeout after the max wait)
+MATCHMAKING_BOT_SECONDS = float(os.getenv("MATCHMAKING_BOT_SECONDS", "20"))
+
+# Bots leave (and the room is closed) when the player does not join their
+# room in these seconds
+MATCHMAKING_BOT_JOIN_SECONDS = float(os.getenv("MATCHMAKING_BOT_JOIN_SECONDS", "30"))
+
+# Rooms state: "memory" (single process) or "redis" (shared)
+ROOM_STORE_BACKEND = os.getenv("ROOM_STORE_BACKEND", "memory")
+ROOM_STORE_TTL = int(os.getenv("ROOM_STORE_TTL", "3600"))
+
+# Rooms registry: "memory" (single process) or "redis" (shared). Rooms
+# expire after the seconds without activity of their state
+ROOM_REGISTRY_BACKEND = os.getenv("ROOM_REGISTRY_BACKEND", "memory")
+ROOM_IDLE_SECONDS = int(os.getenv("ROOM_IDLE_SECONDS", "600"))
+ROOM_FINISHED_SECONDS = int(os.getenv("ROOM_FINISHED_SECONDS", "60"))
+ROOM_REGISTRY_MAX_ROOMS = int(os.getenv("ROOM_REGISTRY_MAX_ROOMS", "100000"))
+
+# Room affinity: name of this worker in the shards ring file written by the
+# run_shards command (no ring file disables sharding)
+SHARD_NAME = os.getenv("SHARD_NAME", "")
+SHARD_RING_FILE = os.getenv("SHARD_RING_FILE", "")
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+SHARD_RELOAD_SECONDS = float(os.getenv("SHARD_RELOAD_SECONDS", "1"))
+
+# Admission control: open websockets per worker, messages per second (and
+# burst) per connection, max frame bytes and max username length
+MAX_SOCKETS = int(os.getenv("MAX_SOCKETS", "10000"))
+MESSAGE_RATE = float(os.getenv("MESSAGE_RATE", "10"))
+MESSAGE_BURST = int(os.getenv("MESSAGE_BURST", "20"))
+MAX_FRAME_BYTES = int(os.getenv("MAX_FRAME_BYTES", "512"))
+MAX_USERNAME_LENGTH = int(os.getenv("MAX_USERNAME_LENGTH", "32"))
+
+# Match tickets: signature key (SECRET_KEY when empty) and validity seconds
+TICKET_SECRET = os.getenv("TICKET_SECRET", "")
+TICKET_SECONDS = int(os.getenv("TICKET_SECONDS", "3600"))
+
+# Timers: tick of the timer wheel, and seconds without room events before
+# a player's pending move is played for them (0 disables turn deadlines)
+TIMER_TICK_SECONDS = float(os.getenv("TIMER_TICK_SECONDS", "0.1"))
+TURN_SECONDS = float(os.getenv("TURN_SECONDS", "30"))
+
+# Spectators get a snapshot of the room at most every these seconds
+SPECTATOR_TICK_SECONDS = float(os.getenv("SPECTATOR_TICK_SECONDS", "0.5"))
+
+# Match engine: "store" (every message updates the room store) or "actor"
+# (one task per room keeps the state in memory, needs room affinity)
+MATCH_ENGINE = os.getenv("MATCH_ENGINE", "store")
+
+# Logs: level of the "match" loggers and fraction of per message records
+MATCH_LOG_LEVEL = os.getenv("MATCH_LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+# Live profiling: fraction of the rooms whose messages are profiled (0
+# disables it), stack sampling interval, and directory of the collapsed
+# stacks, rewritten every PROFILE_FLUSH_SECONDS (see match.profiling)
+PROFILE_ROOM_RATE = float(os.getenv("PROFILE_ROOM_RATE", "0"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", BASE_DIR / "profiles")
+PROFILE_FLUSH_SECONDS = float(os.getenv("PROFILE_FLUSH_SECONDS", "60"))
+
+# Rooms events journal: "file" (local segments), "redis" (streams) or "none"
+JOURNAL_BACKEND = os.getenv("JOURNAL_BACKEND", "file")
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", BASE_DIR / "journal")
+JOURNAL_FLUSH_SECONDS = float(os.getenv("JOURNAL_FLUSH_SECONDS", "0.1"))
+JOURNAL_BATCH_SIZE = int(os.getenv("JOURNAL_BATCH_SIZE", "256"))
+JOURNAL_SEGMENT_BYTES = int(os.getenv("JOURNAL_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+JOURNAL_MAX_SEGMENTS = int(os.getenv("JOURNAL_MAX_SEGMENTS", "16"))
+
+# Finished games: "db" (saved in batches by a background thread) or "none",
+# and leaderboard of the best players, cached and rebuilt after each batch
+RESULTS_BACKEND = os.getenv("RESULTS_BACKEND", "db")
+RESULTS_FLUSH_SECONDS = float(os.getenv("RESULTS_FLUSH_SECONDS", "1"))
+RESULTS_BATCH_SIZE = int(os.getenv("RESULTS_BATCH_SIZE", "100"))
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "100"))
+LEADERBOARD_CACHE_SECONDS = int(os.getenv("LEADERBOARD_CACHE_SECONDS", "300"))
 
 
 # Quick-start development settings - unsuitable for production
@@ -79,6 +172,22 @@ DATABASES = {
     }
 }
 
+# Cache: "memory" (single process) or "redis" (shared)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+if CACHE_BACKEND == "redis":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -123,11 +232,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Setup websockets
 ASGI_APPLICATION = "core.asgi.application"
+
+# Channel layer: "redis", or "hybrid" (opt-in: in-process delivery between
+# sockets of the same process, Redis otherwise, see match.layers)
+CHANNEL_LAYER = os.getenv("CHANNEL_LAYER", "redis")
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "BACKEND": "match.layers.HybridChannelLayer"
+        if CHANNEL_LAYER == "hybrid" else "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [(f"redis://:{REDIS_PASSWORD}@{REDIS_HOST}:6379/0")],
+            "hosts": [REDIS_URL],
         },
     },
 }
\ No newline at end of file
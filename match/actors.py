@@ -0,0 +1,164 @@
+import asyncio
+
+from .game import init_room, is_game_over
+from .journal import apply_message, get_journal
+from .results import get_results_writer
+from .rooms import WAITING, get_room_registry, room_group_name
+from .state import RoomState
+from .store import get_room_state_store
+
+# Room group name -> actor serving it in the current process
+room_actors = {}
+
+
+class RoomActor:
+    """ Asyncio task that owns the state of one room
+
+    Consumers of the room put their messages in the actor inbox, and the
+    actor applies them one by one to the room data it keeps in memory, so
+    game transitions never race and need no store round trips. The room
+    data is saved in the room store only when players join, on round
+    boundaries and when the actor stops.
+
+    Both players of the room must be connected to the same process.
+    """
+
+    def __init__(self, room_name: str, previous: asyncio.Task = None):
+        self.room_name = room_name
+        self.room_group_name = room_group_name(room_name)
+        self.store = get_room_state_store()
+        self.journal = get_journal()
+        self.registry = get_room_registry()
+        self.results = get_results_writer()
+        self.inbox = asyncio.Queue()
+        self.room_data = None
+        self.members = 0
+
+        # Actor of the same room that is still saving its last snapshot
+        self.previous = previous
+        self.task = asyncio.create_task(self.run())
+
+    async def ask(self, consumer, message_type: str, message_value) -> bool:
+        """ Queue a message of a consumer and wait until it is applied
+
+        Args:
+            consumer (MatchConsumer): consumer that received the message.
+                The actor sends it its direct messages.
+            message_type (str): "connect", "state" or a websocket message
+                type
+            message_value: message value
+
+        Returns:
+            tuple[bool, list[dict]]: (True if the consumer must leave the
+            room, journal events of the message). True if the room is full
+            for "connect", a copy of the room data for "state"
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        self.inbox.put_nowait((consumer, message_type, message_value, future))
+        return await future
+
+    def stop(self):
+        """ Stop the actor after the queued messages """
+        self.inbox.put_nowait(None)
+
+    async def save(self):
+        """ Save a snapshot of the room data in the room store. Finished
+        games are removed from the store by the room registry instead """
+
+        if is_game_over(self.room_data)[0]:
+            return
+        await self.store.update(
+            self.room_group_name, lambda _: (self.room_data, None)
+        )
+
+    async def handle(self, consumer, message_type: str, message_value) -> bool:
+        """ Apply a message to the room data and send the resulting messages
+
+        Returns:
+            tuple[bool, list[dict]]: (True if the consumer must leave the
+            room, journal events of the message)
+        """
+
+        if message_type == "connect":
+            return len(self.room_data.players) > 2
+
+        if message_type == "state":
+            return RoomState.decode(self.room_data.encode())
+
+        round_number = self.room_data.round
+        players = len(self.room_data.players)
+
+        self.room_data, (messages, disconnect, events) = apply_message(
+            self.room_data, consumer.username, message_type, message_value
+        )
+        self.journal.append(self.room_group_name, events)
+        await consumer.__send_messages__(messages)
+        await self.registry.observe(consumer.room_name, messages, events)
+        self.results.record(consumer.room_name, events)
+
+        # Save snapshot on joins and round boundaries
+        if disconnect or round_number != self.room_data.round \
+                or players != len(self.room_data.players):
+            await self.save()
+
+        return disconnect, events
+
+    async def run(self):
+        if self.previous is not None:
+            await self.previous
+
+        # Restore the last snapshot of the room, or replay its journal.
+        # Waiting rooms were just allocated: a journal of the same name
+        # belongs to an older room
+        room_data = await self.store.get(self.room_group_name)
+        if room_data is None and await self.registry.state(self.room_name) != WAITING:
+            room_data = await self.journal.replay(self.room_group_name)
+        self.room_data, _ = init_room(room_data)
+
+        try:
+            while True:
+                item = await self.inbox.get()
+                if item is None:
+                    break
+
+                consumer, message_type, message_value, future = item
+                try:
+                    future.set_result(
+                        await self.handle(consumer, message_type, message_value)
+                    )
+                except Exception as error:
+                    future.set_exception(error)
+
+            await self.save()
+        finally:
+            if room_actors.get(self.room_group_name) is self:
+                del room_actors[self.room_group_name]
+
+
+def acquire_room_actor(room_name: str) -> RoomActor:
+    """ Get the actor of a room, starting it if needed
+
+    Args:
+        room_name (str): Room name
+
+    Returns:
+        RoomActor: running actor, release it with release_room_actor
+    """
+
+    actor = room_actors.get(room_group_name(room_name))
+    if actor is None or actor.members == 0:
+        previous = actor.task if actor else None
+        actor = RoomActor(room_name, previous)
+        room_actors[actor.room_group_name] = actor
+
+    actor.members += 1
+    return actor
+
+
+def release_room_actor(actor: RoomActor):
+    """ Release an actor, stopping it when its room has no consumers """
+
+    actor.members -= 1
+    if actor.members == 0:
+        actor.stop()
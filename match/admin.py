@@ -1,3 +1,29 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Match, PlayerResult, PlayerStats
+
+
+class PlayerResultInline(admin.TabularInline):
+    model = PlayerResult
+    extra = 0
+
+
+@admin.register(Match)
+class MatchAdmin(admin.ModelAdmin):
+    list_display = ("room_name", "winner", "rounds", "finished_at")
+    list_filter = ("finished_at",)
+    search_fields = ("room_name", "winner")
+    inlines = (PlayerResultInline,)
+
+
+@admin.register(PlayerResult)
+class PlayerResultAdmin(admin.ModelAdmin):
+    list_display = ("username", "match", "points", "won")
+    search_fields = ("username",)
+
+
+@admin.register(PlayerStats)
+class PlayerStatsAdmin(admin.ModelAdmin):
+    list_display = ("username", "games", "wins", "points")
+    search_fields = ("username",)
+    ordering = ("-wins", "-points", "username")
@@ -0,0 +1,153 @@
+import time
+
+from django.conf import settings
+
+from .binary import decode_message
+from .frames import loads_message
+from .metrics import REJECTED
+from .state import CARDS
+
+# Open websockets of this process (every consumer)
+open_sockets = 0
+
+# Websocket close codes of rejected frames
+FRAME_TOO_BIG_CODE = 1009
+
+
+class MessageRejected(ValueError):
+    """ Client frame refused by admission control """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def acquire_socket(consumer: str) -> bool:
+    """ Count a new websocket, unless the process has
+    settings.MAX_SOCKETS open already
+
+    Args:
+        consumer (str): consumer name, for the rejections counter
+
+    Returns:
+        bool: whether the socket can be accepted
+    """
+
+    global open_sockets
+    if open_sockets >= settings.MAX_SOCKETS:
+        REJECTED.inc(consumer=consumer, reason="max sockets")
+        return False
+    open_sockets += 1
+    return True
+
+
+def release_socket():
+    """ Stop counting an accepted websocket """
+
+    global open_sockets
+    open_sockets -= 1
+
+
+class TokenBucket:
+    """ Rate limit of settings.MESSAGE_RATE messages per second, with
+    bursts of up to settings.MESSAGE_BURST messages """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float = None, capacity: int = None):
+        self.rate = settings.MESSAGE_RATE if rate is None else rate
+        self.capacity = settings.MESSAGE_BURST if capacity is None else capacity
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        """ Use a token, False when the bucket is empty """
+
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def valid_username(value) -> bool:
+    return isinstance(value, str) \
+        and 0 < len(value) <= settings.MAX_USERNAME_LENGTH
+
+
+def valid_card(value) -> bool:
+    return isinstance(value, int) and 0 <= value < len(CARDS)
+
+
+def valid_resume(value) -> bool:
+    return isinstance(value, dict) \
+        and valid_username(value.get("username")) \
+        and isinstance(value.get("seq"), int) and value["seq"] >= 0
+
+
+# Message type -> validation of the message value
+MATCH_SCHEMAS = {
+    "username": valid_username,
+    "use card": valid_card,
+    "more cards": lambda value: True,
+    "middle card": lambda value: True,
+    "resume": valid_resume,
+}
+
+
+class MessageAdmission:
+    """ Checks of the frames of a websocket, before they reach the room:
+    frame size, rate limit and message schema """
+
+    def __init__(self, consumer: str, schemas: dict):
+        """
+        Args:
+            consumer (str): consumer name, for the rejections counter
+            schemas (dict): message type -> value validation of the
+                messages the consumer accepts
+        """
+
+        self.consumer = consumer
+        self.schemas = schemas
+        self.bucket = TokenBucket()
+
+    def reject(self, reason: str):
+        REJECTED.inc(consumer=self.consumer, reason=reason)
+        raise MessageRejected(reason)
+
+    def admit(self, text_data: str = None, bytes_data: bytes = None) -> tuple[str, object]:
+        """ Decode a client frame, when it is admitted
+
+        Raises:
+            MessageRejected: frame too big ("frame size"), over the rate
+                limit ("rate limit"), not decodable ("malformed") or not
+                following the message schemas ("schema")
+
+        Returns:
+            tuple[str, object]: (message_type, message_value)
+        """
+
+        data = bytes_data if bytes_data is not None else text_data or ""
+        if len(data) > settings.MAX_FRAME_BYTES:
+            self.reject("frame size")
+
+        if not self.bucket.take():
+            self.reject("rate limit")
+
+        try:
+            if bytes_data is not None:
+                message_type, message_value = decode_message(bytes_data)
+            else:
+                message_type, message_value = loads_message(text_data)
+        except (ValueError, KeyError, TypeError):
+            self.reject("malformed")
+
+        validate = self.schemas.get(message_type) \
+            if isinstance(message_type, str) else None
+        if validate is None or not validate(message_value):
+            self.reject("schema")
+        return message_type, message_value
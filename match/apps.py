@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MatchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'match'
+
+    def ready(self):
+        from .logs import setup_logging
+        setup_logging()
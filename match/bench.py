@@ -0,0 +1,404 @@
+import asyncio
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from channels.layers import channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test.utils import override_settings
+from django.urls import re_path
+
+from . import journal, matchmaker, queues, results, rooms, store, timers
+from .binary import MESSAGE_TYPES
+from .consumers import MatchConsumer, MatchMatchmakerConsumer
+from .profiling import StackSampler
+from .tickets import TicketAuthMiddleware
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+
+# Frames that close a turn for each player (protocol version 1)
+TURN_END_TYPES = {"turn winner", "points", "game winner"}
+
+
+def turn_end_type(message: dict) -> str:
+    """ Type of the frame that closed a turn, "points" and "game winner"
+    keys of a version 2 "turn result" frame count as those frames """
+
+    if message["type"] != "turn result":
+        return message["type"]
+    for end_type in ("game winner", "points"):
+        if end_type in message["value"]:
+            return end_type
+    return "turn winner"
+
+
+class CountingRoomStateStore(store.MemoryRoomStateStore):
+    """ Memory store that counts its operations """
+
+    def __init__(self):
+        super().__init__()
+        self.operations = 0
+
+    async def load(self, room):
+        self.operations += 1
+        return await super().load(room)
+
+    async def compare_and_set(self, room, version, data):
+        self.operations += 1
+        return await super().compare_and_set(room, version, data)
+
+
+class CountingMatchmakingQueue(queues.MemoryMatchmakingQueue):
+    """ Memory queue that counts its operations """
+
+    def __init__(self):
+        super().__init__()
+        self.operations = 0
+
+    async def push(self, channel_name, rating=None, region=None, username=""):
+        self.operations += 1
+        await super().push(channel_name, rating, region, username)
+
+    async def pop_pairs(self):
+        self.operations += 1
+        return await super().pop_pairs()
+
+    async def cancel(self, channel_name):
+        self.operations += 1
+        await super().cancel(channel_name)
+
+
+class BenchRecorder:
+    """ Latency, store operations and allocations per message type """
+
+    def __init__(self):
+        self.latencies = {}
+        self.operations = {}
+        self.allocations = {}
+
+    def add(self, message_type: str, seconds: float, operations: int,
+            allocated: int = None):
+        self.latencies.setdefault(message_type, []).append(seconds)
+        self.operations.setdefault(message_type, []).append(operations)
+        if allocated is not None:
+            self.allocations.setdefault(message_type, []).append(allocated)
+
+    def summary(self) -> dict:
+        """ Percentiles in microseconds, mean operations and allocated
+        bytes per message type """
+
+        summary = {}
+        for message_type, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            summary[message_type] = {
+                "count": len(latencies),
+                "p50_us": percentile(latencies, 50) * 1e6,
+                "p90_us": percentile(latencies, 90) * 1e6,
+                "p99_us": percentile(latencies, 99) * 1e6,
+                "store_ops": statistics.mean(self.operations[message_type]),
+            }
+            if message_type in self.allocations:
+                summary[message_type]["alloc_bytes"] = statistics.mean(
+                    self.allocations[message_type]
+                )
+        return summary
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """ Nearest rank percentile of sorted values """
+
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+@contextlib.asynccontextmanager
+async def measure(recorder: BenchRecorder, counter, message_type: str):
+    """ Record the time, counter operations and (when tracemalloc is
+    tracing) peak allocated bytes of the wrapped block """
+
+    operations = counter.operations
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    allocated = None
+    if tracing:
+        _, peak = tracemalloc.get_traced_memory()
+        allocated = peak - current
+    recorder.add(
+        message_type, seconds, counter.operations - operations, allocated
+    )
+
+
+def build_application(recorder: BenchRecorder, room_store, queue):
+    """ Websocket router with consumers that report to the recorder """
+
+    class BenchMatchConsumer(MatchConsumer):
+        async def receive(self, text_data=None, bytes_data=None):
+            if bytes_data is not None:
+                message_type = MESSAGE_TYPES.get(bytes_data[0], "binary")
+            else:
+                message_type = json.loads(text_data)["type"]
+            async with measure(recorder, room_store, message_type):
+                await super().receive(text_data, bytes_data)
+
+    class BenchMatchmakerConsumer(MatchMatchmakerConsumer):
+        async def connect(self):
+            async with measure(recorder, queue, "matchmaker connect"):
+                await super().connect()
+
+    return TicketAuthMiddleware(URLRouter([
+        re_path(r"ws/pericon/match/(?P<room_name>\w+)/$", BenchMatchConsumer.as_asgi()),
+        re_path(r"ws/pericon/matchmaker/?$", BenchMatchmakerConsumer.as_asgi()),
+    ]))
+
+
+class ScriptedPlayer:
+    """ Websocket client that always plays its first card """
+
+    def __init__(self, application, username: str, protocol_version: int = 1):
+        self.application = application
+        self.username = username
+        self.protocol_version = protocol_version
+        self.cards = []
+        self.communicator = None
+        self.ticket = None
+
+    async def receive_until(self, types: set[str]) -> dict:
+        """ Read frames until one of the given types (keeps the cards) """
+
+        while True:
+            message = json.loads(await self.communicator.receive_from(timeout=5))
+            if message["type"] == "round cards":
+                self.cards = message["value"]
+            if message["type"] in types:
+                return message
+
+    async def find_match(self) -> str:
+        """ Wait in the matchmaker until a room is assigned """
+
+        matchmaker = WebsocketCommunicator(
+            self.application, f"/ws/pericon/matchmaker/?username={self.username}"
+        )
+        await matchmaker.connect()
+        match_start = await matchmaker.receive_json_from(timeout=5)
+        await matchmaker.disconnect()
+        self.username = match_start["username"]
+        self.ticket = match_start["ticket"]
+        return match_start["room_name"]
+
+    async def join(self, room_name: str):
+        self.communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/pericon/match/{room_name}/"
+            f"?v={self.protocol_version}&ticket={self.ticket}"
+        )
+        await self.communicator.connect()
+        await self.send("username", self.username)
+        await self.receive_until({"round cards"})
+
+    async def send(self, message_type: str, message_value):
+        await self.communicator.send_to(text_data=json.dumps({
+            "type": message_type,
+            "value": message_value
+        }))
+
+    async def leave(self):
+        await self.communicator.disconnect()
+
+
+async def play_game(application, game: int, protocol_version: int = 1) -> int:
+    """ Play a full scripted game through the matchmaker
+
+    Returns:
+        int: number of turns played
+    """
+
+    players = [
+        ScriptedPlayer(application, f"bench{game}a", protocol_version),
+        ScriptedPlayer(application, f"bench{game}b", protocol_version),
+    ]
+    end_types = TURN_END_TYPES | {"turn result"}
+    room_names = await asyncio.gather(
+        *(player.find_match() for player in players)
+    )
+
+    # Both players connect together, so the matchmaker pairs them
+    for player in players:
+        await player.join(room_names[0])
+
+    turns = 0
+    while True:
+        for player in players:
+            await player.send("use card", player.cards.pop(0))
+        ends = [
+            turn_end_type(await player.receive_until(end_types))
+            for player in players
+        ]
+        turns += 1
+
+        if "game winner" in ends:
+            break
+
+        # New round
+        if "points" in ends:
+            for player in players:
+                await player.send("more cards", "")
+                await player.receive_until({"round cards"})
+
+    for player in players:
+        await player.leave()
+
+    return turns
+
+
+async def run_games(games: int, seed: int, trace_allocations: bool,
+                    protocol_version: int = 1) -> dict:
+    """ Play the games one after the other and summarize the records """
+
+    random.seed(seed)
+    recorder = BenchRecorder()
+    room_store = CountingRoomStateStore()
+    queue = CountingMatchmakingQueue()
+    store.room_state_store = room_store
+    queues.matchmaking_queue = queue
+    rooms.room_registry = None
+    results.results_writer = None
+    timers.timer_wheel = None
+    matchmaker.matchmaker = None
+    journal_directory = tempfile.TemporaryDirectory()
+    journal.journal = journal.SegmentFileJournal(journal_directory.name)
+    application = build_application(recorder, room_store, queue)
+
+    if trace_allocations:
+        tracemalloc.start()
+
+    turns = 0
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for game in range(games):
+                turns += await play_game(application, game, protocol_version)
+    finally:
+        if trace_allocations:
+            tracemalloc.stop()
+        if journal.journal.flush_task is not None:
+            journal.journal.flush_task.cancel()
+        journal.journal = None
+        journal_directory.cleanup()
+
+    summary = recorder.summary()
+    summary["games"] = {"count": games, "turns": turns}
+    return summary
+
+
+IN_MEMORY_SETTINGS = {
+    "CHANNEL_LAYERS": {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    },
+    "ROOM_STORE_BACKEND": "memory",
+    "MATCHMAKING_BACKEND": "memory",
+    "MATCHMAKING_TICK_SECONDS": 0.001,
+    "MESSAGE_BURST": 10 ** 6,
+    "RESULTS_BACKEND": "none",
+}
+
+
+@contextlib.contextmanager
+def in_memory_backends():
+    """ Play the games with the in-memory channel layer and stores """
+
+    with override_settings(**IN_MEMORY_SETTINGS):
+        channel_layers.backends = {}
+        try:
+            yield
+        finally:
+            store.room_state_store = None
+            queues.matchmaking_queue = None
+            rooms.room_registry = None
+            results.results_writer = None
+            timers.timer_wheel = None
+            matchmaker.matchmaker = None
+
+
+def run_benchmark(games: int = 20, seed: int = 0, protocol_version: int = 1) -> dict:
+    """ Play scripted games with the in-memory channel layer and stores
+
+    Timings come from a first pass, allocations (tracemalloc peak bytes per
+    message) from a second pass, because tracing slows down every call.
+
+    Returns:
+        dict: summary per message type
+    """
+
+    with in_memory_backends():
+        summary = asyncio.run(run_games(games, seed, False, protocol_version))
+        traced = asyncio.run(run_games(games, seed, True, protocol_version))
+
+    for message_type, values in traced.items():
+        if "alloc_bytes" in values:
+            summary[message_type]["alloc_bytes"] = values["alloc_bytes"]
+
+    # Allocations per turn: both players play a card in a turn
+    use_card = summary.get("use card")
+    if use_card and "alloc_bytes" in use_card:
+        summary["games"]["alloc_bytes_per_turn"] = use_card["alloc_bytes"] * 2
+
+    return summary
+
+
+def profile_games(games: int = 20, seed: int = 0, protocol_version: int = 1,
+                  interval: float = 0.001) -> tuple[pstats.Stats, StackSampler]:
+    """ Play scripted games under the profilers
+
+    The stacks are sampled in a first pass and cProfile runs in a second
+    pass, so its overhead is not in the samples.
+
+    Args:
+        interval (float): seconds of CPU time between stack samples
+
+    Returns:
+        tuple[pstats.Stats, StackSampler]: (cProfile stats, sampled stacks)
+    """
+
+    with in_memory_backends():
+        sampler = StackSampler(interval)
+        sampler.start()
+        try:
+            asyncio.run(run_games(games, seed, False, protocol_version))
+        finally:
+            sampler.stop()
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            asyncio.run(run_games(games, seed, False, protocol_version))
+        finally:
+            profile.disable()
+
+    return pstats.Stats(profile), sampler
+
+
+def compare(summary: dict, baseline: dict) -> dict:
+    """ Relative change (%) of each metric against the baseline (counts of
+    messages and turns depend on the games played, not on performance) """
+
+    changes = {}
+    for message_type, values in summary.items():
+        base_values = baseline.get(message_type, {})
+        for metric, value in values.items():
+            base_value = base_values.get(metric)
+            if metric in ("count", "turns") or not base_value:
+                continue
+            changes[f"{message_type} {metric}"] = (value - base_value) / base_value * 100
+    return changes
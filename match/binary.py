@@ -0,0 +1,184 @@
+import struct
+
+from .state import NO_CARD
+
+# Websocket subprotocol of the binary frames
+BINARY_SUBPROTOCOL = "pericon.binary"
+
+# Frame layouts. Every frame starts with a one byte type code, cards are
+# one byte codes (state.CARDS index, NO_CARD_BYTE for no card) and names
+# are utf-8 with a one byte length ("" is a draw). Events with a room
+# sequence number set SEQ_FLAG in the type code, and the uint32 seq follows
+# it:
+#   round cards        count, cards
+#   error              utf-8 message (rest of the frame)
+#   middle card        card
+#   usernames          count, names
+#   turn played cards  count, (name, card) pairs
+#   turn winner        name
+#   round winner       name
+#   points             count, (name, uint16 points) pairs
+#   game winner        name
+#   turn result        frames of the turn, then a middle card frame when
+#                      the turn ended the round
+#   snapshot           usernames, middle card, round cards, turn played
+#                      cards and points (as in their frames), count,
+#                      (name, uint8 turn wins) pairs, uint16 round, uint8 turn
+FRAME_CODES = {
+    "send.round_cards": 1,
+    "send.error": 2,
+    "send.middile_card": 3,
+    "send_usernames": 4,
+    "send.turn_played_cards": 5,
+    "send.turn_winner": 6,
+    "send.round_winner": 7,
+    "send.points": 8,
+    "send.game_winner": 9,
+    "send.turn_result": 10,
+    "send.snapshot": 11,
+}
+
+# Client messages: type code, then "username" utf-8 name, "use card" card,
+# "resume" uint32 last seen seq and utf-8 username
+MESSAGE_TYPES = {
+    1: "username",
+    2: "use card",
+    3: "more cards",
+    4: "middle card",
+    5: "resume",
+}
+
+NO_CARD_BYTE = 0xFF
+SEQ_FLAG = 0x80
+SEQ_FORMAT = struct.Struct("<I")
+POINTS_FORMAT = struct.Struct("<H")
+ROUND_FORMAT = struct.Struct("<HB")
+
+
+def pack_card(card: int) -> int:
+    return NO_CARD_BYTE if card == NO_CARD else card
+
+
+def pack_name(name: str) -> bytes:
+    data = name.encode()[:255]
+    return bytes((len(data),)) + data
+
+
+def pack_cards(cards: list[int]) -> bytes:
+    return bytes((len(cards), *map(pack_card, cards)))
+
+
+def pack_names(names: list[str]) -> bytes:
+    return bytes((len(names),)) + b"".join(map(pack_name, names))
+
+
+def pack_played_cards(played_cards: list[dict]) -> bytes:
+    return bytes((len(played_cards),)) + b"".join(
+        pack_name(played["player"]) + bytes((pack_card(played["card"]),))
+        for played in played_cards
+    )
+
+
+def pack_points(points: list[dict]) -> bytes:
+    return bytes((len(points),)) + b"".join(
+        pack_name(player["player"]) + POINTS_FORMAT.pack(player["points"])
+        for player in points
+    )
+
+
+def encode_event(event: dict) -> bytes:
+    """ Binary frame of a channel layer event (see FRAME_CODES)
+
+    Args:
+        event (dict): event of game.handle_message
+
+    Returns:
+        bytes: frame, with the event "seq" when it has one
+    """
+
+    event_type = event["type"]
+    if "seq" in event:
+        code = bytes((FRAME_CODES[event_type] | SEQ_FLAG,)) \
+            + SEQ_FORMAT.pack(event["seq"])
+    else:
+        code = bytes((FRAME_CODES[event_type],))
+    value = event["value"]
+
+    if event_type == "send.round_cards":
+        return code + pack_cards(value)
+
+    if event_type == "send.error":
+        return code + value.encode()
+
+    if event_type == "send.middile_card":
+        return code + bytes((pack_card(value),))
+
+    if event_type == "send_usernames":
+        return code + pack_names(value)
+
+    if event_type == "send.turn_played_cards":
+        return code + pack_played_cards(value)
+
+    if event_type == "send.points":
+        return code + pack_points(value)
+
+    if event_type == "send.snapshot":
+        return code + b"".join((
+            pack_names(value["usernames"]),
+            bytes((pack_card(value["middle_card"]),)),
+            pack_cards(value["round_cards"]),
+            pack_played_cards(value["turn_played_cards"]),
+            pack_points(value["points"]),
+            bytes((len(value["turn_wins"]),)),
+            *(pack_name(player["player"]) + bytes((player["wins"],))
+              for player in value["turn_wins"]),
+            ROUND_FORMAT.pack(value["round"], value["turn"]),
+        ))
+
+    if event_type == "send.turn_result":
+        frame = code + b"".join(encode_event(turn_event) for turn_event in value)
+        if "middle_card" in event:
+            frame += encode_event({
+                "type": "send.middile_card", "value": event["middle_card"]
+            })
+        return frame
+
+    # Winners
+    return code + pack_name("" if value == "draw" else value)
+
+
+def decode_message(data: bytes) -> tuple[str, object]:
+    """ Message type and value of a binary client frame
+
+    Args:
+        data (bytes): frame (see MESSAGE_TYPES)
+
+    Raises:
+        ValueError: unknown or truncated frame
+
+    Returns:
+        tuple[str, object]: (message_type, message_value), with a card code
+        as the "use card" value and {"username", "seq"} as the "resume" one
+    """
+
+    if not data or data[0] not in MESSAGE_TYPES:
+        raise ValueError("Unknown binary message")
+    message_type = MESSAGE_TYPES[data[0]]
+
+    if message_type == "username":
+        return message_type, data[1:].decode()
+
+    if message_type == "use card":
+        if len(data) != 2:
+            raise ValueError("Binary use card message without a card")
+        return message_type, data[1]
+
+    if message_type == "resume":
+        if len(data) < 1 + SEQ_FORMAT.size:
+            raise ValueError("Binary resume message without a seq")
+        seq, = SEQ_FORMAT.unpack_from(data, 1)
+        return message_type, {
+            "username": data[1 + SEQ_FORMAT.size:].decode(), "seq": seq
+        }
+
+    return message_type, ""
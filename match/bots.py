@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+from django.conf import settings
+
+from .metrics import BOT_SEATS
+from .rooms import get_room_registry
+from .rules import card_strength
+from .state import CARDS_CODES, NO_CARD, card_name
+from .timers import get_timer_wheel
+
+# Username prefix of the bots
+BOT_PREFIX = "bot-"
+
+# Bots running in this process
+bots = set()
+
+
+def choose_card(hand: list[int], middle_card: int) -> int:
+    """ Card the bot plays: the strongest one for the trump of the round """
+    return max(hand, key=lambda card: card_strength(middle_card, card))
+
+
+class BotPlayer:
+    """ Player of a room that runs in the current process
+
+    The bot is a MatchConsumer whose websocket is a pair of queues, so it
+    joins the room group and sends "username", "use card" and "more cards"
+    like any client (protocol version 2), and costs one consumer task.
+    When the player does not join in settings.MATCHMAKING_BOT_JOIN_SECONDS,
+    the bot leaves and the room is finished (its ticket is of no use).
+    """
+
+    def __init__(self, room_name: str, username: str):
+        self.room_name = room_name
+        self.username = username
+
+        # ASGI messages for the consumer
+        self.inbox = asyncio.Queue()
+
+        self.usernames = []
+        self.hand = []
+        self.middle_card = NO_CARD
+        self.played = False
+        self.abandoned = False
+
+    async def run(self):
+        # The consumers module imports the matchmaker, which starts the bots
+        from .consumers import MatchConsumer
+
+        application = MatchConsumer.as_asgi()
+        scope = {
+            "type": "websocket",
+            "path": f"/ws/pericon/match/{self.room_name}/",
+            "query_string": b"v=2",
+            "headers": [],
+            "subprotocols": [],
+            "url_route": {"args": (), "kwargs": {"room_name": self.room_name}},
+            # Bots run in the process, they skip the tickets middleware
+            "ticket": (self.room_name, self.username),
+        }
+        self.inbox.put_nowait({"type": "websocket.connect"})
+        join_timer = get_timer_wheel().schedule(
+            settings.MATCHMAKING_BOT_JOIN_SECONDS, self.join_deadline
+        )
+
+        BOT_SEATS.inc()
+        try:
+            await application(scope, self.inbox.get, self.receive_frame)
+        finally:
+            BOT_SEATS.dec()
+            join_timer.cancel()
+
+        # Nobody can join the room anymore
+        if self.abandoned:
+            await get_room_registry().finish(self.room_name)
+
+    def join_deadline(self):
+        """ Leave the room when the player did not join it """
+
+        if len(self.usernames) < 2:
+            self.abandoned = True
+            self.leave()
+
+    def send(self, message_type: str, message_value):
+        self.inbox.put_nowait({"type": "websocket.receive", "text": json.dumps({
+            "type": message_type,
+            "value": message_value,
+        })})
+
+    def leave(self):
+        self.inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+    async def receive_frame(self, message: dict):
+        """ Play from the frames sent by the consumer """
+
+        if message["type"] == "websocket.accept":
+            self.send("username", self.username)
+            return
+
+        if message["type"] == "websocket.close":
+            self.leave()
+            return
+
+        frame = json.loads(message["text"])
+        value = frame.get("value")
+
+        if frame["type"] == "usernames":
+            self.usernames = value
+        elif frame["type"] == "middle card":
+            self.middle_card = CARDS_CODES.get(value, NO_CARD)
+        elif frame["type"] == "round cards":
+            self.hand = [CARDS_CODES[card] for card in value]
+            self.played = False
+        elif frame["type"] == "turn result":
+            self.played = False
+            if "middle card" in value:
+                self.middle_card = CARDS_CODES[value["middle card"]]
+            if "game winner" in value:
+                self.leave()
+                return
+            if "points" in value:
+                self.send("more cards", "")
+                return
+        elif frame["type"] == "error":
+            self.leave()
+            return
+
+        self.play()
+
+    def play(self):
+        """ Play a card when both players are in the room and the bot did
+        not play the current turn yet """
+
+        if len(self.usernames) < 2 or not self.hand or self.played \
+                or self.middle_card == NO_CARD:
+            return
+
+        card = choose_card(self.hand, self.middle_card)
+        self.hand.remove(card)
+        self.played = True
+        self.send("use card", card_name(card))
+
+
+def start_bot(room_name: str) -> BotPlayer:
+    """ Start a bot in a room of the current process
+
+    Args:
+        room_name (str): room name
+
+    Returns:
+        BotPlayer: running bot
+    """
+
+    bot = BotPlayer(room_name, f"{BOT_PREFIX}{room_name}")
+    task = asyncio.create_task(bot.run())
+    bots.add(task)
+    task.add_done_callback(bots.discard)
+    return bot
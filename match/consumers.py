@@ -1,499 +1,678 @@
-import json
-import random
-import string
+import logging
+import secrets
+import time
 
-from collections import deque
+from urllib.parse import parse_qs
 
-from django.core.cache import cache
 from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 
-# A global set to track active room names
-waiting_queue = deque()
+from .actors import acquire_room_actor, release_room_actor
+from .admission import (
+    FRAME_TOO_BIG_CODE, MATCH_SCHEMAS, MessageAdmission, MessageRejected,
+    acquire_socket, release_socket, valid_username,
+)
+from .binary import BINARY_SUBPROTOCOL
+from .bots import BOT_PREFIX
+from .frames import (
+    BINARY_VERSION, JSON_VERSIONS, PROTOCOL_VERSIONS, dumps, event_frames,
+    with_frames,
+)
+from .game import handle_message, init_room, snapshot
+from .journal import apply_message, get_journal
+from .logs import sampled_logger
+from .metrics import (
+    ACTIVE_ROOMS, GROUP_DELIVERIES, GROUP_SENDS,
+    HANDLER_SECONDS, OPEN_SOCKETS, QUEUE_WAIT_SECONDS, REJECTED,
+    ROOMS_EXPIRED, TURN_TIMEOUTS,
+)
+from .matchmaker import get_matchmaker
+from .profiling import get_room_profiler
+from .queues import get_matchmaking_queue
+from .results import get_results_writer
+from .rooms import (
+    ABANDONED, FINISHED, WAITING, get_room_registry, room_group_name,
+)
+from .shards import SHARD_REDIRECT_CODE, get_shard_map
+from .spectators import unwatch_room, watch_room
+from .store import get_room_state_store
+from .tickets import issue_ticket
+from .timers import get_timer_wheel
+
+logger = logging.getLogger(__name__)
+
+# Room group name -> websockets of the room in this process
+room_sockets = {}
+
+# Room group name -> expiry timer of the rooms left by every player
+idle_rooms = {}
+
+# (room group name, username) -> consumer of a player that left a game in
+# progress, it plays their moves when the room waits for them
+vacant_seats = {}
+
+MATCH_TIMEOUT_FRAME = dumps({"error": "No hay jugadores disponibles"})
+
+
+def protocol_version(scope: dict) -> int:
+    """ Protocol version of a websocket: binary when the client offers the
+    binary subprotocol, else the json version requested in the query string
+    (1 by default) """
+
+    if BINARY_SUBPROTOCOL in scope.get("subprotocols", []):
+        return BINARY_VERSION
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    try:
+        version = int(query.get("v", ["1"])[0])
+    except ValueError:
+        return JSON_VERSIONS[0]
+    return version if version in JSON_VERSIONS else JSON_VERSIONS[0]
+
+
+def matchmaking_profile(scope: dict) -> tuple[int | None, str | None]:
+    """ Rating and region of a player, from the "rating" and "region" query
+    string parameters
+
+    Returns:
+        tuple[int | None, str | None]: (rating, region), None when missing
+    """
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    try:
+        rating = int(query["rating"][0])
+    except (KeyError, ValueError):
+        rating = None
+    region = query.get("region", [None])[0]
+    if region is not None:
+        region = region[:16]
+    return rating, region
+
+
+def matchmaking_username(scope: dict) -> str:
+    """ Username of a player, from the "username" query string parameter
+    (a random one when it is missing or not valid) """
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    username = query.get("username", [""])[0]
+    if not valid_username(username) or username.startswith(BOT_PREFIX):
+        username = f"user{secrets.randbelow(10 ** 6)}"
+    return username
+
+
+async def expire_idle_room(room_name: str):
+    """ Drop the state of an abandoned room nobody came back to """
+
+    group_name = room_group_name(room_name)
+    idle_rooms.pop(group_name, None)
+    if group_name in room_sockets:
+        return
+    if await get_room_registry().state(room_name) != ABANDONED:
+        return
+
+    await get_room_state_store().delete(group_name)
+    ROOMS_EXPIRED.inc()
 
 
 class MatchMatchmakerConsumer(AsyncWebsocketConsumer):
 
     async def connect(self):
-        # Add user to the waiting queue
-        waiting_queue.append(self.channel_name)
-        print(f"User {self.channel_name} added to the queue")
-
-        # Send a message to the user that they are in the queue
-        await self.accept()
+        # Refuse the handshake when the worker is full
+        self.admitted = acquire_socket("matchmaker")
+        if not self.admitted:
+            await self.close()
+            return
 
-        # Check if there are enough users in the queue to start a match
-        if len(waiting_queue) >= 2:
-            # Get the first two users from the queue
-            user1 = waiting_queue.popleft()
-            user2 = waiting_queue.popleft()
-
-            # Get active rooms from django cache
-            active_rooms = cache.get("active_rooms", set())
-
-            # Create a unique room name for the match
-            characters = string.ascii_lowercase
-            while True:
-                room_name = ''.join(random.choice(characters)
-                                    for _ in range(6))
-                if room_name not in active_rooms:
-                    active_rooms.add(room_name)
-                    break
-
-            # Create a new room group
-            await self.channel_layer.group_add(room_name, user1)
-            await self.channel_layer.group_add(room_name, user2)
-
-            # Send a message to the users that the match has started
-            await self.channel_layer.group_send(
-                room_name, {"type": "send.match_start", "room_name": room_name}
+        # Players only wait in the matchmaker, they send no messages
+        self.admission = MessageAdmission("matchmaker", {})
+
+        with HANDLER_SECONDS.time(type="matchmaker connect"):
+
+            # Add user to the waiting queue
+            self.queue = get_matchmaking_queue()
+            self.matchmaker = get_matchmaker()
+            self.queued_at = time.monotonic()
+            self.username = matchmaking_username(self.scope)
+            rating, region = matchmaking_profile(self.scope)
+            await self.queue.push(self.channel_name, rating, region, self.username)
+            logger.debug("User %s added to the queue", self.channel_name)
+
+            # Send a message to the user that they are in the queue
+            await self.accept()
+            OPEN_SOCKETS.inc(consumer="matchmaker")
+
+            # Keep the queue entry alive while the user waits, the
+            # matchmaker pairs the queue periodically
+            self.timers = get_timer_wheel()
+            self.heartbeat = self.timers.schedule(
+                self.queue.stale_seconds / 3, self.__heartbeat__
             )
+            self.matchmaker.join()
+
+    async def __heartbeat__(self):
+        """ Refresh the queue entry, so it is not reaped as stale """
+
+        self.heartbeat = self.timers.schedule(
+            self.queue.stale_seconds / 3, self.__heartbeat__
+        )
+        await self.queue.touch(self.channel_name)
 
     async def disconnect(self, close_code):
+        if not self.admitted:
+            return
+        release_socket()
+
         # Remove user from the waiting queue
-        if self.channel_name in waiting_queue:
-            waiting_queue.remove(self.channel_name)
+        self.heartbeat.cancel()
+        self.matchmaker.leave()
+        await self.queue.cancel(self.channel_name)
+        OPEN_SOCKETS.dec(consumer="matchmaker")
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # Count (and drop) the frames of the client
+        try:
+            self.admission.admit(text_data, bytes_data)
+        except MessageRejected as error:
+            if error.reason == "frame size":
+                await self.close(code=FRAME_TOO_BIG_CODE)
 
     # Receive message from room group
     async def send_match_start(self, event):
-        room_name = event["room_name"]
+        GROUP_DELIVERIES.inc(type="send.match_start")
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - self.queued_at)
 
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({"room_name": room_name}))
+        # Send the room with the ticket to join it (the matchmaker renames
+        # the player when the opponent has the same username)
+        self.username = event.get("username", self.username)
+        match_start = {
+            "room_name": event["room_name"],
+            "username": self.username,
+            "ticket": issue_ticket(event["room_name"], self.username),
+        }
+        if "shard" in event:
+            match_start["shard"] = event["shard"]
+        await self.send(text_data=dumps(match_start))
 
+    async def send_match_timeout(self, event):
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - self.queued_at)
 
-class MatchConsumer(AsyncWebsocketConsumer):
-    
-    player_initial_data = {
-        "wins_round": 0,
-        "wins_turn": 0,
-        "current_card": "",
-        "ready": False,
-        "cards": [],
-        "cards_round": []
-    }
-    
-    game_initial_data = {
-        "players": {},
-        "middle_card": "",
-        "turn": 0,
-        "round": 0,
-    }
-
-    def __get_turn_winner__(self, turn_cards, middle_card):
-        # Calculate winner
-
-        player_1_username = turn_cards[0]["player"]
-        player_2_username = turn_cards[1]["player"]
-        player_1_card = turn_cards[0]["card"]
-        player_2_card = turn_cards[1]["card"]
-
-        player_1_card_num = int(player_1_card.split(" ")[0])
-        player_2_card_num = int(player_2_card.split(" ")[0])
-        # middle_card_num = int(middle_card.split(" ")[0])
-
-        # Determine the winner based on the highest card number
-        if (player_1_card_num > player_2_card_num):
-            winner = player_1_username  # Player 1 wins if their card is highest
-        elif (player_2_card_num > player_1_card_num):
-            winner = player_2_username  # Player 2 wins if their card is highest
-        else:
-            winner = "draw"  # No clear winner if neither player has the highest card
+        # Nobody to play with, the user can queue again
+        await self.send(text_data=MATCH_TIMEOUT_FRAME)
+        await self.close()
 
-        return winner
 
-    async def __send_round_new_cards__(self):
-        """ Send random cards and middile card to each user and start round """
+class MatchConsumer(AsyncWebsocketConsumer):
 
-        # Validate if the user already have cards
-        room_data = cache.get(self.room_group_name)
-        random_cards = room_data["players"][self.username]["cards"]
-        if not random_cards:
+    async def __send_messages__(self, messages: list[tuple[bool, dict]]):
+        """ Send the messages produced by a room update
+
+        Args:
+            messages (list[tuple[bool, dict]]): (to_room, event) pairs.
+                Room events are sent to the room group, the rest are
+                handled only by the current consumer.
+        """
 
-            # # Get 3 random cards
-            if settings.DEBUG_CARDS:
-                random_cards = ["1 swords", "2 swords", "3 swords"]
+        for to_room, event in messages:
+            if to_room:
+                GROUP_SENDS.inc(type=event["type"])
+                await self.channel_layer.group_send(
+                    self.room_group_name, with_frames(event)
+                )
+            elif self.left:
+                # Nobody reads the messages of a vacant seat
+                continue
             else:
-                random_cards = random.sample(self.cards, 3)
+                handler = getattr(self, event["type"].replace(".", "_"))
+                await handler(event)
 
-            # Save card in cache
-            room_data["players"][self.username]["cards"] = random_cards
-            cache.set(self.room_group_name, room_data)
+    async def connect(self):
+        self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
+        self.room_group_name = room_group_name(self.room_name)
+        self.registry = get_room_registry()
+        self.store = get_room_state_store()
+        self.journal = get_journal()
+        self.results = get_results_writer()
+        self.profiler = get_room_profiler()
+        self.actor = None
+        self.protocol_version = protocol_version(self.scope)
+        self.joined = False
+        self.admitted = False
+        self.timers = get_timer_wheel()
+        self.turn_timer = None
+        self.move_seq = 0
+        self.username = None
+        self.left = False
+        self.game_over = False
+
+        # Only players with a ticket of the room can join it (see
+        # tickets.TicketAuthMiddleware)
+        ticket = self.scope.get("ticket")
+        if ticket is None or ticket[0] != self.room_name:
+            REJECTED.inc(consumer="match", reason="ticket")
+            await self.close()
+            return
+        self.ticket_username = ticket[1]
 
-        # Send cards only to current user
-        await self.send(text_data=json.dumps({
-            "type": "round cards",
-            "value": random_cards
-        }))
+        # Refuse the handshake when the worker is full
+        self.admitted = acquire_socket("match")
+        if not self.admitted:
+            await self.close()
+            return
+        self.admission = MessageAdmission("match", MATCH_SCHEMAS)
 
-    async def __create_middle_card__(self):
-        """ Create middile card and save in cache """
+        if self.protocol_version == BINARY_VERSION:
+            await self.accept(subprotocol=BINARY_SUBPROTOCOL)
+        else:
+            await self.accept()
 
-        room_data = cache.get(self.room_group_name)
+        # Send the players of rooms of other workers to their worker
+        owner = await get_shard_map().room_owner(self.room_name)
+        if owner is not None and owner[0] != settings.SHARD_NAME:
+            await self.send(text_data=dumps({"type": "shard", "value": owner[1]}))
+            await self.close(code=SHARD_REDIRECT_CODE)
+            return
 
-        # Set a random card as the table if both players are ready
-        if len(room_data["players"]) == 2:
+        # Join room group
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        self.joined = True
+        OPEN_SOCKETS.inc(consumer="match")
+        room_sockets[self.room_group_name] = room_sockets.get(self.room_group_name, 0) + 1
+        ACTIVE_ROOMS.set(len(room_sockets))
+        idle_timer = idle_rooms.pop(self.room_group_name, None)
+        if idle_timer is not None:
+            idle_timer.cancel()
+
+        # The player is back: the room stops playing for them
+        seat = vacant_seats.get((self.room_group_name, self.ticket_username))
+        if seat is not None:
+            seat.__free_seat__()
+
+        # Finished rooms can not be joined again
+        if await self.registry.state(self.room_name) == FINISHED:
+            await self.close()
+            return
 
-            # Reset old round data
-            room_data["middle_card"] = ""
-            for player in room_data["players"]:
-                room_data["players"][player]["current_card"] = ""
-                room_data["players"][player]["ready"] = False
+        # Initialize room data
+        if settings.MATCH_ENGINE == "actor":
+            self.actor = acquire_room_actor(self.room_name)
+            room_full = await self.actor.ask(self, "connect", None)
+        else:
 
-            # Get a random cards
-            random_card = random.choice(self.cards)
+            # Recover rooms lost by the store from the journal. Waiting
+            # rooms were just allocated: a journal of the same name belongs
+            # to an older room
+            replayed = None
+            if (await self.store.get(self.room_group_name) is None
+                    and await self.registry.state(self.room_name) != WAITING):
+                replayed = await self.journal.replay(self.room_group_name)
+
+            room_full = await self.store.update(
+                self.room_group_name,
+                lambda room_data: init_room(room_data or replayed)
+            )
 
-            # Save middle card in cache
-            room_data["middle_card"] = random_card
-            cache.set(self.room_group_name, room_data)
+        # Disconnect if the room is full
+        if room_full:
+            await self.close()
+            return
 
-    async def __send_middile_card__(self):
-        """ Submit a new message with the current middle card
-        (optional: create a new middle card) """
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
 
-        room_data = cache.get(self.room_group_name)
-        middle_card = room_data["middle_card"]
+            # A consumer that failed still gives back its socket and its
+            # place in the room
+            if getattr(self, "admitted", False) or getattr(self, "joined", False):
+                await self.__release__()
+                await self.disconnect(1011)
 
-        # Send middle card to both players
-        await self.channel_layer.group_send(
-            self.room_group_name, {
-                "type": "send.middile_card",
-                "value": middle_card
-            }
-        )
-        
-    def __is_round_over__(self, room_data: dict) -> tuple[bool, str]:
-        """ Check if the round is over
-        
-        Args:
-            room_data (dict): Room data
-            
-        Returns:
-            tuple[bool, str]: (round_over, round_winner)
-        """
-        
-        round_winner = "draw"
-        
-        # Validate if the round is over
-        if room_data["turn"] == 3:
-            
-            # Update round number
-            room_data["round"] += 1
-
-            # found round winner
-            for player, player_data in room_data["players"].items():
-                if player_data["wins_turn"] >= 2:
-                    round_winner = player
-                    break
-            
-            return True, round_winner
-        
-        return False, round_winner
-
-    def __is_game_over__(self, room_data: dict) -> tuple[bool, str]:
-        """ Check if the round is over
-        
-        Args:
-            room_data (dict): Room data
-            turn_winner (str): Last rurn winner
-            
-        Returns:
-            tuple[bool, str]: (game_over, game_winner)
-        """
-        
-        # Round rounds winner
-        for player, player_data in room_data["players"].items():
-            if player_data["wins_round"] >= settings.MAX_POINTS:
-                return True, player
-        
-        return False, ""
+    async def websocket_disconnect(self, message):
+        await self.__release__()
+        await super().websocket_disconnect(message)
 
-    async def connect(self):
-        self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
-        self.room_group_name = f"room_{self.room_name}"
+    async def __release__(self):
+        """ Stop counting the socket, in admission control and in its room """
 
-        # Join room group
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        if self.admitted:
+            release_socket()
+            self.admitted = False
 
-        # Initialize username
-        self.username = None
+        if not self.joined:
+            return
+        self.joined = False
 
-        # Setup cards
-        cards_types = ["clubs", "cups", "gold", "swords"]
-        cards_values = ["1", "2", "3", "4", "5", "6", "7", "10", "11", "12"]
-        self.cards = []
-        for card_type in cards_types:
-            for card_value in cards_values:
-                self.cards.append(f"{card_value} {card_type}")
+        OPEN_SOCKETS.dec(consumer="match")
+        room_sockets[self.room_group_name] -= 1
+        if not room_sockets[self.room_group_name]:
+            del room_sockets[self.room_group_name]
+            await self.registry.set_state(self.room_name, ABANDONED)
 
-        # Initialize room data
-        if not cache.get(self.room_group_name):
-            cache.set(self.room_group_name, {
-                **MatchConsumer.game_initial_data
-            })
+            # Drop the room if nobody comes back
+            idle_rooms[self.room_group_name] = self.timers.schedule(
+                settings.ROOM_IDLE_SECONDS, expire_idle_room, self.room_name
+            )
+        ACTIVE_ROOMS.set(len(room_sockets))
 
-        # Disconnect if the room is full
-        room_data = cache.get(self.room_group_name)
-        if len(room_data["players"]) > 2:
-            await self.disconnect()
-            return
+    async def dispatch(self, message):
+        # Count room group events received
+        if message["type"].startswith("send"):
+            GROUP_DELIVERIES.inc(type=message["type"])
+        await super().dispatch(message)
 
     async def disconnect(self, close_code):
+        if self.turn_timer is not None:
+            self.turn_timer.cancel()
+            self.turn_timer = None
+
         # Leave room group
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
-    async def receive(self, text_data):
+        # A player that leaves a game in progress keeps the seat, while
+        # their opponent is in the room
+        if settings.TURN_SECONDS > 0 and self.username is not None \
+                and not self.game_over and self.room_group_name in room_sockets:
+            self.left = True
+            previous = vacant_seats.get((self.room_group_name, self.username))
+            if previous is not None:
+                previous.__free_seat__()
+            vacant_seats[(self.room_group_name, self.username)] = self
+            self.turn_timer = self.timers.schedule(
+                settings.TURN_SECONDS, self.__vacant_deadline__
+            )
+            return
 
-        json_data = json.loads(text_data)
-        print(json_data)
-        message_type = json_data["type"]
-        message_value = json_data["value"]
+        # Stop using the room actor
+        if self.actor is not None:
+            release_room_actor(self.actor)
+            self.actor = None
 
-        # Get username and send cards
-        if message_type == "username":
-            self.username = message_value
+    async def receive(self, text_data=None, bytes_data=None):
 
-            # Skip if user already exists
-            room_data = cache.get(self.room_group_name)
-            if self.username not in room_data["players"]:
-                if len(room_data["players"]) < 2:
+        # Frames refused by admission control never reach the room
+        try:
+            message_type, message_value = self.admission.admit(
+                text_data, bytes_data
+            )
+        except MessageRejected as error:
+            if error.reason == "frame size":
+                await self.close(code=FRAME_TOO_BIG_CODE)
+            return
 
-                    # Update player info in cache
-                    room_data = cache.get(self.room_group_name)
-                    room_data["players"][self.username] = {
-                        **MatchConsumer.player_initial_data
-                    }
+        # Players play with the username of their ticket
+        if message_type == "username":
+            message_value = self.ticket_username
+        elif message_type == "resume":
+            message_value["username"] = self.ticket_username
+
+        # The player moved: no deadline until the room moves on
+        elif message_type in ("use card", "more cards") \
+                and self.turn_timer is not None:
+            self.turn_timer.cancel()
+            self.turn_timer = None
+
+        sampled_logger.info(
+            "Room %s message %s %s", self.room_name, message_type, message_value
+        )
 
-                    cache.set(self.room_group_name, room_data)
+        with HANDLER_SECONDS.time(type=message_type), \
+                self.profiler.handling(self.room_name):
+            await self.__handle_message__(message_type, message_value)
 
-                    # new middle card
-                    await self.__create_middle_card__()
+    async def __handle_message__(self, message_type: str, message_value):
+        """ Apply a websocket message to the room with the match engine """
 
-                else:
+        # Reconnection of a player: {"username": ..., "seq": last seen seq}
+        if message_type == "resume":
+            await self.__resume__(message_value["username"], message_value["seq"])
+            return
 
-                    # Disconnect if the room is full
-                    await self.send(text_data=json.dumps({
-                        "type": "error",
-                        "value": "La sala está llena"
-                    }))
+        # Get username
+        if message_type == "username":
+            self.username = message_value
+
+        if settings.MATCH_ENGINE == "actor":
 
-                    await self.disconnect(1000)
-                    return
+            # Skip messages after leaving the room
+            if self.actor is None:
+                return
 
-            # Send random cards to user
-            await self.__send_round_new_cards__()
+            # The room actor applies the message and sends the messages
+            disconnect, events = await self.actor.ask(
+                self, message_type, message_value
+            )
 
-            # Send current middle card
-            await self.__send_middile_card__()
+        elif message_type == "middle card":
 
-            # Send usernames
-            usernames = list(room_data["players"].keys())
-            await self.channel_layer.group_send(
-                self.room_group_name, {
-                    "type": "send_usernames",
-                    "value": usernames
-                }
+            # Read only message
+            room_data = await self.store.get(self.room_group_name)
+            _, (messages, disconnect) = handle_message(
+                room_data, self.username, message_type, message_value
             )
+            events = []
+            await self.__send_messages__(messages)
 
-        if message_type == "use card":
-            
-            room_data = cache.get(self.room_group_name)
-            
-            # Get opponent username
-            usernames = list(room_data["players"].keys())
-            opponent = [user for user in usernames if user != self.username][0]
-            
-            # Update player used card in cache
-            middle_card = room_data["middle_card"]
-            room_data_player = room_data["players"][self.username]
-            room_data_player["current_card"] = message_value
-            room_data_player["cards"].remove(message_value)
-            room_data_player["cards_round"].append(message_value)
-            cache.set(self.room_group_name, room_data)
-            
-            cards_player_round = len(room_data_player["cards_round"])
-            cards_opponent_round = len(room_data["players"][opponent]["cards_round"])
-
-            # calculate winner after both players have played the turn card card
-            if cards_player_round == cards_opponent_round and cards_opponent_round > 0:
-                
-                # Update turn number
-                room_data["turn"] += 1
-
-                # Send used cards to both players
-                turn_cards = []
-                for player, player_data in room_data["players"].items():
-                    player_card = player_data["current_card"]
-                    turn_cards.append({
-                        "player": player,
-                        "card": player_card
-                    })
+        else:
 
-                await self.channel_layer.group_send(
-                    self.room_group_name, {
-                        "type": "send.turn_played_cards",
-                        "value": turn_cards
-                    }
+            messages, disconnect, events = await self.store.update(
+                self.room_group_name,
+                lambda room_data: apply_message(
+                    room_data, self.username, message_type, message_value
                 )
+            )
+            self.journal.append(self.room_group_name, events)
+            await self.__send_messages__(messages)
+            await self.registry.observe(self.room_name, messages, events)
+            self.results.record(self.room_name, events)
+
+        # Room events older than the move are no reason for a new deadline
+        if events:
+            self.move_seq = events[0]["seq"]
+
+        # Disconnect if the room is full or the game is over (the player
+        # has no seat to keep)
+        if disconnect:
+            self.game_over = True
+            if self.left:
+                self.__free_seat__()
+            else:
+                await self.disconnect(1000)
 
-                # Get winner
-                turn_winner = self.__get_turn_winner__(
-                    turn_cards, middle_card
-                )
-                
-                # Update turn wins
-                if turn_winner != "draw":
-                    room_data["players"][turn_winner]["wins_turn"] += 1
-                
-                round_over, round_winner = self.__is_round_over__(room_data)
-                if round_over:
-                    
-                    # Add points to winner
-                    if round_winner != "draw":
-                        room_data["players"][round_winner]["wins_round"] += 1
-                    
-                    # Validate if is game over
-                    game_over, game_winner = self.__is_game_over__(room_data)
-                    if game_over:
-                        # Send game winner to players
-                        await self.channel_layer.group_send(
-                            self.room_group_name, {
-                                "type": "send.game_winner",
-                                "value": game_winner
-                            }
-                        )
-                        
-                        # Disconnect players
-                        await self.disconnect(1000)
-                        
-                        # No submit turn nor round winner
-                        return
-                    
-                    # Send round winner to players
-                    await self.channel_layer.group_send(
-                        self.room_group_name, {
-                            "type": "send.round_winner",
-                            "value": round_winner
-                        }
-                    )
-                    
-                    # Reset round data
-                    room_data["turn"] = 0
-                    for player in room_data["players"]:
-                        room_data["players"][player]["wins_turn"] = 0
-                        room_data["players"][player]["cards_round"] = []
-                    
-                    # Send points
-                    points = []
-                    for player, player_data in room_data["players"].items():
-                        points.append({
-                            "player": player,
-                            "points": player_data["wins_round"]
-                        })
-                    await self.channel_layer.group_send(
-                        self.room_group_name, {
-                            "type": "send.points",
-                            "value": points
-                        }
-                    )
-                    
-                    # Update room data
-                    cache.set(self.room_group_name, room_data)
-                    
-                    # Generate new middle card
-                    await self.__create_middle_card__()
-                    
-                    # no submit turn winner
-                    return
-
-                # Submit turn winner
-                await self.channel_layer.group_send(
-                    self.room_group_name, {
-                        "type": "send.turn_winner",
-                        "value": turn_winner
-                    }
-                )
-                
-                # update room data
-                cache.set(self.room_group_name, room_data)
+    async def __resume__(self, username: str, seq: int):
+        """ Send a reconnecting player the events after the last sequence
+        number they saw, or a snapshot of the room when it is smaller (or
+        the journal misses events). Unknown players join the room instead """
 
-        if message_type == "more cards":
+        if settings.MATCH_ENGINE == "actor":
+            if self.actor is None:
+                return
+            room_data = await self.actor.ask(self, "state", None)
+        else:
+            room_data = await self.store.get(self.room_group_name)
 
-            # Generate and send new cards to each player
-            await self.__send_round_new_cards__()
-            
-            # Send new middle card
-            await self.__send_middile_card__()
+        if room_data is None or username not in room_data.usernames():
+            await self.__handle_message__("username", username)
+            return
+        self.username = username
 
-        if message_type == "middle card":
+        frames = event_frames(snapshot(room_data, username), self.protocol_version)
+        last_seq, missed = await self.journal.missed_messages(
+            self.room_group_name, username, seq
+        )
+        if last_seq == room_data.seq:
+            missed_frames = [
+                frame
+                for event in missed
+                for frame in event_frames(event, self.protocol_version)
+            ]
+            if sum(map(len, missed_frames)) < sum(map(len, frames)):
+                frames = missed_frames
+
+        await self.__send_frames__(frames)
+
+    def __arm_turn_deadline__(self, event: dict):
+        """ Start again the settings.TURN_SECONDS the player has to move,
+        when a room event newer than their last move arrives """
+
+        if settings.TURN_SECONDS <= 0 or self.username is None \
+                or event.get("seq", -1) < self.move_seq:
+            return
+        if self.turn_timer is not None:
+            self.turn_timer.cancel()
+        self.turn_timer = self.timers.schedule(
+            settings.TURN_SECONDS, self.__turn_deadline__, event["seq"]
+        )
 
-            room_data = cache.get(self.room_group_name)
+    async def __turn_deadline__(self, seq: int):
+        """ Play the pending move of a player that let the room wait since
+        the room event seq """
 
-            await self.send(text_data=json.dumps({
-                "type": "middle card",
-                "value": room_data["middle_card"]
-            }))
+        self.turn_timer = None
+        move_seq = self.move_seq
+        await self.__handle_message__("timeout", seq)
+        if self.move_seq != move_seq:
+            TURN_TIMEOUTS.inc()
 
-    async def send_middile_card(self, event):
-        card = event["value"]
+    async def __vacant_deadline__(self):
+        """ Play the pending move of a player that left the room, every
+        settings.TURN_SECONDS, until they come back or the game ends. The
+        seat is freed when nobody is left in the room (the room expires) """
 
-        # Send card to WebSocket
-        await self.send(text_data=json.dumps({
-            "type": "middle card",
-            "value": card
-        }))
+        self.turn_timer = None
+        if self.room_group_name not in room_sockets:
+            self.__free_seat__()
+            return
+        if settings.MATCH_ENGINE != "actor" \
+                and await self.store.get(self.room_group_name) is None:
+            self.__free_seat__()
+            return
+
+        # Nobody waits for the answer of the player: no deadline seq
+        move_seq = self.move_seq
+        await self.__handle_message__("timeout", None)
+        if self.move_seq != move_seq:
+            TURN_TIMEOUTS.inc()
+
+        if self.left:
+            self.turn_timer = self.timers.schedule(
+                settings.TURN_SECONDS, self.__vacant_deadline__
+            )
+
+    def __free_seat__(self):
+        """ Stop playing for a player that left the room """
+
+        key = (self.room_group_name, self.username)
+        if vacant_seats.get(key) is self:
+            del vacant_seats[key]
+        self.left = False
+        if self.turn_timer is not None:
+            self.turn_timer.cancel()
+            self.turn_timer = None
+        if self.actor is not None:
+            release_room_actor(self.actor)
+            self.actor = None
+
+    async def turn_deadline(self, event):
+        """ The room moved while the deadline ran out (see
+        journal.apply_message): the player gets a new one """
+        self.__arm_turn_deadline__(event)
+
+    async def __send_event__(self, event: dict):
+        """ Send the frames of an event to WebSocket, room events come with
+        their frames already encoded (see frames.with_frames) """
+
+        # Room activity gives the player a new deadline
+        self.__arm_turn_deadline__(event)
+
+        frames = event.get("frames")
+        if frames is None:
+            frames = event_frames(event, self.protocol_version)
+        else:
+            frames = frames[PROTOCOL_VERSIONS.index(self.protocol_version)]
+        await self.__send_frames__(frames)
+
+    async def __send_frames__(self, frames: list[str | bytes]):
+        """ Send encoded frames of the protocol of the player """
+
+        for frame in frames:
+            if self.protocol_version == BINARY_VERSION:
+                await self.send(bytes_data=frame)
+            else:
+                await self.send(text_data=frame)
+
+    async def send_round_cards(self, event):
+        await self.__send_event__(event)
+
+    async def send_error(self, event):
+        await self.__send_event__(event)
+
+    async def send_middile_card(self, event):
+        await self.__send_event__(event)
 
     async def send_turn_played_cards(self, event):
-        cards = event["value"]
+        await self.__send_event__(event)
 
-        # Send cards to WebSocket
-        await self.send(text_data=json.dumps({
-            "type": "turn played cards",
-            "value": cards
-        }))
+    async def send_turn_result(self, event):
+        await self.__send_event__(event)
 
     async def send_points(self, event):
-        points = event["value"]
-
-        # Send points to WebSocket
-        await self.send(text_data=json.dumps({
-            "type": "points",
-            "value": points
-        }))
+        await self.__send_event__(event)
 
     async def send_game_winner(self, event):
-        winner = event["value"]
-
-        # Send winner to WebSocket
-        await self.send(text_data=json.dumps({
-            "type": "game winner",
-            "value": winner
-        }))
-        
+        await self.__send_event__(event)
+
     async def send_round_winner(self, event):
-        winner = event["value"]
-
-        # Send winner to WebSocket
-        await self.send(text_data=json.dumps({
-            "type": "round winner",
-            "value": winner
-        }))
-        
-    async def send_turn_winner(self, event):
-        winner = event["value"]
+        await self.__send_event__(event)
 
-        # Send winner to WebSocket
-        await self.send(text_data=json.dumps({
-            "type": "turn winner",
-            "value": winner
-        }))
+    async def send_turn_winner(self, event):
+        await self.__send_event__(event)
 
     async def send_usernames(self, event):
-        usernames = event["value"]
+        await self.__send_event__(event)
+
+
+class SpectatorConsumer(AsyncWebsocketConsumer):
+    """ Read only view of a room: snapshots of the room at the spectators
+    tick rate (see spectators.RoomBroadcast), without the hands """
 
-        # Send usernames to WebSocket
-        await self.send(text_data=json.dumps({
-            "type": "usernames",
-            "value": usernames
-        }))
+    async def connect(self):
+        self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
+        self.broadcast = None
+
+        # Refuse the handshake when the worker is full
+        self.admitted = acquire_socket("spectator")
+        if not self.admitted:
+            await self.close()
+            return
+
+        # Spectators only watch, they send no messages
+        self.admission = MessageAdmission("spectator", {})
+
+        await self.accept()
+        OPEN_SOCKETS.inc(consumer="spectator")
+
+        # Rooms are watched in the worker of the room
+        owner = await get_shard_map().room_owner(self.room_name)
+        if owner is not None and owner[0] != settings.SHARD_NAME:
+            await self.send(text_data=dumps({"type": "shard", "value": owner[1]}))
+            await self.close(code=SHARD_REDIRECT_CODE)
+            return
+
+        self.broadcast = await watch_room(self.room_name, self)
+
+    async def disconnect(self, close_code):
+        if not self.admitted:
+            return
+        release_socket()
+        OPEN_SOCKETS.dec(consumer="spectator")
+
+        if self.broadcast is not None:
+            unwatch_room(self.broadcast, self)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # Count (and drop) the frames of the spectator
+        try:
+            self.admission.admit(text_data, bytes_data)
+        except MessageRejected as error:
+            if error.reason == "frame size":
+                await self.close(code=FRAME_TOO_BIG_CODE)
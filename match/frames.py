@@ -0,0 +1,175 @@
+import functools
+import json
+
+from .binary import encode_event
+from .state import card_code, card_name
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Match websocket protocol versions. Json clients select them with
+# "?v=<version>": version 1 gets a frame per turn event, version 2 a single
+# "turn result" frame. Version 3 is the binary subprotocol (binary.py), with
+# turn results like version 2
+PROTOCOL_VERSIONS = (1, 2, 3)
+JSON_VERSIONS = (1, 2)
+BINARY_VERSION = 3
+
+# Turn event type -> key in the "turn result" frame
+TURN_RESULT_KEYS = {
+    "send.turn_played_cards": "turn played cards",
+    "send.turn_winner": "turn winner",
+    "send.round_winner": "round winner",
+    "send.points": "points",
+    "send.game_winner": "game winner",
+}
+
+# Event type -> websocket frame type
+FRAME_TYPES = {
+    "send.round_cards": "round cards",
+    "send.error": "error",
+    "send.middile_card": "middle card",
+    "send_usernames": "usernames",
+    "send.snapshot": "snapshot",
+    **TURN_RESULT_KEYS,
+}
+
+
+def dumps(data) -> str:
+    """ Json text of the data, with orjson when it is installed """
+
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data)
+
+
+@functools.lru_cache(maxsize=256)
+def static_frame(frame_type: str, value) -> str:
+    """ Encoded frame with a value that repeats (errors, middle cards) """
+    return dumps({"type": frame_type, "value": value})
+
+
+def played_cards_names(played_cards: list[dict]) -> list[dict]:
+    """ Turn played cards with card names instead of codes """
+
+    return [
+        {"player": played["player"], "card": card_name(played["card"])}
+        for played in played_cards
+    ]
+
+
+def frame_value(event: dict):
+    """ Websocket value of an event (cards are names in the websocket) """
+
+    value = event["value"]
+    if event["type"] == "send.round_cards":
+        return [card_name(card) for card in value]
+    if event["type"] == "send.middile_card":
+        return card_name(value)
+    if event["type"] == "send.turn_played_cards":
+        return played_cards_names(value)
+    if event["type"] == "send.snapshot":
+        return {
+            "usernames": value["usernames"],
+            "middle card": card_name(value["middle_card"]),
+            "round cards": [card_name(card) for card in value["round_cards"]],
+            "turn played cards": played_cards_names(value["turn_played_cards"]),
+            "points": value["points"],
+            "turn wins": value["turn_wins"],
+            "round": value["round"],
+            "turn": value["turn"],
+        }
+    return value
+
+
+def json_frame(frame_type: str, value, seq: int = None) -> str:
+    """ Encoded json frame, with the room sequence number of the event """
+
+    if seq is None:
+        return dumps({"type": frame_type, "value": value})
+    return dumps({"type": frame_type, "value": value, "seq": seq})
+
+
+def event_frames(event: dict, protocol_version: int) -> list[str | bytes]:
+    """ Encoded websocket frames of a channel layer event
+
+    Args:
+        event (dict): event of game.handle_message
+        protocol_version (int): websocket protocol version of the client
+
+    Returns:
+        list[str | bytes]: frames to send (bytes for the binary protocol).
+        Json frames of accepted messages have the room "seq"
+    """
+
+    if protocol_version == BINARY_VERSION:
+        return [encode_event(event)]
+
+    seq = event.get("seq")
+    if event["type"] == "send.turn_result":
+
+        # Old clients get a frame per event of the turn
+        if protocol_version < 2:
+            frames = []
+            for turn_event in event["value"]:
+                if seq is not None:
+                    turn_event = {**turn_event, "seq": seq}
+                frames.extend(event_frames(turn_event, protocol_version))
+            return frames
+
+        result = {
+            TURN_RESULT_KEYS[turn_event["type"]]: frame_value(turn_event)
+            for turn_event in event["value"]
+        }
+        if "middle_card" in event:
+            result["middle card"] = card_name(event["middle_card"])
+        return [json_frame("turn result", result, seq)]
+
+    frame_type = FRAME_TYPES[event["type"]]
+    if seq is None and event["type"] in ("send.error", "send.middile_card"):
+        return [static_frame(frame_type, frame_value(event))]
+    return [json_frame(frame_type, frame_value(event), seq)]
+
+
+def with_frames(event: dict) -> dict:
+    """ Event with its frames for every protocol version already encoded,
+    so a room broadcast is serialized once instead of once per recipient
+
+    Returns:
+        dict: event with the same type and "seq", and "frames", the list of
+        frames of each protocol version
+    """
+
+    frames = event_frames(event, PROTOCOL_VERSIONS[0])
+    versions = [frames]
+    for protocol_version in PROTOCOL_VERSIONS[1:]:
+
+        # Only turn results and binary frames differ between versions
+        if event["type"] == "send.turn_result" \
+                or protocol_version == BINARY_VERSION:
+            versions.append(event_frames(event, protocol_version))
+        else:
+            versions.append(frames)
+
+    framed = {"type": event["type"], "frames": versions}
+    if "seq" in event:
+        framed["seq"] = event["seq"]
+    return framed
+
+
+def loads_message(text_data: str) -> tuple[str, object]:
+    """ Message type and value of a json client frame
+
+    Returns:
+        tuple[str, object]: (message_type, message_value), with a card code
+        as the "use card" value (cards are names in the websocket)
+    """
+
+    json_data = json.loads(text_data)
+    message_type = json_data["type"]
+    message_value = json_data["value"]
+    if message_type == "use card":
+        message_value = card_code(message_value)
+    return message_type, message_value
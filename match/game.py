@@ -0,0 +1,504 @@
+import random
+
+from django.conf import settings
+
+from .rules import (
+    CARDS_PER_HAND, FIRST_WINS, SECOND_WINS, TURNS_PER_ROUND,
+    TURNS_TO_WIN_ROUND, Deck, card_strength, turn_outcome,
+)
+from .state import (
+    NO_CARD, RoomState, PlayerState, card_code, hand_cards, hand_mask,
+)
+
+DEBUG_HAND = hand_mask(card_code(card) for card in
+                       ["1 swords", "2 swords", "3 swords"])
+
+# Messages are (to_room, event) pairs of channel layer events. Room events
+# are sent to the room group, the rest only to the user consumer. Cards in
+# events are codes: consumers send card names to the websockets
+
+
+def get_turn_winner(turn_cards, middle_card):
+    # Calculate winner (see rules.compare_cards)
+    outcome = turn_outcome(
+        middle_card, turn_cards[0]["card"], turn_cards[1]["card"]
+    )
+
+    if outcome == FIRST_WINS:
+        return turn_cards[0]["player"]
+    if outcome == SECOND_WINS:
+        return turn_cards[1]["player"]
+    return "draw"
+
+
+def round_deck(room_data: RoomState) -> Deck:
+    """ Deck of the current round, shuffling a new one when it is empty.
+    Decks only depend on the room seed and round, so rooms can be replayed
+
+    Args:
+        room_data (RoomState): Room data (updated in place)
+
+    Returns:
+        Deck: deck that deals from room_data.deck
+    """
+
+    if not room_data.deck:
+        rng = random.Random(room_data.seed + room_data.round)
+        room_data.deck = Deck.shuffled(rng).cards
+    return Deck(room_data.deck)
+
+
+def deal_round_cards(room_data: RoomState, username: str) -> list[int]:
+    """ Give random cards to the user if they have none
+
+    Args:
+        room_data (RoomState): Room data (updated in place)
+        username (str): Player username
+
+    Returns:
+        list[int]: user cards
+    """
+
+    player = room_data.player(username)
+    if not player.hand:
+
+        # # Get 3 cards from the round deck
+        if settings.DEBUG_CARDS:
+            player.hand = DEBUG_HAND
+        else:
+            player.hand = hand_mask(
+                round_deck(room_data).draw_many(CARDS_PER_HAND)
+            )
+
+    return hand_cards(player.hand)
+
+
+def create_middle_card(room_data: RoomState):
+    """ Create middile card if both players are in the room
+
+    Args:
+        room_data (RoomState): Room data (updated in place)
+    """
+
+    # Set a random card as the table if both players are ready
+    if len(room_data.players) == 2:
+
+        # Reset old round data
+        for player in room_data.players:
+            player.current_card = NO_CARD
+            player.ready = False
+
+        # Save the top card of the round deck as middle card
+        room_data.middle_card = round_deck(room_data).draw()
+
+
+def is_round_over(room_data: RoomState) -> tuple[bool, str]:
+    """ Check if the round is over
+
+    Args:
+        room_data (RoomState): Room data
+
+    Returns:
+        tuple[bool, str]: (round_over, round_winner)
+    """
+
+    round_winner = "draw"
+
+    # Validate if the round is over
+    if room_data.turn == TURNS_PER_ROUND:
+
+        # Update round number
+        room_data.round += 1
+
+        # found round winner
+        for player in room_data.players:
+            if player.wins_turn >= TURNS_TO_WIN_ROUND:
+                round_winner = player.username
+                break
+
+        return True, round_winner
+
+    return False, round_winner
+
+
+def is_game_over(room_data: RoomState) -> tuple[bool, str]:
+    """ Check if the round is over
+
+    Args:
+        room_data (RoomState): Room data
+
+    Returns:
+        tuple[bool, str]: (game_over, game_winner)
+    """
+
+    # Round rounds winner
+    for player in room_data.players:
+        if player.wins_round >= settings.MAX_POINTS:
+            return True, player.username
+
+    return False, ""
+
+
+def init_room(room_data: RoomState | None) -> tuple[RoomState, bool]:
+    """ Create the room data if it does not exist yet
+
+    Returns:
+        tuple[RoomState, bool]: (room_data, room_full)
+    """
+
+    if not room_data:
+        room_data = RoomState()
+
+    return room_data, len(room_data.players) > 2
+
+
+def round_cards(room_data: RoomState, username: str) -> list[tuple[bool, dict]]:
+    """ Deal cards to the user and share the middle card
+
+    Args:
+        room_data (RoomState): Room data (updated in place)
+        username (str): Player username
+
+    Returns:
+        list[tuple[bool, dict]]: messages to send
+    """
+
+    random_cards = deal_round_cards(room_data, username)
+    return [
+        # Send cards only to current user
+        (False, {
+            "type": "send.round_cards",
+            "value": random_cards
+        }),
+        # Send middle card to both players
+        (True, {
+            "type": "send.middile_card",
+            "value": room_data.middle_card
+        }),
+    ]
+
+
+def join_room(room_data: RoomState, username: str) -> tuple[RoomState, tuple]:
+    """ Add the user to the room and deal their cards
+
+    Returns:
+        tuple[RoomState, tuple]: (room_data, (messages, room_full))
+    """
+
+    # Skip if user already exists
+    if username not in room_data.usernames():
+        if len(room_data.players) < 2:
+
+            # Update player info in room
+            room_data.players.append(PlayerState(username))
+
+            # new middle card
+            create_middle_card(room_data)
+
+        else:
+
+            # Disconnect if the room is full
+            messages = [(False, {
+                "type": "send.error",
+                "value": "La sala está llena"
+            })]
+            return room_data, (messages, True)
+
+    # Send random cards to user and current middle card
+    messages = round_cards(room_data, username)
+
+    # Send usernames
+    messages.append((True, {
+        "type": "send_usernames",
+        "value": room_data.usernames()
+    }))
+
+    return room_data, (messages, False)
+
+
+def use_card(room_data: RoomState, username: str, card: int) -> tuple[RoomState, tuple]:
+    """ Play a card of the user and resolve the turn when both players
+    already played
+
+    Returns:
+        tuple[RoomState, tuple]: (room_data, (messages, game_over))
+    """
+
+    messages = []
+
+    # Get opponent
+    opponent = [player for player in room_data.players
+                if player.username != username][0]
+
+    # Update player used card
+    middle_card = room_data.middle_card
+    room_data_player = room_data.player(username)
+    card_bit = 1 << card
+    if not room_data_player.hand & card_bit:
+        raise ValueError(f"{username} does not have the card {card}")
+    room_data_player.hand ^= card_bit
+    room_data_player.current_card = card
+    room_data_player.round_cards |= card_bit
+
+    cards_player_round = room_data_player.round_cards.bit_count()
+    cards_opponent_round = opponent.round_cards.bit_count()
+
+    # calculate winner after both players have played the turn card card
+    if not (cards_player_round == cards_opponent_round and cards_opponent_round > 0):
+        return room_data, (messages, False)
+
+    # Update turn number
+    room_data.turn += 1
+
+    # Send used cards to both players
+    turn_cards = []
+    for player in room_data.players:
+        turn_cards.append({
+            "player": player.username,
+            "card": player.current_card
+        })
+
+    messages.append((True, {
+        "type": "send.turn_played_cards",
+        "value": turn_cards
+    }))
+
+    # Get winner
+    turn_winner = get_turn_winner(turn_cards, middle_card)
+
+    # Update turn wins
+    if turn_winner != "draw":
+        room_data.player(turn_winner).wins_turn += 1
+
+    round_over, round_winner = is_round_over(room_data)
+    if not round_over:
+
+        # Submit turn winner
+        messages.append((True, {
+            "type": "send.turn_winner",
+            "value": turn_winner
+        }))
+        return room_data, (messages, False)
+
+    # Add points to winner
+    if round_winner != "draw":
+        room_data.player(round_winner).wins_round += 1
+
+    # Validate if is game over
+    game_over, game_winner = is_game_over(room_data)
+    if game_over:
+
+        # Send game winner to players (no turn nor round winner)
+        messages.append((True, {
+            "type": "send.game_winner",
+            "value": game_winner
+        }))
+        return room_data, (messages, True)
+
+    # Send round winner to players
+    messages.append((True, {
+        "type": "send.round_winner",
+        "value": round_winner
+    }))
+
+    # Reset round data (and shuffle a new deck)
+    room_data.turn = 0
+    room_data.deck = bytearray()
+    for player in room_data.players:
+        player.wins_turn = 0
+        player.round_cards = 0
+
+    # Send points
+    points = []
+    for player in room_data.players:
+        points.append({
+            "player": player.username,
+            "points": player.wins_round
+        })
+    messages.append((True, {
+        "type": "send.points",
+        "value": points
+    }))
+
+    # Generate new middle card (no submit turn winner)
+    create_middle_card(room_data)
+
+    return room_data, (messages, False)
+
+
+def turn_result(room_data: RoomState, messages: list[tuple[bool, dict]]) -> list[tuple[bool, dict]]:
+    """ Coalesce the room events of a turn in one "send.turn_result" event,
+    so a turn is a single group send
+
+    Args:
+        room_data (RoomState): Room data after the turn
+        messages (list[tuple[bool, dict]]): messages of use_card
+
+    Returns:
+        list[tuple[bool, dict]]: messages with at most one room event. The
+        event value is the list of coalesced events, and it has the new
+        middle card when the turn ended the round.
+    """
+
+    events = [event for to_room, event in messages if to_room]
+    if not events:
+        return messages
+
+    result = {"type": "send.turn_result", "value": events}
+    if any(event["type"] == "send.round_winner" for event in events):
+        result["middle_card"] = room_data.middle_card
+
+    return [message for message in messages if not message[0]] + [(True, result)]
+
+
+def snapshot(room_data: RoomState, username: str | None) -> dict:
+    """ Event with everything a player of the room needs to resume the game
+
+    Args:
+        room_data (RoomState): Room data
+        username (str | None): Player username, None for spectators (they
+            see no hands, nor cards of the turn in progress)
+
+    Returns:
+        dict: "send.snapshot" event
+    """
+
+    spectator = username is None
+    return {
+        "type": "send.snapshot",
+        "seq": room_data.seq,
+        "value": {
+            "usernames": room_data.usernames(),
+            "middle_card": room_data.middle_card,
+            "round_cards": [] if spectator
+            else hand_cards(room_data.player(username).hand),
+            # Cards of the players that already played the current turn
+            "turn_played_cards": [] if spectator else [
+                {"player": player.username, "card": player.current_card}
+                for player in room_data.players
+                if player.round_cards.bit_count() > room_data.turn
+            ],
+            "points": [
+                {"player": player.username, "points": player.wins_round}
+                for player in room_data.players
+            ],
+            "turn_wins": [
+                {"player": player.username, "wins": player.wins_turn}
+                for player in room_data.players
+            ],
+            "round": room_data.round,
+            "turn": room_data.turn,
+        },
+    }
+
+
+def pending_action(room_data: RoomState, username: str) -> tuple[str, object] | None:
+    """ Message the game waits from a player: play their weakest card in the
+    current turn, or ask for the cards of a new round
+
+    Args:
+        room_data (RoomState): Room data
+        username (str): Player username
+
+    Returns:
+        tuple[str, object] | None: (message_type, message_value), None when
+        the game does not wait for the player
+    """
+
+    if len(room_data.players) < 2 or username not in room_data.usernames() \
+            or is_game_over(room_data)[0]:
+        return None
+
+    player = room_data.player(username)
+    if not player.hand and not player.round_cards:
+        return "more cards", ""
+    if player.hand and player.round_cards.bit_count() <= room_data.turn:
+        card = min(
+            hand_cards(player.hand),
+            key=lambda card: card_strength(room_data.middle_card, card)
+        )
+        return "use card", card
+    return None
+
+
+def legal_move(room_data: RoomState, username: str, message_type: str,
+               message_value) -> bool:
+    """ Whether a player can play a move in the current state of the room:
+    cards are played by players of a full room in a game in progress, one
+    per turn and from their hand
+
+    Args:
+        room_data (RoomState): Room data
+        username (str): Player username
+        message_type (str): "use card" or "more cards"
+        message_value: message value (card code for "use card")
+
+    Returns:
+        bool: False when the move must be rejected
+    """
+
+    if room_data is None or username not in room_data.usernames() \
+            or is_game_over(room_data)[0]:
+        return False
+
+    if message_type == "use card":
+        player = room_data.player(username)
+        return len(room_data.players) == 2 \
+            and bool(player.hand & 1 << message_value) \
+            and player.round_cards.bit_count() <= room_data.turn
+
+    return True
+
+
+def handle_message(room_data: RoomState | None, username: str, message_type: str,
+                   message_value) -> tuple[RoomState, tuple]:
+    """ Apply a websocket message of a user to the room
+
+    Args:
+        room_data (RoomState | None): Room data (updated in place), None
+            when the room finished
+        username (str): Player username
+        message_type (str): "username", "use card", "more cards"
+            or "middle card"
+        message_value: message value (card code for "use card")
+
+    Returns:
+        tuple[RoomState, tuple]: (room_data, (messages, disconnect))
+    """
+
+    # Finished games leave the room store (see rooms.RoomRegistry.finish):
+    # the player has nothing left to do in the room
+    if room_data is None:
+        messages = [(False, {
+            "type": "send.error",
+            "value": "La partida terminó"
+        })]
+        return room_data, (messages, True)
+
+    if message_type == "username":
+        room_data, (messages, room_full) = join_room(room_data, username)
+        if not room_full:
+            room_data.seq += 1
+        return room_data, (messages, room_full)
+
+    if message_type == "use card":
+        room_data, (messages, game_over) = use_card(
+            room_data, username, message_value
+        )
+        room_data.seq += 1
+        return room_data, (turn_result(room_data, messages), game_over)
+
+    if message_type == "more cards":
+
+        # Generate and send new cards and middle card to each player
+        room_data.seq += 1
+        return room_data, (round_cards(room_data, username), False)
+
+    if message_type == "middle card":
+        messages = [(False, {
+            "type": "send.middile_card",
+            "value": room_data.middle_card
+        })]
+        return room_data, (messages, False)
+
+    return room_data, ([], False)
@@ -0,0 +1,481 @@
+import asyncio
+import json
+import logging
+import time
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from django.conf import settings
+
+from .game import handle_message, legal_move, pending_action
+from .metrics import REJECTED
+from .redis_client import get_redis
+from .state import RoomState
+
+logger = logging.getLogger(__name__)
+
+# Journaled websocket messages: message type -> event type
+INPUT_EVENTS = {"username": "join", "use card": "card", "more cards": "deal"}
+REPLAY_MESSAGES = {event: message for message, event in INPUT_EVENTS.items()}
+
+# Messages checked against the state of the room (see game.legal_move)
+MOVE_MESSAGES = ("use card", "more cards")
+
+# Journaled room events: event type -> event type
+WINNER_EVENTS = {
+    "send.turn_winner": "turn winner",
+    "send.round_winner": "round winner",
+    "send.game_winner": "game winner",
+}
+
+
+class JournalTruncated(Exception):
+    """ The journal of a room misses its first events (removed by the
+    retention) or events in between """
+
+
+def apply_message(room_data: RoomState, username: str, message_type: str,
+                  message_value) -> tuple[RoomState, tuple]:
+    """ game.handle_message, also returning the journal events of the message
+
+    A "timeout" message (value: room seq when the deadline started) applies
+    the pending action of the player (see game.pending_action), if the game
+    still waits for it. When the room moved since, the player may have been
+    waiting for less than a deadline: the timeout only asks the consumer
+    for a new deadline ("turn.deadline" message). Timeouts of players that
+    left the room have no seq, they apply at once.
+
+    Illegal moves (see game.legal_move) leave the room as it is and get an
+    error message.
+
+    Returns:
+        tuple[RoomState, tuple]: (room_data, (messages, disconnect, events)).
+        The messages of accepted messages have the room "seq"
+    """
+
+    if room_data is None:
+        room_data, (messages, disconnect) = handle_message(
+            room_data, username, message_type, message_value
+        )
+        return room_data, (messages, disconnect, [])
+
+    if message_type in MOVE_MESSAGES \
+            and not legal_move(room_data, username, message_type, message_value):
+        REJECTED.inc(consumer="match", reason="illegal")
+        messages = [(False, {
+            "type": "send.error",
+            "value": "Movimiento no válido"
+        })]
+        return room_data, (messages, False, [])
+
+    if message_type == "timeout":
+        action = pending_action(room_data, username)
+        if action is None:
+            return room_data, ([], False, [])
+        if message_value is not None and message_value != room_data.seq:
+            messages = [(False, {"type": "turn.deadline", "seq": room_data.seq})]
+            return room_data, (messages, False, [])
+        message_type, message_value = action
+
+    seq = room_data.seq
+    room_data, (messages, disconnect) = handle_message(
+        room_data, username, message_type, message_value
+    )
+
+    # Only messages accepted by the room are journaled
+    events = []
+    if room_data.seq != seq:
+        for _, message in messages:
+            message["seq"] = room_data.seq
+
+        event = {
+            "seq": room_data.seq,
+            "type": INPUT_EVENTS[message_type],
+            "player": username,
+        }
+        if message_type == "username":
+            event["seed"] = room_data.seed
+        if message_type == "use card":
+            event["card"] = message_value
+        events.append(event)
+
+        for _, message in messages:
+            coalesced = message["value"] \
+                if message["type"] == "send.turn_result" else [message]
+            for message in coalesced:
+                if message["type"] in WINNER_EVENTS:
+                    events.append({
+                        "seq": room_data.seq,
+                        "type": WINNER_EVENTS[message["type"]],
+                        "value": message["value"],
+                    })
+
+        # The game result, for the results writer
+        if events[-1]["type"] == "game winner":
+            events[-1]["round"] = room_data.round
+            events[-1]["points"] = {
+                player.username: player.wins_round
+                for player in room_data.players
+            }
+
+    return room_data, (messages, disconnect, events)
+
+
+class Journal(ABC):
+    """ Append only log of the events of each room
+
+    append() only buffers the events. A background task writes them in
+    batches every settings.JOURNAL_FLUSH_SECONDS, or as soon as
+    settings.JOURNAL_BATCH_SIZE events are waiting.
+    """
+
+    def __init__(self, batch_size: int = None, flush_seconds: float = None):
+        self.batch_size = batch_size or settings.JOURNAL_BATCH_SIZE
+        self.flush_seconds = flush_seconds or settings.JOURNAL_FLUSH_SECONDS
+
+        # (room, event) pairs waiting to be written, and being written
+        self.buffer = []
+        self.writing = []
+        self.flush_task = None
+        self.wakeup = asyncio.Event()
+
+    @abstractmethod
+    async def write_batch(self, batch: list[tuple[str, dict]]):
+        """ Write (room, event) pairs """
+
+    @abstractmethod
+    async def read_written(self, room: str) -> list[dict]:
+        """ Events of a room already written """
+
+    def append(self, room: str, events: list[dict]):
+        """ Queue events of a room to be written """
+
+        if not events:
+            return
+
+        self.buffer.extend((room, event) for event in events)
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.run())
+        if len(self.buffer) >= self.batch_size:
+            self.wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """ Write the buffered events """
+
+        if not self.buffer:
+            return
+
+        self.writing, self.buffer = self.buffer, []
+        try:
+            await self.write_batch(self.writing)
+        except Exception:
+            logger.exception("Journal write failed, retrying later")
+            self.buffer[:0] = self.writing
+        finally:
+            self.writing = []
+
+    async def read(self, room: str) -> list[dict]:
+        """ All the events of a room, including the not written ones """
+
+        events = await self.read_written(room)
+        for event_room, event in self.writing + self.buffer:
+            if event_room == room:
+                events.append(event)
+        return events
+
+    async def replay_inputs(self, room: str):
+        """ Apply the journaled inputs of a room again, in order
+
+        Args:
+            room (str): Room group name
+
+        Yields:
+            tuple[str, RoomState, list]: (player, room_data, messages) after
+            each input
+
+        Raises:
+            JournalTruncated: the inputs do not start with the first join
+                of the room, or miss a seq
+        """
+
+        room_data = None
+        for event in sorted(await self.read(room), key=lambda event: event["seq"]):
+            message_type = REPLAY_MESSAGES.get(event["type"])
+            if message_type is None:
+                continue
+
+            # Each input moves the room to the next seq, from the first join
+            seq = 0 if room_data is None else room_data.seq
+            if event["seq"] != seq + 1 \
+                    or room_data is None and "seed" not in event:
+                raise JournalTruncated(room)
+
+            if room_data is None:
+                room_data = RoomState(seed=event["seed"])
+            room_data, (messages, _, _) = apply_message(
+                room_data, event["player"], message_type, event.get("card")
+            )
+            yield event["player"], room_data, messages
+
+    async def replay(self, room: str) -> RoomState | None:
+        """ Rebuild the state of a room from its journal
+
+        Args:
+            room (str): Room group name
+
+        Returns:
+            RoomState | None: room state, None if the room has no events
+            or its journal is truncated
+        """
+
+        room_data = None
+        try:
+            async for _, room_data, _ in self.replay_inputs(room):
+                pass
+        except JournalTruncated:
+            logger.warning("Journal of %s is truncated, not replayed", room)
+            return None
+        return room_data
+
+    async def missed_messages(self, room: str, username: str,
+                              seq: int) -> tuple[int, list[dict]]:
+        """ Events a player of the room received after a sequence number
+
+        Args:
+            room (str): Room group name
+            username (str): player username
+            seq (int): last sequence number seen by the player
+
+        Returns:
+            tuple[int, list[dict]]: (last journaled seq, events). The seq is
+            0 when the room has no events or its journal is truncated
+        """
+
+        last_seq = 0
+        missed = []
+        try:
+            async for player, room_data, messages in self.replay_inputs(room):
+                last_seq = room_data.seq
+                if last_seq <= seq:
+                    continue
+                missed.extend(
+                    message for to_room, message in messages
+                    if to_room or player == username
+                )
+        except JournalTruncated:
+            return 0, []
+        return last_seq, missed
+
+
+class NullJournal(Journal):
+    """ Journal that forgets every event """
+
+    def append(self, room: str, events: list[dict]):
+        pass
+
+    async def write_batch(self, batch: list[tuple[str, dict]]):
+        pass
+
+    async def read_written(self, room: str) -> list[dict]:
+        return []
+
+
+class SegmentFileJournal(Journal):
+    """ Journal in local json lines segment files
+
+    Events are appended to the newest segment, and a new one is started
+    when it reaches settings.JOURNAL_SEGMENT_BYTES. Only the newest
+    settings.JOURNAL_MAX_SEGMENTS segments are kept, and the older ones with
+    events of unfinished rooms (without game winner, and with events in the
+    last settings.ROOM_IDLE_SECONDS) until the rooms finish, so live rooms
+    can always be replayed. File access runs in threads, and an index of
+    the segments of each room (built on the first read or write) avoids
+    scanning segments without events of the room.
+    """
+
+    def __init__(self, directory: str = None, segment_bytes: int = None,
+                 max_segments: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = Path(directory or settings.JOURNAL_DIR)
+        self.segment_bytes = segment_bytes or settings.JOURNAL_SEGMENT_BYTES
+        self.max_segments = max_segments or settings.JOURNAL_MAX_SEGMENTS
+
+        # room -> names of the segments with its events
+        self.index = None
+        # unfinished room -> [name of its first segment, last write time]
+        self.unfinished = None
+
+    def segments(self) -> list[Path]:
+        return sorted(self.directory.glob("segment-*.jsonl"))
+
+    def write_lines(self, batch: list[tuple[str, dict]],
+                    keep_from: str = None) -> tuple[Path, list[Path]]:
+        """ Append the events to the newest segment (runs in a thread)
+
+        Args:
+            batch (list[tuple[str, dict]]): (room, event) pairs
+            keep_from (str): name of the oldest segment the retention keeps
+
+        Returns:
+            tuple[Path, list[Path]]: (written segment, deleted segments)
+        """
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = self.segments()
+        deleted = []
+        if not segments or segments[-1].stat().st_size >= self.segment_bytes:
+            number = int(segments[-1].stem.split("-")[1]) + 1 if segments else 1
+            segments.append(self.directory / f"segment-{number:08d}.jsonl")
+
+            # Retention
+            while len(segments) > self.max_segments \
+                    and (keep_from is None or segments[0].name < keep_from):
+                segment = segments.pop(0)
+                segment.unlink()
+                deleted.append(segment)
+
+        lines = "".join(
+            json.dumps({"room": room, **event}) + "\n" for room, event in batch
+        )
+        with open(segments[-1], "a") as file:
+            file.write(lines)
+
+        return segments[-1], deleted
+
+    def build_index(self) -> tuple[dict, dict]:
+        """ Segments of each room, and the first segment of each unfinished
+        room (runs in a thread) """
+
+        index = {}
+        first_segments = {}
+        for segment in self.segments():
+            with open(segment) as file:
+                for line in file:
+                    event = json.loads(line)
+                    room = event["room"]
+                    index.setdefault(room, set()).add(segment.name)
+                    if event["type"] == "game winner":
+                        first_segments.pop(room, None)
+                    else:
+                        first_segments.setdefault(room, segment.name)
+        return index, first_segments
+
+    async def load_index(self):
+        self.index, first_segments = await asyncio.to_thread(self.build_index)
+        now = time.monotonic()
+        self.unfinished = {
+            room: [name, now] for room, name in first_segments.items()
+        }
+
+    def keep_from(self) -> str | None:
+        """ Oldest segment with events of an unfinished room, forgetting the
+        rooms without events in settings.ROOM_IDLE_SECONDS (expired) """
+
+        deadline = time.monotonic() - settings.ROOM_IDLE_SECONDS
+        for room, (_, written_at) in list(self.unfinished.items()):
+            if written_at < deadline:
+                del self.unfinished[room]
+        return min((name for name, _ in self.unfinished.values()), default=None)
+
+    def read_segments(self, room: str, names: list[str]) -> list[dict]:
+        """ Events of a room in the given segments (runs in a thread) """
+
+        events = []
+        for name in names:
+            try:
+                with open(self.directory / name) as file:
+                    for line in file:
+                        event = json.loads(line)
+                        if event.pop("room") == room:
+                            events.append(event)
+            except FileNotFoundError:
+                continue
+        return events
+
+    async def write_batch(self, batch: list[tuple[str, dict]]):
+        if self.index is None:
+            await self.load_index()
+
+        segment, deleted = await asyncio.to_thread(
+            self.write_lines, batch, self.keep_from()
+        )
+        now = time.monotonic()
+        for room, event in batch:
+            self.index.setdefault(room, set()).add(segment.name)
+            if event["type"] == "game winner":
+                self.unfinished.pop(room, None)
+            else:
+                self.unfinished.setdefault(room, [segment.name, now])[1] = now
+        # Forget the rooms that lost all their segments
+        if deleted:
+            deleted_names = {segment.name for segment in deleted}
+            for room, names in list(self.index.items()):
+                names -= deleted_names
+                if not names:
+                    del self.index[room]
+
+    async def read_written(self, room: str) -> list[dict]:
+        if self.index is None:
+            await self.load_index()
+
+        names = sorted(self.index.get(room, ()))
+        if not names:
+            return []
+        return await asyncio.to_thread(self.read_segments, room, names)
+
+
+class RedisStreamJournal(Journal):
+    """ Journal in a redis stream per room, written with one pipeline per
+    batch. Streams expire settings.ROOM_STORE_TTL after their last event """
+
+    def __init__(self, ttl: int = None, prefix: str = "journal", **kwargs):
+        super().__init__(**kwargs)
+        self.ttl = ttl or settings.ROOM_STORE_TTL
+        self.prefix = prefix
+        self.redis = get_redis()
+
+    def key(self, room: str) -> str:
+        return f"{self.prefix}:{room}"
+
+    async def write_batch(self, batch: list[tuple[str, dict]]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for room, event in batch:
+                pipe.xadd(self.key(room), {"event": json.dumps(event)})
+            for room in {room for room, _ in batch}:
+                pipe.expire(self.key(room), self.ttl)
+            await pipe.execute()
+
+    async def read_written(self, room: str) -> list[dict]:
+        entries = await self.redis.xrange(self.key(room))
+        return [json.loads(fields[b"event"]) for _, fields in entries]
+
+
+journal = None
+
+
+def get_journal() -> Journal:
+    """ Get the journal configured in settings.JOURNAL_BACKEND
+
+    Returns:
+        Journal: journal shared by the current process
+    """
+
+    global journal
+    if journal is None:
+        if settings.JOURNAL_BACKEND == "redis":
+            journal = RedisStreamJournal()
+        elif settings.JOURNAL_BACKEND == "file":
+            journal = SegmentFileJournal()
+        else:
+            journal = NullJournal()
+    return journal
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import time
+
+from channels.exceptions import ChannelFull
+from channels_redis.core import RedisChannelLayer
+
+from .metrics import LAYER_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# Send to a channel key within its capacity, in one round trip:
+# KEYS[1] channel key, ARGV message, now, expiry, capacity
+SEND_SCRIPT = """
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, ARGV[2] - ARGV[3])
+    if redis.call('ZCOUNT', KEYS[1], '-inf', '+inf') >= tonumber(ARGV[4]) then
+        return 0
+    end
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return 1
+"""
+
+
+class HybridChannelLayer(RedisChannelLayer):
+    """ Redis channel layer that skips Redis between sockets of this process
+
+    The layer keeps the local members of each group. A group_send whose
+    members are all in this process (the Redis group has as many members as
+    the local index, one ZCARD) is delivered through in-process queues: no
+    serialization and no Redis round trips for each member. Other groups,
+    and channels of other processes, go through Redis as usual. Messages
+    delivered in-process are shared, not copied: they must not be changed
+    after sending (room events already are, see frames.with_frames).
+
+    Each channel received in this process has a queue fed by local senders
+    and by a task receiving its Redis messages. Sends to other processes and
+    group_add use one round trip each (a script and a pipeline) instead of
+    one per command.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Channel -> queue of the channels received in this process, and
+        # task moving their Redis messages to the queue
+        self.inboxes = {}
+        self.pumps = {}
+
+        # Group -> channels of this process in the group, and channel ->
+        # its groups
+        self.local_groups = {}
+        self.channel_groups = {}
+
+    def is_local(self, channel: str) -> bool:
+        """ Whether a channel belongs to this process (see new_channel) """
+        return self.non_local_name(channel).endswith(self.client_prefix + "!")
+
+    def inbox(self, channel: str) -> asyncio.Queue:
+        inbox = self.inboxes.get(channel)
+        if inbox is None:
+            inbox = self.inboxes[channel] = asyncio.Queue()
+        return inbox
+
+    def deliver(self, channel: str, message: dict) -> bool:
+        """ Put a message in the queue of a local channel
+
+        Returns:
+            bool: False if the channel is full
+        """
+
+        inbox = self.inbox(channel)
+        if inbox.qsize() >= self.get_capacity(channel):
+            return False
+        inbox.put_nowait(message)
+        return True
+
+    async def pump(self, channel: str, inbox: asyncio.Queue):
+        """ Move the messages other processes send to a channel to its queue """
+
+        while True:
+            inbox.put_nowait(await super().receive(channel))
+
+    async def receive(self, channel: str) -> dict:
+        if not self.is_local(channel):
+            return await super().receive(channel)
+
+        inbox = self.inbox(channel)
+        if channel not in self.pumps:
+            self.pumps[channel] = asyncio.create_task(self.pump(channel, inbox))
+        try:
+            return await inbox.get()
+        except asyncio.CancelledError:
+
+            # The consumer of the channel stopped
+            self.close_channel(channel)
+            raise
+
+    def close_channel(self, channel: str):
+        self.inboxes.pop(channel, None)
+        pump = self.pumps.pop(channel, None)
+        if pump is not None:
+            pump.cancel()
+        for group in self.channel_groups.pop(channel, ()):
+            self.discard_local(group, channel)
+
+    async def send(self, channel: str, message: dict):
+        assert self.valid_channel_name(channel), "Channel name not valid"
+
+        if channel in self.inboxes:
+            if not self.deliver(channel, message):
+                raise ChannelFull()
+            LAYER_MESSAGES.inc(route="local")
+            return
+
+        if "!" not in channel:
+            await super().send(channel, message)
+            LAYER_MESSAGES.inc(route="redis")
+            return
+
+        # Channel of another process
+        message = dict(message, __asgi_channel__=channel)
+        channel_key = self.prefix + self.non_local_name(channel)
+        connection = self.connection(self.consistent_hash(channel))
+        sent = await connection.eval(
+            SEND_SCRIPT, 1, channel_key, self.serialize(message),
+            time.time(), int(self.expiry), self.get_capacity(channel),
+        )
+        if not sent:
+            raise ChannelFull()
+        LAYER_MESSAGES.inc(route="redis")
+
+    async def group_add(self, group: str, channel: str):
+        assert self.valid_group_name(group), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+
+        group_key = self._group_key(group)
+        connection = self.connection(self.consistent_hash(group))
+        async with connection.pipeline(transaction=False) as pipe:
+            pipe.zadd(group_key, {channel: time.time()})
+            pipe.expire(group_key, self.group_expiry)
+            await pipe.execute()
+
+        if self.is_local(channel):
+            self.local_groups.setdefault(group, set()).add(channel)
+            self.channel_groups.setdefault(channel, set()).add(group)
+
+    def discard_local(self, group: str, channel: str):
+        channels = self.local_groups.get(group)
+        if channels is not None:
+            channels.discard(channel)
+            if not channels:
+                del self.local_groups[group]
+
+    async def group_discard(self, group: str, channel: str):
+        await super().group_discard(group, channel)
+        self.discard_local(group, channel)
+        groups = self.channel_groups.get(channel)
+        if groups is not None:
+            groups.discard(group)
+            if not groups:
+                del self.channel_groups[channel]
+
+    async def group_send(self, group: str, message: dict):
+        assert self.valid_group_name(group), "Group name not valid"
+
+        channels = self.local_groups.get(group)
+        if channels:
+            connection = self.connection(self.consistent_hash(group))
+            members = await connection.zcard(self._group_key(group))
+            if members == len(channels):
+                for channel in list(channels):
+                    if not self.deliver(channel, message):
+                        logger.info("Channel %s over capacity in group %s", channel, group)
+                LAYER_MESSAGES.inc(len(channels), route="local")
+                return
+
+        await super().group_send(group, message)
+        LAYER_MESSAGES.inc(route="redis")
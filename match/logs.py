@@ -0,0 +1,43 @@
+import logging
+import queue
+import random
+
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+# Logger for per message records, only a sample of them is emitted
+sampled_logger = logging.getLogger("match.sampled")
+
+log_listener = None
+
+
+class SampleFilter(logging.Filter):
+    """ Let pass a random fraction of the records """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return random.random() < self.rate
+
+
+def setup_logging():
+    """ Send the "match" logs through a queue to a listener thread, so the
+    event loop never waits for stdout """
+
+    global log_listener
+    if log_listener is not None:
+        return
+
+    records = queue.SimpleQueue()
+    log_listener = QueueListener(records, logging.StreamHandler())
+    log_listener.start()
+
+    logger = logging.getLogger("match")
+    logger.addHandler(QueueHandler(records))
+    logger.setLevel(settings.MATCH_LOG_LEVEL)
+    logger.propagate = False
+
+    sampled_logger.addFilter(SampleFilter(settings.LOG_SAMPLE_RATE))
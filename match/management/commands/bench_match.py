@@ -0,0 +1,70 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from match.bench import BASELINE_PATH, compare, run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmark the match consumers handlers with scripted games"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--protocol-version", type=int, default=1)
+        parser.add_argument("--baseline", default=BASELINE_PATH)
+        parser.add_argument(
+            "--save-baseline", action="store_true",
+            help="Save the results as the new baseline"
+        )
+        parser.add_argument(
+            "--max-regression", type=float, default=None,
+            help="Fail if a metric is this percent worse than the baseline"
+        )
+
+    def handle(self, *args, **options):
+        summary = run_benchmark(
+            options["games"], options["seed"], options["protocol_version"]
+        )
+
+        games = summary.pop("games")
+        self.stdout.write(
+            f"{games['count']} games, {games['turns']} turns, "
+            f"{games.get('alloc_bytes_per_turn', 0):.0f} bytes allocated per turn"
+        )
+        self.stdout.write(
+            f"{'message':<20}{'count':>7}{'p50 us':>10}{'p90 us':>10}"
+            f"{'p99 us':>10}{'store ops':>11}{'alloc B':>10}"
+        )
+        for message_type, values in summary.items():
+            self.stdout.write(
+                f"{message_type:<20}{values['count']:>7}"
+                f"{values['p50_us']:>10.1f}{values['p90_us']:>10.1f}"
+                f"{values['p99_us']:>10.1f}{values['store_ops']:>11.2f}"
+                f"{values.get('alloc_bytes', 0):>10.0f}"
+            )
+        summary["games"] = games
+
+        if options["save_baseline"]:
+            with open(options["baseline"], "w") as file:
+                json.dump(summary, file, indent=4, sort_keys=True)
+            self.stdout.write(f"Baseline saved in {options['baseline']}")
+            return
+
+        try:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            self.stdout.write("No baseline to compare (use --save-baseline)")
+            return
+
+        regressions = []
+        self.stdout.write("Change against baseline:")
+        for metric, change in sorted(compare(summary, baseline).items()):
+            self.stdout.write(f"  {metric:<36}{change:>+8.1f}%")
+            if options["max_regression"] is not None \
+                    and change > options["max_regression"]:
+                regressions.append(metric)
+
+        if regressions:
+            raise CommandError(f"Regressions: {', '.join(regressions)}")
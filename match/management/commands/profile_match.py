@@ -0,0 +1,54 @@
+import io
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from match.bench import profile_games
+
+
+class Command(BaseCommand):
+    help = "Profile the match consumers with scripted games (flame graph and summary)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--protocol-version", type=int, default=1)
+        parser.add_argument(
+            "--interval", type=float, default=0.001,
+            help="Seconds of CPU time between stack samples"
+        )
+        parser.add_argument(
+            "--output", default="profile",
+            help="Path prefix of the .collapsed and .pstats files"
+        )
+        parser.add_argument(
+            "--sort", default="cumulative",
+            help="pstats sort key of the summary (cumulative, tottime, calls...)"
+        )
+        parser.add_argument("--limit", type=int, default=30)
+
+    def handle(self, *args, **options):
+        stats, sampler = profile_games(
+            options["games"], options["seed"], options["protocol_version"],
+            options["interval"]
+        )
+
+        # Flame graph input: flamegraph.pl, speedscope or inferno read it
+        output = Path(options["output"])
+        collapsed_path = output.with_name(output.name + ".collapsed")
+        sampler.write(collapsed_path)
+        self.stdout.write(
+            f"{sum(sampler.stacks.values())} samples of "
+            f"{len(sampler.stacks)} stacks saved in {collapsed_path}"
+        )
+
+        # Full cProfile data, for snakeviz or pstats
+        pstats_path = output.with_name(output.name + ".pstats")
+        stats.dump_stats(pstats_path)
+        self.stdout.write(f"cProfile stats saved in {pstats_path}")
+
+        # Per function summary
+        stats.stream = io.StringIO()
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
+        self.stdout.write(stats.stream.getvalue())
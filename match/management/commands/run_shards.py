@@ -0,0 +1,178 @@
+import contextlib
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from match.shards import write_ring
+
+
+class Command(BaseCommand):
+    help = (
+        "Run daphne workers with room affinity on this host. "
+        "SIGUSR1 adds a worker and SIGUSR2 removes the newest one"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--base-port", type=int, default=8001)
+        parser.add_argument(
+            "--public-url", default="http://{host}:{port}",
+            help="Url of each worker for the players, formatted with host and port"
+        )
+        parser.add_argument(
+            "--ring-file", default=str(settings.BASE_DIR / "shards.json")
+        )
+        parser.add_argument(
+            "--drain-seconds", type=float, default=30,
+            help="Seconds removed workers keep serving their pinned rooms"
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+
+        # shard name -> (port, process)
+        self.workers = {}
+        # shard name -> (stop time, port, process) of removed workers
+        self.draining = {}
+        self.next_index = 0
+
+        # Signals only queue ring changes, the loop applies them
+        self.pending = []
+        self.running = True
+        signal.signal(signal.SIGUSR1, lambda *_: self.pending.append("add"))
+        signal.signal(signal.SIGUSR2, lambda *_: self.pending.append("remove"))
+        for stop_signal in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(stop_signal, lambda *_: setattr(self, "running", False))
+
+        for _ in range(options["workers"]):
+            self.add_worker()
+        self.write_ring()
+
+        try:
+            while self.running:
+                time.sleep(1)
+                self.apply_pending()
+                self.restart_crashed()
+                self.stop_drained()
+        finally:
+            processes = [process for _, process in self.workers.values()]
+            processes += [process for _, _, process in self.draining.values()]
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(options["ring_file"])
+
+    def worker_url(self, port: int) -> str:
+        return self.options["public_url"].format(
+            host=self.options["host"], port=port
+        )
+
+    def start_worker(self, name: str, port: int) -> subprocess.Popen:
+        """ Start a daphne process serving the rooms of a shard """
+
+        env = {
+            **os.environ,
+            "SHARD_NAME": name,
+            "SHARD_RING_FILE": self.options["ring_file"],
+        }
+
+        # Rooms are played in the memory of their worker, with snapshots
+        # and journal in redis: a restarted worker, or the next shard of a
+        # room of a stopped one, resumes the games. Matchmaking, room names
+        # and shard pins are shared (unless configured otherwise)
+        env.setdefault("MATCH_ENGINE", "actor")
+        env.setdefault("MATCHMAKING_BACKEND", "redis")
+        env.setdefault("ROOM_REGISTRY_BACKEND", "redis")
+        env.setdefault("ROOM_STORE_BACKEND", "redis")
+        env.setdefault("JOURNAL_BACKEND", "redis")
+
+        return subprocess.Popen(
+            [
+                sys.executable, "-m", "daphne",
+                "--bind", self.options["host"], "--port", str(port),
+                "core.asgi:application",
+            ],
+            env=env,
+        )
+
+    def add_worker(self) -> str:
+        name = f"worker{self.next_index}"
+        port = self.options["base_port"] + self.next_index
+        self.next_index += 1
+        self.workers[name] = (port, self.start_worker(name, port))
+        self.stdout.write(f"Started {name} on port {port}")
+        return name
+
+    def write_ring(self):
+        """ Publish the workers, the workers reload the file when it changes """
+
+        write_ring(
+            self.options["ring_file"],
+            {
+                name: self.worker_url(port)
+                for name, (port, _) in self.workers.items()
+            },
+            {
+                name: self.worker_url(port)
+                for name, (_, port, _) in self.draining.items()
+            },
+        )
+
+    def apply_pending(self):
+        """ Add or remove the workers requested by signals, placing the new
+        rooms with a new ring (rooms already started stay in their pinned
+        worker, see shards.ShardMap) """
+
+        if not self.pending:
+            return
+
+        while self.pending:
+            action = self.pending.pop(0)
+            if action == "add":
+                self.add_worker()
+            elif len(self.workers) > 1:
+
+                # The newest worker leaves the ring at once (it gets no new
+                # rooms) and stops when its pinned games had time to end
+                name = max(self.workers, key=lambda name: self.workers[name][0])
+                port, process = self.workers.pop(name)
+                stop_at = time.monotonic() + self.options["drain_seconds"]
+                self.draining[name] = (stop_at, port, process)
+                self.stdout.write(f"Draining {name}")
+
+        self.write_ring()
+
+    def restart_crashed(self):
+        """ Start again the workers that exited (they keep their shard) """
+
+        for name, (port, process) in list(self.workers.items()):
+            if process.poll() is not None:
+                self.stdout.write(
+                    f"{name} exited with {process.returncode}, restarting"
+                )
+                self.workers[name] = (port, self.start_worker(name, port))
+
+    def stop_drained(self):
+        """ Stop the drained workers, their remaining rooms move to the
+        ring """
+
+        now = time.monotonic()
+        stopped = False
+        for name, (stop_at, _, process) in list(self.draining.items()):
+            if now >= stop_at:
+                process.terminate()
+                process.wait()
+                del self.draining[name]
+                stopped = True
+                self.stdout.write(f"Stopped {name}")
+
+        if stopped:
+            self.write_ring()
@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Simulate many games to tune MAX_POINTS and plan capacity (needs numpy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=1_000_000)
+        parser.add_argument("--max-points", type=int, default=settings.MAX_POINTS)
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--batch-games", type=int, default=100_000)
+        parser.add_argument("--protocol-version", type=int, default=2)
+
+    def handle(self, *args, **options):
+        try:
+            import numpy as np
+            from match.simulator import messages_per_game, simulate_games
+        except ImportError:
+            raise CommandError(
+                "numpy is required: pip install -r requirements-bench.txt"
+            )
+
+        start = time.perf_counter()
+        results = simulate_games(
+            options["games"], options["max_points"], options["seed"],
+            options["batch_games"]
+        )
+        seconds = time.perf_counter() - start
+
+        rounds = results["rounds"]
+        total_rounds = int(rounds.sum())
+        self.stdout.write(
+            f"{options['games']} games to {options['max_points']} points "
+            f"in {seconds:.2f}s"
+        )
+
+        # Game length distribution
+        percentiles = np.percentile(rounds, [50, 90, 99, 100])
+        self.stdout.write(
+            f"Rounds per game: mean {rounds.mean():.2f}, "
+            f"p50 {percentiles[0]:.0f}, p90 {percentiles[1]:.0f}, "
+            f"p99 {percentiles[2]:.0f}, max {percentiles[3]:.0f}"
+        )
+        lengths, counts = np.unique(rounds, return_counts=True)
+        for length, count in zip(lengths[:15], counts[:15]):
+            self.stdout.write(
+                f"  {length:>3} rounds {count / rounds.size:>8.2%}"
+            )
+
+        # Draw rates
+        self.stdout.write(
+            f"Draws: {results['turn_draws'] / (total_rounds * 3):.2%} of turns, "
+            f"{results['round_draws'] / total_rounds:.2%} of rounds"
+        )
+
+        # Messages per game
+        self.stdout.write("Messages per game (mean / p99):")
+        messages = messages_per_game(rounds, options["protocol_version"])
+        for name, values in messages.items():
+            self.stdout.write(
+                f"  {name:<12}{values.mean():>8.1f}"
+                f"{np.percentile(values, 99):>8.0f}"
+            )
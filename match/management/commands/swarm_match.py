@@ -0,0 +1,87 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test a running server with websocket clients playing full "
+        "games (needs websockets)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="ws://127.0.0.1:8000")
+        parser.add_argument("--clients", type=int, default=1000)
+        parser.add_argument(
+            "--games", type=int, default=1, help="Games played by each client"
+        )
+        parser.add_argument(
+            "--spawn-rate", type=float, default=100,
+            help="Clients started per second"
+        )
+        parser.add_argument(
+            "--think-seconds", type=float, default=1,
+            help="Mean seconds before each move"
+        )
+        parser.add_argument(
+            "--protocol-version", type=int, default=2, choices=(1, 2)
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=30,
+            help="Seconds to wait for a handshake or a frame"
+        )
+        parser.add_argument(
+            "--pair-seconds", type=float, default=5,
+            help="Seconds a client waits for a swarm opponent in its room"
+        )
+        parser.add_argument(
+            "--server-pid", type=int, action="append", default=[],
+            help="Server process to sample CPU and memory of (repeatable)"
+        )
+        parser.add_argument("--report-seconds", type=float, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            from match.swarm import Swarm, raise_open_files_limit
+        except ImportError:
+            raise CommandError(
+                "websockets is required: pip install -r requirements-bench.txt"
+            )
+
+        raise_open_files_limit()
+        swarm = Swarm(
+            options["url"], options["clients"], options["games"],
+            options["spawn_rate"], options["think_seconds"],
+            options["protocol_version"], options["timeout"],
+            options["pair_seconds"],
+        )
+        summary = asyncio.run(swarm.run(
+            self.stdout.write, options["report_seconds"], options["server_pid"]
+        ))
+
+        games = summary.pop("games")
+        server = summary.pop("server")
+        self.stdout.write(
+            f"{games['count']} games, {games['turns']} turns in "
+            f"{games['seconds']:.1f}s, {games['failed']} failed "
+            f"({games['error_rate']:.2%})"
+        )
+        for kind, count in sorted(games["errors"].items()):
+            self.stdout.write(f"  {kind:<12}{count:>7}")
+
+        self.stdout.write(
+            f"{'timing':<12}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}"
+            f"{'p99 ms':>10}{'max ms':>10}"
+        )
+        for name, values in summary.items():
+            self.stdout.write(
+                f"{name:<12}{values['count']:>8}"
+                f"{values['p50_ms']:>10.1f}{values['p90_ms']:>10.1f}"
+                f"{values['p99_ms']:>10.1f}{values['max_ms']:>10.1f}"
+            )
+
+        if options["server_pid"]:
+            self.stdout.write(
+                f"Server peak cpu {server['server_cpu_percent']:.1f}%, "
+                f"peak rss {server['server_rss_bytes'] / 2 ** 20:.1f} MB"
+            )
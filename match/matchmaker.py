@@ -0,0 +1,150 @@
+import asyncio
+import logging
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .bots import start_bot
+from .metrics import QUEUE_DEPTH
+from .queues import QueueEntry, get_matchmaking_queue
+from .rooms import get_room_registry
+from .shards import get_shard_map
+
+logger = logging.getLogger(__name__)
+
+# Room names tried to find one of the current shard for a bot match
+BOT_ROOM_ATTEMPTS = 64
+
+
+async def match_start_event(room_name: str) -> dict:
+    """ Event that sends a player to a room, with the url of the worker of
+    the room when rooms are sharded (the room is pinned to it). Each player
+    gets a ticket for the room from its matchmaker consumer """
+
+    event = {"type": "send.match_start", "room_name": room_name}
+    owner = await get_shard_map().pin(room_name)
+    if owner is not None:
+        event["shard"] = owner[1]
+    return event
+
+
+def opponent_username(username: str, taken: str) -> str:
+    """ Username of the second player of a match, distinct from the first
+    one (a room has a player per username) """
+
+    if username != taken:
+        return username
+    suffix = "2"
+    return username[:settings.MAX_USERNAME_LENGTH - len(suffix)] + suffix
+
+
+async def start_match(channel_layer, user1: QueueEntry, user2: QueueEntry):
+    """ Create a room for two users and send them the room name """
+
+    # Register a room with a unique name for the match
+    room_name = await get_room_registry().allocate()
+
+    # Both sends at once (layers do not change the events)
+    event = await match_start_event(room_name)
+    event2 = event
+    username = opponent_username(user2.username, user1.username)
+    if username != user2.username:
+        event2 = {**event, "username": username}
+    await asyncio.gather(
+        channel_layer.send(user1.channel_name, event),
+        channel_layer.send(user2.channel_name, event2),
+    )
+
+
+async def start_bot_match(channel_layer, user: str) -> bool:
+    """ Create a room for a user and a bot of the current process
+
+    With sharded rooms, the room name must belong to the current process
+    (where the bot runs), so names of other shards are skipped (and
+    released).
+
+    Returns:
+        bool: whether the match started
+    """
+
+    registry = get_room_registry()
+    shard_map = get_shard_map()
+    for _ in range(BOT_ROOM_ATTEMPTS):
+        room_name = await registry.allocate()
+        if shard_map.is_local(room_name):
+            break
+        await registry.release(room_name)
+    else:
+        return False
+
+    start_bot(room_name)
+    await channel_layer.send(user, await match_start_event(room_name))
+    return True
+
+
+class Matchmaker:
+    """ Task that pairs the matchmaking queue every
+    settings.MATCHMAKING_TICK_SECONDS, while the process has players in the
+    matchmaker (with the redis queue, the tick pairs players of every
+    process) """
+
+    def __init__(self):
+        self.queue = get_matchmaking_queue()
+        self.waiting = 0
+        self.task = None
+
+    def join(self):
+        """ Count a waiting player of the process, starting the ticks """
+
+        self.waiting += 1
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def leave(self):
+        """ Stop counting a player, the ticks stop with the last one """
+
+        self.waiting -= 1
+        if self.waiting == 0 and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.MATCHMAKING_TICK_SECONDS)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Matchmaking tick failed")
+
+    async def tick(self):
+        """ Start the matches of the paired players, and a bot match (or a
+        timeout when bots are disabled) for the players that waited too
+        long """
+
+        pairs, expired = await self.queue.pop_pairs()
+        channel_layer = get_channel_layer()
+        for user1, user2 in pairs:
+            await start_match(channel_layer, user1, user2)
+        for channel_name in expired:
+            if settings.MATCHMAKING_BOT_SECONDS > 0 \
+                    and await start_bot_match(channel_layer, channel_name):
+                continue
+            await channel_layer.send(channel_name, {"type": "send.match_timeout"})
+
+        QUEUE_DEPTH.set(await self.queue.size())
+
+
+matchmaker = None
+
+
+def get_matchmaker() -> Matchmaker:
+    """ Get the matchmaker of the current process
+
+    Returns:
+        Matchmaker: matchmaker shared by the current process
+    """
+
+    global matchmaker
+    if matchmaker is None:
+        matchmaker = Matchmaker()
+    return matchmaker
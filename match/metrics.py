@@ -0,0 +1,170 @@
+import bisect
+import contextlib
+import time
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels)
+    return f"{{{pairs}}}"
+
+
+class Metric:
+    """ Metric of the current process, with values per labels """
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+
+    def render(self) -> list[str]:
+        """ Lines of the metric in prometheus text format """
+
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(labels)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        counts = self.values.get(key)
+        if counts is None:
+            # Bucket counts, then +Inf count and sum
+            counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """ Observe the seconds spent in the block """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for labels, counts in sorted(self.values.items()):
+            cumulative = 0
+            for bucket, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = format_labels(labels + (("le", bucket),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """ Metrics exposed in the metrics endpoint """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.register(Histogram(
+    "pericon_handler_seconds", "Websocket message handling time by message type"
+))
+STORE_SECONDS = registry.register(Histogram(
+    "pericon_store_seconds", "Room store operations time by operation"
+))
+CACHE_SECONDS = registry.register(Histogram(
+    "pericon_cache_seconds", "Django cache operations time by operation"
+))
+GROUP_SENDS = registry.register(Counter(
+    "pericon_group_sends_total", "Channel layer group sends by event type"
+))
+GROUP_DELIVERIES = registry.register(Counter(
+    "pericon_group_deliveries_total",
+    "Group events received by the consumers (fan-out) by event type"
+))
+LAYER_MESSAGES = registry.register(Counter(
+    "pericon_layer_messages_total",
+    "Channel layer messages delivered in-process or through Redis, by route"
+))
+QUEUE_DEPTH = registry.register(Gauge(
+    "pericon_matchmaking_queue_depth", "Players waiting in the matchmaking queue"
+))
+QUEUE_WAIT_SECONDS = registry.register(Histogram(
+    "pericon_matchmaking_wait_seconds", "Time from joining the queue to a match",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+))
+ACTIVE_ROOMS = registry.register(Gauge(
+    "pericon_active_rooms", "Rooms with players connected to this process"
+))
+OPEN_SOCKETS = registry.register(Gauge(
+    "pericon_open_sockets", "Open websockets by consumer"
+))
+BOT_SEATS = registry.register(Gauge(
+    "pericon_bot_seats", "Bots playing in rooms of this process"
+))
+REJECTED = registry.register(Counter(
+    "pericon_rejected_total",
+    "Sockets and messages rejected by admission control by consumer and reason"
+))
+TURN_TIMEOUTS = registry.register(Counter(
+    "pericon_turn_timeouts_total",
+    "Turn deadlines that expired (the pending move of the player is played)"
+))
+ROOMS_EXPIRED = registry.register(Counter(
+    "pericon_rooms_expired_total", "Abandoned rooms dropped from the room store"
+))
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Match',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_name', models.CharField(db_index=True, max_length=64)),
+                ('winner', models.CharField(max_length=32)),
+                ('rounds', models.PositiveSmallIntegerField()),
+                ('finished_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'matches',
+            },
+        ),
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=32, unique=True)),
+                ('games', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('points', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'player stats',
+                'indexes': [models.Index(fields=['-wins', '-points', 'username'], name='stats_ranking_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlayerResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=32)),
+                ('points', models.PositiveSmallIntegerField()),
+                ('won', models.BooleanField()),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='match.match')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['username', 'match'], name='result_username_idx')],
+            },
+        ),
+    ]
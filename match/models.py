@@ -1,3 +1,62 @@
 from django.db import models
 
-# Create your models here.
+
+class Match(models.Model):
+    """ Finished game of a room """
+
+    room_name = models.CharField(max_length=64, db_index=True)
+    winner = models.CharField(max_length=32)
+    rounds = models.PositiveSmallIntegerField()
+    finished_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name_plural = "matches"
+
+    def __str__(self):
+        return f"{self.room_name} ({self.winner})"
+
+
+class PlayerResult(models.Model):
+    """ Points of a player in a finished game """
+
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name="results")
+    username = models.CharField(max_length=32)
+    points = models.PositiveSmallIntegerField()
+    won = models.BooleanField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["username", "match"], name="result_username_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.username}: {self.points}"
+
+
+class PlayerStats(models.Model):
+    """ Totals of the games of a player, updated when their results are
+    saved (the leaderboard reads them in ranking order) """
+
+    username = models.CharField(max_length=32, unique=True)
+    games = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    points = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "player stats"
+        indexes = [
+            models.Index(
+                fields=["-wins", "-points", "username"], name="stats_ranking_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return self.username
+
+    def as_dict(self) -> dict:
+        return {
+            "username": self.username,
+            "games": self.games,
+            "wins": self.wins,
+            "points": self.points,
+        }
@@ -0,0 +1,179 @@
+import collections
+import contextlib
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import zlib
+
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def frame_label(code) -> str:
+    """ Flame graph label of a function: module path and qualified name """
+
+    filename = code.co_filename
+    for path in sorted(sys.path, key=len, reverse=True):
+        if path and filename.startswith(path + os.sep):
+            filename = filename[len(path) + 1:]
+            break
+    return f"{filename}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """ Sampling profiler of the main thread (where the event loop runs)
+
+    A SIGPROF timer interrupts the thread every interval of CPU time and the
+    signal handler counts the interrupted stack, so the profiled code runs
+    untouched and time blocked waiting for sockets is not sampled. The
+    counts are written in the collapsed stacks format ("root;...;leaf
+    count" lines) read by flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.labels = {}
+        self.running = False
+
+    def should_sample(self) -> bool:
+        return True
+
+    def sample(self, signum: int, frame):
+        if not self.should_sample():
+            return
+
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = self.labels.get(code)
+            if label is None:
+                label = self.labels[code] = frame_label(code)
+            stack.append(label)
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        """ Start sampling (only from the main thread) """
+
+        signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self.running = True
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        self.running = False
+
+    def collapsed(self) -> str:
+        """ Samples in the collapsed stacks format """
+        return "".join(
+            f"{stack} {count}\n" for stack, count in sorted(self.stacks.items())
+        )
+
+    def write(self, path: Path, collapsed: str = None):
+        """ Write the collapsed stacks, replacing the file atomically """
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(path.suffix + ".tmp")
+        temporary.write_text(self.collapsed() if collapsed is None else collapsed)
+        temporary.replace(path)
+
+
+class RoomProfiler(StackSampler):
+    """ Opt-in profiler of live rooms
+
+    A stable fraction of the rooms (settings.PROFILE_ROOM_RATE, by room
+    name hash, so a profiled room is profiled in every message) is
+    profiled: the stacks sampled every settings.PROFILE_INTERVAL_SECONDS of
+    CPU time are only counted while messages of those rooms are handled.
+    The collapsed stacks of the process are written to settings.PROFILE_DIR
+    at most every settings.PROFILE_FLUSH_SECONDS, from a worker thread.
+    Tasks of other rooms that run while a profiled message awaits are in
+    the samples too.
+    """
+
+    def __init__(self):
+        super().__init__(settings.PROFILE_INTERVAL_SECONDS)
+        self.threshold = int(settings.PROFILE_ROOM_RATE * 2 ** 32)
+        self.path = Path(settings.PROFILE_DIR) / f"rooms-{os.getpid()}.collapsed"
+        self.active = 0
+        self.flushed_at = time.monotonic()
+
+    def profiled(self, room_name: str) -> bool:
+        return zlib.crc32(room_name.encode()) < self.threshold
+
+    @contextlib.contextmanager
+    def handling(self, room_name: str):
+        """ Count the samples taken while a message of the room is handled
+
+        Args:
+            room_name (str): room of the message
+        """
+
+        if not self.profiled(room_name):
+            yield
+            return
+
+        if not self.running:
+            if threading.current_thread() is not threading.main_thread():
+                logger.warning("Rooms profiler needs the event loop in the main thread")
+                self.threshold = 0
+                yield
+                return
+            self.start()
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            if time.monotonic() - self.flushed_at >= settings.PROFILE_FLUSH_SECONDS:
+                self.flush()
+
+    def should_sample(self) -> bool:
+        return self.active > 0
+
+    def flush(self):
+        self.flushed_at = time.monotonic()
+        threading.Thread(
+            target=self.write, args=(self.path, self.collapsed()),
+            name="rooms-profile", daemon=True,
+        ).start()
+
+
+class NullRoomProfiler(RoomProfiler):
+    """ Room profiler that profiles no room """
+
+    def __init__(self):
+        pass
+
+    def handling(self, room_name: str):
+        return contextlib.nullcontext()
+
+
+room_profiler = None
+
+
+def get_room_profiler() -> RoomProfiler:
+    """ Get the live rooms profiler, enabled by settings.PROFILE_ROOM_RATE
+
+    Returns:
+        RoomProfiler: profiler shared by the current process
+    """
+
+    global room_profiler
+    if room_profiler is None:
+        if settings.PROFILE_ROOM_RATE > 0:
+            room_profiler = RoomProfiler()
+        else:
+            room_profiler = NullRoomProfiler()
+    return room_profiler
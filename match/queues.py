@@ -0,0 +1,347 @@
+import bisect
+import json
+import math
+import time
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .redis_client import get_redis
+
+
+@dataclass(slots=True)
+class QueueEntry:
+    """ Player waiting for a match """
+
+    channel_name: str
+    rating: int
+    region: str
+    queued_at: float
+    last_seen: float
+    username: str = ""
+
+    def key(self) -> tuple:
+        """ Position in the rating sorted bucket of its region """
+        return self.rating, self.queued_at, self.channel_name
+
+
+class MatchmakingPool:
+    """ Players waiting for a match, in a rating sorted list per region
+
+    pop_pairs() pairs the players from the oldest one. Each player accepts
+    opponents of its region within a rating window that widens with the
+    wait, found with a binary search in the region bucket. Players waiting
+    settings.MATCHMAKING_MAX_WAIT_SECONDS accept the nearest rating of any
+    region, or leave the pool when nobody else is waiting. With bots
+    enabled, players leave the pool after settings.MATCHMAKING_BOT_SECONDS
+    without an acceptable opponent.
+    """
+
+    def __init__(self):
+        # channel name -> entry, in arrival order
+        self.entries = OrderedDict()
+        # region -> sorted entry keys
+        self.buckets = {}
+
+    def add(self, entry: QueueEntry):
+        self.entries[entry.channel_name] = entry
+        bisect.insort(self.buckets.setdefault(entry.region, []), entry.key())
+
+    def remove(self, channel_name: str) -> QueueEntry | None:
+        entry = self.entries.pop(channel_name, None)
+        if entry is None:
+            return None
+
+        bucket = self.buckets[entry.region]
+        del bucket[bisect.bisect_left(bucket, entry.key())]
+        if not bucket:
+            del self.buckets[entry.region]
+        return entry
+
+    def nearest(self, entry: QueueEntry, regions) -> QueueEntry | None:
+        """ Waiting player of the regions with the closest rating """
+
+        best = None
+        for region in regions:
+            bucket = self.buckets.get(region, [])
+            index = bisect.bisect_left(bucket, (entry.rating,))
+
+            # Closest lower rating and the two closest higher or equal ones
+            # (one of them can be the player itself)
+            for _, _, channel_name in bucket[max(0, index - 1):index + 2]:
+                if channel_name == entry.channel_name:
+                    continue
+                candidate = self.entries[channel_name]
+                if best is None or abs(candidate.rating - entry.rating) \
+                        < abs(best.rating - entry.rating):
+                    best = candidate
+        return best
+
+    def window(self, waited: float) -> float:
+        """ Rating difference accepted after waiting some seconds """
+
+        if waited >= settings.MATCHMAKING_MAX_WAIT_SECONDS:
+            return math.inf
+        return settings.MATCHMAKING_RATING_WINDOW \
+            + settings.MATCHMAKING_WINDOW_GROWTH * waited
+
+    def expired(self, waited: float, window: float) -> bool:
+        """ Whether a player without opponent stops waiting """
+
+        if window == math.inf:
+            return True
+        return 0 < settings.MATCHMAKING_BOT_SECONDS <= waited
+
+    def pop_pairs(self, now: float, stale_seconds: float) -> tuple[list, list, list]:
+        """ Take the players that can be paired now
+
+        Args:
+            now (float): current timestamp
+            stale_seconds (float): players not seen in these seconds are
+                dropped (their process is gone)
+
+        Returns:
+            tuple[list, list, list]: (pairs of entries, channel names that
+            waited too long without opponents, stale channel names)
+        """
+
+        stale = [
+            channel_name for channel_name, entry in self.entries.items()
+            if entry.last_seen < now - stale_seconds
+        ]
+        for channel_name in stale:
+            self.remove(channel_name)
+
+        pairs = []
+        expired = []
+        for channel_name in list(self.entries):
+            entry = self.entries.get(channel_name)
+            if entry is None:
+                continue
+
+            waited = now - entry.queued_at
+            window = self.window(waited)
+            regions = self.buckets if window == math.inf else (entry.region,)
+            opponent = self.nearest(entry, regions)
+            if opponent is not None \
+                    and abs(opponent.rating - entry.rating) <= window:
+                pairs.append((
+                    self.remove(channel_name),
+                    self.remove(opponent.channel_name),
+                ))
+            elif self.expired(waited, window):
+                self.remove(channel_name)
+                expired.append(channel_name)
+
+        return pairs, expired, stale
+
+
+class MatchmakingQueue(ABC):
+    """ Waiting queue used by the matchmaker to pair players
+
+    Entries are websocket channel names with the player rating, region and
+    username.
+    Each entry keeps the time it was last seen, and entries not seen in
+    settings.MATCHMAKING_STALE_SECONDS are dropped instead of being paired
+    (the player's process is gone). Pairs are made in batches by
+    pop_pairs() (see MatchmakingPool).
+    """
+
+    def __init__(self, stale_seconds: int = None):
+        if stale_seconds is None:
+            stale_seconds = settings.MATCHMAKING_STALE_SECONDS
+        self.stale_seconds = stale_seconds
+
+    @abstractmethod
+    async def push(self, channel_name: str, rating: int = None,
+                   region: str = None, username: str = ""):
+        """ Add a player to the queue """
+
+    @abstractmethod
+    async def touch(self, channel_name: str):
+        """ Refresh the last seen time of a player still in the queue """
+
+    @abstractmethod
+    async def cancel(self, channel_name: str):
+        """ Remove a player from the queue """
+
+    @abstractmethod
+    async def pop_pairs(self) -> tuple[list[tuple], list[str]]:
+        """ Atomically take the players that can be paired now
+
+        Returns:
+            tuple[list, list]: (pairs of entries, channel names that waited
+            too long without opponents)
+        """
+
+    @abstractmethod
+    async def size(self) -> int:
+        """ Number of players in the queue (including not reaped ones) """
+
+    def entry(self, channel_name: str, rating: int = None,
+              region: str = None, username: str = "") -> QueueEntry:
+        now = time.time()
+        return QueueEntry(
+            channel_name,
+            settings.MATCHMAKING_DEFAULT_RATING if rating is None else rating,
+            region or settings.MATCHMAKING_DEFAULT_REGION,
+            now, now, username,
+        )
+
+
+class MemoryMatchmakingQueue(MatchmakingQueue):
+    """ Queue of the current process (only pairs players of one node) """
+
+    def __init__(self, stale_seconds: int = None):
+        super().__init__(stale_seconds)
+        self.pool = MatchmakingPool()
+
+    async def push(self, channel_name: str, rating: int = None,
+                   region: str = None, username: str = ""):
+        self.pool.remove(channel_name)
+        self.pool.add(self.entry(channel_name, rating, region, username))
+
+    async def touch(self, channel_name: str):
+        entry = self.pool.entries.get(channel_name)
+        if entry is not None:
+            entry.last_seen = time.time()
+
+    async def cancel(self, channel_name: str):
+        self.pool.remove(channel_name)
+
+    async def pop_pairs(self) -> tuple[list[tuple], list[str]]:
+        pairs, expired, _ = self.pool.pop_pairs(time.time(), self.stale_seconds)
+        return pairs, expired
+
+    async def size(self) -> int:
+        return len(self.pool.entries)
+
+
+class RedisMatchmakingQueue(MatchmakingQueue):
+    """ Queue shared by every web process through redis
+
+    Entries are a hash of channel name -> json entry, and last seen times a
+    hash of channel name -> timestamp. The process that takes the tick lock
+    pairs every entry in a MatchmakingPool and removes the paired entries
+    with a script that skips pairs where a player cancelled meanwhile.
+    """
+
+    # KEYS: entries hash, seen hash. ARGV: channel name, timestamp
+    touch_script = """
+        if redis.call("HEXISTS", KEYS[1], ARGV[1]) == 1 then
+            redis.call("HSET", KEYS[2], ARGV[1], ARGV[2])
+        end
+    """
+
+    # KEYS: entries hash, seen hash. ARGV: pairs of channel names. Returns
+    # 1 for each pair taken, 0 when a player is not queued anymore
+    take_pairs_script = """
+        local taken = {}
+        for index = 1, #ARGV, 2 do
+            local first, second = ARGV[index], ARGV[index + 1]
+            if redis.call("HEXISTS", KEYS[1], first) == 1
+                    and redis.call("HEXISTS", KEYS[1], second) == 1 then
+                redis.call("HDEL", KEYS[1], first, second)
+                redis.call("HDEL", KEYS[2], first, second)
+                table.insert(taken, 1)
+            else
+                table.insert(taken, 0)
+            end
+        end
+        return taken
+    """
+
+    def __init__(self, stale_seconds: int = None, prefix: str = "matchmaking"):
+        super().__init__(stale_seconds)
+        self.entries_key = f"{prefix}:entries"
+        self.seen_key = f"{prefix}:seen"
+        self.tick_key = f"{prefix}:tick"
+        self.redis = get_redis()
+        self.touch_command = self.redis.register_script(self.touch_script)
+        self.take_pairs_command = self.redis.register_script(
+            self.take_pairs_script
+        )
+
+    async def push(self, channel_name: str, rating: int = None,
+                   region: str = None, username: str = ""):
+        entry = self.entry(channel_name, rating, region, username)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.entries_key, channel_name, json.dumps(
+                [entry.rating, entry.region, entry.queued_at, entry.username]
+            ))
+            pipe.hset(self.seen_key, channel_name, entry.last_seen)
+            await pipe.execute()
+
+    async def touch(self, channel_name: str):
+        await self.touch_command(
+            keys=[self.entries_key, self.seen_key],
+            args=[channel_name, time.time()]
+        )
+
+    async def cancel(self, channel_name: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(self.entries_key, channel_name)
+            pipe.hdel(self.seen_key, channel_name)
+            await pipe.execute()
+
+    async def pop_pairs(self) -> tuple[list[tuple], list[str]]:
+
+        # One process pairs the queue each tick
+        locked = await self.redis.set(
+            self.tick_key, 1, nx=True,
+            px=max(1, int(settings.MATCHMAKING_TICK_SECONDS * 1000)),
+        )
+        if not locked:
+            return [], []
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self.entries_key)
+            pipe.hgetall(self.seen_key)
+            entries, seen = await pipe.execute()
+
+        pool = MatchmakingPool()
+        for channel_name, data in entries.items():
+            rating, region, queued_at, username = json.loads(data)
+            last_seen = float(seen.get(channel_name, queued_at))
+            pool.add(QueueEntry(
+                channel_name.decode(), rating, region, queued_at, last_seen,
+                username,
+            ))
+        pairs, expired, stale = pool.pop_pairs(time.time(), self.stale_seconds)
+
+        if expired or stale:
+            await self.redis.hdel(self.entries_key, *expired, *stale)
+            await self.redis.hdel(self.seen_key, *expired, *stale)
+        if not pairs:
+            return [], expired
+
+        taken = await self.take_pairs_command(
+            keys=[self.entries_key, self.seen_key],
+            args=[entry.channel_name for pair in pairs for entry in pair]
+        )
+        return [pair for pair, ok in zip(pairs, taken) if ok], expired
+
+    async def size(self) -> int:
+        return await self.redis.hlen(self.entries_key)
+
+
+matchmaking_queue = None
+
+
+def get_matchmaking_queue() -> MatchmakingQueue:
+    """ Get the matchmaking queue configured in settings.MATCHMAKING_BACKEND
+
+    Returns:
+        MatchmakingQueue: queue instance shared by the current process
+    """
+
+    global matchmaking_queue
+    if matchmaking_queue is None:
+        if settings.MATCHMAKING_BACKEND == "redis":
+            matchmaking_queue = RedisMatchmakingQueue()
+        else:
+            matchmaking_queue = MemoryMatchmakingQueue()
+    return matchmaking_queue
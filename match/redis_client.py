@@ -0,0 +1,18 @@
+from django.conf import settings
+from redis import asyncio as aioredis
+
+# One connection pool per process, created on first use
+redis_client = None
+
+
+def get_redis() -> aioredis.Redis:
+    """ Get the shared async redis client of the current process
+
+    Returns:
+        aioredis.Redis: Redis client connected to settings.REDIS_URL
+    """
+
+    global redis_client
+    if redis_client is None:
+        redis_client = aioredis.from_url(settings.REDIS_URL)
+    return redis_client
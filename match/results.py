@@ -0,0 +1,241 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .bots import BOT_PREFIX
+from .metrics import CACHE_SECONDS
+from .models import Match, PlayerResult, PlayerStats
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_KEY = "leaderboard"
+
+
+def stats_key(username: str) -> str:
+    """ Cache key of the stats of a player (any username is a valid key) """
+    return f"stats:{username.encode().hex()}"
+
+
+def load_leaderboard() -> list[dict]:
+    """ Best players from the database (reads the ranking index) """
+
+    players = PlayerStats.objects.order_by("-wins", "-points", "username")
+    return [stats.as_dict() for stats in players[:settings.LEADERBOARD_SIZE]]
+
+
+def get_leaderboard() -> list[dict]:
+    """ Best players, from the cache
+
+    Returns:
+        list[dict]: stats of settings.LEADERBOARD_SIZE players at most
+    """
+
+    with CACHE_SECONDS.time(operation="get"):
+        leaderboard = cache.get(LEADERBOARD_KEY)
+    if leaderboard is None:
+        leaderboard = load_leaderboard()
+        with CACHE_SECONDS.time(operation="set"):
+            cache.set(LEADERBOARD_KEY, leaderboard, settings.LEADERBOARD_CACHE_SECONDS)
+    return leaderboard
+
+
+def get_player_stats(username: str) -> dict | None:
+    """ Stats of a player, from the cache
+
+    Returns:
+        dict | None: stats, None when the player has no saved games
+    """
+
+    key = stats_key(username)
+    with CACHE_SECONDS.time(operation="get"):
+        stats = cache.get(key)
+    if stats is None:
+        player = PlayerStats.objects.filter(username=username).first()
+        if player is None:
+            return None
+        stats = player.as_dict()
+        with CACHE_SECONDS.time(operation="set"):
+            cache.set(key, stats, settings.LEADERBOARD_CACHE_SECONDS)
+    return stats
+
+
+def update_leaderboard(changed: list[dict]):
+    """ Cache the new stats of some players and the leaderboard
+
+    The leaderboard is rebuilt from the committed stats (see
+    load_leaderboard), so the writers of several processes never overwrite
+    each other's results with a merge of an older leaderboard, and readers
+    always find it in the cache.
+
+    Args:
+        changed (list[dict]): stats of the players with new results
+    """
+
+    leaderboard = load_leaderboard()
+    with CACHE_SECONDS.time(operation="set_many"):
+        cache.set_many(
+            {
+                LEADERBOARD_KEY: leaderboard,
+                **{stats_key(stats["username"]): stats for stats in changed},
+            },
+            settings.LEADERBOARD_CACHE_SECONDS
+        )
+
+
+class ResultsWriter:
+    """ Saves finished games in the database
+
+    record() only queues the "game winner" journal events (see
+    journal.apply_message). A background thread saves them with bulk
+    inserts every settings.RESULTS_FLUSH_SECONDS, or as soon as
+    settings.RESULTS_BATCH_SIZE games are waiting, updating the players
+    stats and the cache in the same pass.
+    """
+
+    def __init__(self):
+        self.results = queue.SimpleQueue()
+        self.thread = None
+
+    def record(self, room_name: str, events: list[dict]):
+        """ Queue the result of a room, when the events end its game
+
+        Args:
+            room_name (str): room name
+            events (list[dict]): journal events of a message
+        """
+
+        for event in events:
+            if event["type"] == "game winner":
+                self.results.put((room_name, event, timezone.now()))
+                self.start()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run, name="results-writer", daemon=True
+            )
+            self.thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """ Save the queued results and stop the thread """
+
+        self.results.put(None)
+        self.thread.join(timeout=10)
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self.results.get()]
+            deadline = time.monotonic() + settings.RESULTS_FLUSH_SECONDS
+            while batch[-1] is not None and len(batch) < settings.RESULTS_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.results.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            if not batch:
+                continue
+
+            try:
+                update_leaderboard(self.write(batch))
+            except Exception:
+                logger.exception("Saving %s match results failed", len(batch))
+            finally:
+                close_old_connections()
+
+    def write(self, batch: list[tuple]) -> list[dict]:
+        """ Insert a batch of results
+
+        Args:
+            batch (list[tuple]): (room name, game winner event, finish time)
+
+        Returns:
+            list[dict]: new stats of the players of the batch
+        """
+
+        # username -> [games, wins, points] of the batch (bots have no stats)
+        totals = {}
+        with transaction.atomic():
+            matches = Match.objects.bulk_create([
+                Match(
+                    room_name=room_name,
+                    winner=event["value"],
+                    rounds=event["round"],
+                    finished_at=finished_at,
+                )
+                for room_name, event, finished_at in batch
+            ])
+
+            results = []
+            for match, (_, event, _) in zip(matches, batch):
+                for username, points in event["points"].items():
+                    won = username == event["value"]
+                    results.append(PlayerResult(
+                        match=match, username=username, points=points, won=won
+                    ))
+                    if username.startswith(BOT_PREFIX):
+                        continue
+                    total = totals.setdefault(username, [0, 0, 0])
+                    total[0] += 1
+                    total[1] += won
+                    total[2] += points
+            PlayerResult.objects.bulk_create(results)
+
+            # Add the batch to the totals in the database, so several
+            # processes can save results of the same player
+            PlayerStats.objects.bulk_create(
+                [PlayerStats(username=username) for username in totals],
+                ignore_conflicts=True,
+            )
+            for username, (games, wins, points) in totals.items():
+                PlayerStats.objects.filter(username=username).update(
+                    games=F("games") + games,
+                    wins=F("wins") + wins,
+                    points=F("points") + points,
+                )
+
+            return [
+                stats.as_dict()
+                for stats in PlayerStats.objects.filter(username__in=totals)
+            ]
+
+
+class NullResultsWriter(ResultsWriter):
+    """ Results writer that forgets every result """
+
+    def record(self, room_name: str, events: list[dict]):
+        pass
+
+
+results_writer = None
+
+
+def get_results_writer() -> ResultsWriter:
+    """ Get the results writer configured in settings.RESULTS_BACKEND
+
+    Returns:
+        ResultsWriter: writer shared by the current process
+    """
+
+    global results_writer
+    if results_writer is None:
+        if settings.RESULTS_BACKEND == "db":
+            results_writer = ResultsWriter()
+        else:
+            results_writer = NullResultsWriter()
+    return results_writer
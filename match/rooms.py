@@ -0,0 +1,308 @@
+import random
+import string
+import time
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .redis_client import get_redis
+from .store import get_room_state_store
+
+# Room lifecycle states
+WAITING = "waiting"
+PLAYING = "playing"
+FINISHED = "finished"
+ABANDONED = "abandoned"
+STATES = (WAITING, PLAYING, FINISHED, ABANDONED)
+
+# Room names are six lowercase letters. The n-th allocated room gets the
+# name of (NAME_MULTIPLIER * n + NAME_OFFSET) % NAME_SPACE, a bijection of
+# the name space (the multiplier is coprime with it), so names look random
+# but never repeat until the counter wraps. The counter of each process
+# starts at a random number, so names are not reused after a restart
+NAME_LETTERS = string.ascii_lowercase
+NAME_LENGTH = 6
+NAME_SPACE = len(NAME_LETTERS) ** NAME_LENGTH
+NAME_MULTIPLIER = 2654435761 % NAME_SPACE
+NAME_OFFSET = 104729
+
+
+def room_name(number: int) -> str:
+    """ Name of the n-th allocated room """
+
+    index = (NAME_MULTIPLIER * number + NAME_OFFSET) % NAME_SPACE
+    letters = []
+    for _ in range(NAME_LENGTH):
+        index, letter = divmod(index, len(NAME_LETTERS))
+        letters.append(NAME_LETTERS[letter])
+    return "".join(letters)
+
+
+def room_group_name(name: str) -> str:
+    """ Channel layer group (and room store key) of a room """
+    return f"room_{name}"
+
+
+class RoomRegistry(ABC):
+    """ Lifecycle of the rooms created by the matchmaker
+
+    Rooms are WAITING when allocated, PLAYING once both players joined,
+    then FINISHED after the game winner or ABANDONED when every player
+    left. Rooms expire when they have no activity for the seconds of their
+    state (settings.ROOM_IDLE_SECONDS, or settings.ROOM_FINISHED_SECONDS
+    for finished and abandoned rooms), and their state is removed from the
+    room store.
+    """
+
+    def __init__(self, idle_seconds: int = None, finished_seconds: int = None):
+        self.idle_seconds = idle_seconds or settings.ROOM_IDLE_SECONDS
+        self.finished_seconds = finished_seconds or settings.ROOM_FINISHED_SECONDS
+        self.store = get_room_state_store()
+
+    def ttl(self, state: str) -> int:
+        """ Seconds without activity before a room in the state expires """
+
+        if state in (FINISHED, ABANDONED):
+            return self.finished_seconds
+        return self.idle_seconds
+
+    @abstractmethod
+    async def allocate(self) -> str:
+        """ Register a new WAITING room with an unused name in O(1)
+
+        Returns:
+            str: room name
+        """
+
+    @abstractmethod
+    async def release(self, name: str):
+        """ Forget an allocated room that will not be used """
+
+    @abstractmethod
+    async def pin(self, name: str, shard: str):
+        """ Record the shard serving a room, kept while the room exists """
+
+    @abstractmethod
+    async def pinned(self, name: str) -> str | None:
+        """ Shard a room is pinned to, None if it is not pinned """
+
+    @abstractmethod
+    async def set_state(self, name: str, state: str):
+        """ Move a room to a state and refresh its expiration. Finished
+        rooms keep their state """
+
+    @abstractmethod
+    async def state(self, name: str) -> str | None:
+        """ State of a room, None if it is unknown or expired """
+
+    async def finish(self, name: str):
+        """ Mark a room as FINISHED and drop its state from the store """
+
+        await self.set_state(name, FINISHED)
+        await self.store.delete(room_group_name(name))
+
+    async def observe(self, name: str, messages: list[tuple[bool, dict]],
+                      events: list[dict]):
+        """ Update a room from the result of a message (see
+        journal.apply_message)
+
+        Args:
+            name (str): room name
+            messages (list[tuple[bool, dict]]): messages sent to the room
+            events (list[dict]): journal events of the message
+        """
+
+        if not events:
+            return
+
+        if any(event["type"] == "game winner" for event in events):
+            await self.finish(name)
+            return
+
+        # Both players joined, or the game goes on
+        joined = any(
+            event["type"] == "send_usernames" and len(event["value"]) == 2
+            for _, event in messages
+        )
+        if joined or any(event["type"] != "join" for event in events):
+            await self.set_state(name, PLAYING)
+        else:
+            await self.set_state(name, WAITING)
+
+
+class MemoryRoomRegistry(RoomRegistry):
+    """ Rooms of the current process
+
+    Rooms are kept in an ordered dict per state, ordered by last activity.
+    Every state has a fixed ttl, so expired rooms are always at the start
+    of the dicts and evict() only looks at expired rooms. At most
+    settings.ROOM_REGISTRY_MAX_ROOMS rooms are kept, evicting the oldest
+    ones (finished first) when allocating more.
+    """
+
+    # Eviction order when the registry is full
+    eviction_order = (FINISHED, ABANDONED, WAITING, PLAYING)
+
+    def __init__(self, max_rooms: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.max_rooms = max_rooms or settings.ROOM_REGISTRY_MAX_ROOMS
+        self.counter = random.randrange(NAME_SPACE)
+
+        # state -> room name -> last activity
+        self.rooms = {state: OrderedDict() for state in STATES}
+        # room name -> shard
+        self.pins = {}
+
+    def size(self) -> int:
+        return sum(len(rooms) for rooms in self.rooms.values())
+
+    def find(self, name: str) -> str | None:
+        for state, rooms in self.rooms.items():
+            if name in rooms:
+                return state
+        return None
+
+    async def evict(self, now: float = None) -> list[str]:
+        """ Remove the expired rooms and the oldest ones over the limit
+
+        Returns:
+            list[str]: names of the removed rooms
+        """
+
+        now = now or time.monotonic()
+        evicted = []
+        for state, rooms in self.rooms.items():
+            deadline = now - self.ttl(state)
+            while rooms:
+                name, last_seen = next(iter(rooms.items()))
+                if last_seen > deadline:
+                    break
+                rooms.popitem(last=False)
+                evicted.append(name)
+
+        for state in self.eviction_order:
+            rooms = self.rooms[state]
+            while rooms and self.size() >= self.max_rooms:
+                evicted.append(rooms.popitem(last=False)[0])
+
+        for name in evicted:
+            self.pins.pop(name, None)
+            await self.store.delete(room_group_name(name))
+        return evicted
+
+    async def allocate(self) -> str:
+        await self.evict()
+        name = room_name(self.counter)
+        self.counter += 1
+        self.rooms[WAITING][name] = time.monotonic()
+        return name
+
+    async def release(self, name: str):
+        state = self.find(name)
+        if state is not None:
+            del self.rooms[state][name]
+        self.pins.pop(name, None)
+
+    async def pin(self, name: str, shard: str):
+        self.pins[name] = shard
+
+    async def pinned(self, name: str) -> str | None:
+        return self.pins.get(name)
+
+    async def set_state(self, name: str, state: str):
+        current = self.find(name)
+        if current == FINISHED:
+            return
+        if current is not None:
+            del self.rooms[current][name]
+        else:
+            # Rooms not created by the matchmaker (joined by url)
+            await self.evict()
+        self.rooms[state][name] = time.monotonic()
+
+    async def state(self, name: str) -> str | None:
+        return self.find(name)
+
+
+class RedisRoomRegistry(RoomRegistry):
+    """ Rooms shared by every web process. The room counter is a redis
+    integer, that starts at a random number, and each room a key with its state, that redis expires (with
+    the key of its shard pin). The room store expires the state of expired
+    rooms (settings.ROOM_STORE_TTL)
+    """
+
+    # KEYS: room key, pin key. ARGV: state, ttl
+    set_state_script = """
+        if redis.call("GET", KEYS[1]) == "finished" then
+            return 0
+        end
+        redis.call("SET", KEYS[1], ARGV[1], "EX", ARGV[2])
+        redis.call("EXPIRE", KEYS[2], ARGV[2])
+        return 1
+    """
+
+    def __init__(self, prefix: str = "registry", **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+        self.redis = get_redis()
+        self.set_state_command = self.redis.register_script(
+            self.set_state_script
+        )
+        self.counter_seeded = False
+
+    def key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    def pin_key(self, name: str) -> str:
+        return f"{self.prefix}:{name}:shard"
+
+    async def allocate(self) -> str:
+        counter_key = f"{self.prefix}:counter"
+        if not self.counter_seeded:
+            await self.redis.set(counter_key, random.randrange(NAME_SPACE), nx=True)
+            self.counter_seeded = True
+        number = await self.redis.incr(counter_key)
+        name = room_name(number)
+        await self.redis.set(self.key(name), WAITING, ex=self.ttl(WAITING))
+        return name
+
+    async def release(self, name: str):
+        await self.redis.delete(self.key(name), self.pin_key(name))
+
+    async def pin(self, name: str, shard: str):
+        await self.redis.set(self.pin_key(name), shard, ex=self.ttl(WAITING))
+
+    async def pinned(self, name: str) -> str | None:
+        shard = await self.redis.get(self.pin_key(name))
+        return shard.decode() if shard is not None else None
+
+    async def set_state(self, name: str, state: str):
+        await self.set_state_command(
+            keys=[self.key(name), self.pin_key(name)],
+            args=[state, self.ttl(state)]
+        )
+
+    async def state(self, name: str) -> str | None:
+        state = await self.redis.get(self.key(name))
+        return state.decode() if state is not None else None
+
+
+room_registry = None
+
+
+def get_room_registry() -> RoomRegistry:
+    """ Get the room registry configured in settings.ROOM_REGISTRY_BACKEND
+
+    Returns:
+        RoomRegistry: registry shared by the current process
+    """
+
+    global room_registry
+    if room_registry is None:
+        if settings.ROOM_REGISTRY_BACKEND == "redis":
+            room_registry = RedisRoomRegistry()
+        else:
+            room_registry = MemoryRoomRegistry()
+    return room_registry
@@ -5,5 +5,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r"ws/pericon/match/(?P<room_name>\w+)/$", consumers.MatchConsumer.as_asgi()),
+    re_path(r"ws/pericon/watch/(?P<room_name>\w+)/$", consumers.SpectatorConsumer.as_asgi()),
     re_path(r"ws/pericon/matchmaker/?$", consumers.MatchMatchmakerConsumer.as_asgi()),
 ]
\ No newline at end of file
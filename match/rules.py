@@ -0,0 +1,105 @@
+import random
+
+from .state import CARDS, CARDS_NUMBERS, CARDS_SUITS
+
+CARDS_PER_HAND = 3
+TURNS_PER_ROUND = 3
+TURNS_TO_WIN_ROUND = 2
+
+# Turn outcomes
+DRAW = 0
+FIRST_WINS = 1
+SECOND_WINS = 2
+
+
+def compare_cards(middle_card: int, first_card: int, second_card: int) -> int:
+    """ Outcome of a turn (DRAW, FIRST_WINS or SECOND_WINS)
+
+    The middle card (pericón) sets the trump suit: a card of the middle card
+    suit beats any card of the other suits. Otherwise the highest card number
+    wins, and cards with the same number are a draw.
+
+    Args:
+        middle_card (int): middle card code
+        first_card (int): card code of the first player
+        second_card (int): card code of the second player
+    """
+
+    trump = CARDS_SUITS[middle_card]
+    first_trump = CARDS_SUITS[first_card] == trump
+    second_trump = CARDS_SUITS[second_card] == trump
+    if first_trump != second_trump:
+        return FIRST_WINS if first_trump else SECOND_WINS
+
+    first_number = CARDS_NUMBERS[first_card]
+    second_number = CARDS_NUMBERS[second_card]
+    if first_number > second_number:
+        return FIRST_WINS
+    if second_number > first_number:
+        return SECOND_WINS
+    return DRAW
+
+
+# Outcome of every turn: OUTCOMES[(middle * 40 + first) * 40 + second]
+OUTCOMES = bytes(
+    compare_cards(middle_card, first_card, second_card)
+    for middle_card in range(len(CARDS))
+    for first_card in range(len(CARDS))
+    for second_card in range(len(CARDS))
+)
+
+
+def turn_outcome(middle_card: int, first_card: int, second_card: int) -> int:
+    """ Precomputed compare_cards() """
+    return OUTCOMES[(middle_card * len(CARDS) + first_card) * len(CARDS) + second_card]
+
+
+# Cards each card beats with each middle card: STRENGTH[middle * 40 + card]
+STRENGTH = bytes(
+    sum(
+        turn_outcome(middle_card, card, other) == FIRST_WINS
+        for other in range(len(CARDS))
+    )
+    for middle_card in range(len(CARDS))
+    for card in range(len(CARDS))
+)
+
+
+def card_strength(middle_card: int, card: int) -> int:
+    """ Precomputed number of cards beaten by a card """
+    return STRENGTH[middle_card * len(CARDS) + card]
+
+
+class Deck:
+    """ Shuffled cards of a round. Dealing takes cards from the end of the
+    underlying bytearray, so each card is dealt once in O(1) """
+
+    __slots__ = ("cards",)
+
+    def __init__(self, cards: bytearray):
+        self.cards = cards
+
+    @classmethod
+    def shuffled(cls, rng: random.Random = random) -> "Deck":
+        """ New deck with the 40 cards in random order """
+
+        cards = bytearray(range(len(CARDS)))
+        rng.shuffle(cards)
+        return cls(cards)
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def draw(self) -> int:
+        """ Take the top card (raises IndexError if the deck is empty) """
+        return self.cards.pop()
+
+    def draw_many(self, count: int) -> list[int]:
+        """ Take the top cards """
+
+        if count > len(self.cards):
+            raise IndexError("Not enough cards in the deck")
+        start = len(self.cards) - count
+        cards = list(self.cards[start:])
+        del self.cards[start:]
+        return cards
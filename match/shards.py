@@ -0,0 +1,187 @@
+import bisect
+import hashlib
+import json
+import os
+import time
+
+from django.conf import settings
+
+from .rooms import get_room_registry
+
+# Websocket close code of the match sockets opened in the wrong shard
+SHARD_REDIRECT_CODE = 4001
+
+
+def ring_hash(key: str) -> int:
+    """ Stable 64 bits hash of a key (the same in every process) """
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """ Consistent hashing of rooms to shards
+
+    Each shard is placed in the ring at many points (virtual nodes), and a
+    room belongs to the shard of the first point after the room hash. So
+    adding or removing a shard only moves the rooms of its points.
+    """
+
+    def __init__(self, shards: dict[str, str], vnodes: int = None):
+        """
+        Args:
+            shards (dict[str, str]): shard name -> public url
+            vnodes (int): points of each shard in the ring
+        """
+
+        self.shards = shards
+        self.vnodes = vnodes or settings.SHARD_VNODES
+
+        points = sorted(
+            (ring_hash(f"{name}#{point}"), name)
+            for name in shards
+            for point in range(self.vnodes)
+        )
+        self.hashes = [point_hash for point_hash, _ in points]
+        self.names = [name for _, name in points]
+
+    def shard(self, room: str) -> str:
+        """ Name of the shard of a room """
+
+        index = bisect.bisect(self.hashes, ring_hash(room)) % len(self.hashes)
+        return self.names[index]
+
+
+class ShardMap:
+    """ Ring of the shards in settings.SHARD_RING_FILE (written by the
+    run_shards command). The file is read again when it changes, checking
+    it at most every settings.SHARD_RELOAD_SECONDS
+
+    Rooms are pinned to their shard when the match starts (see pin()), so
+    the games in progress do not move when shards are added or removed:
+    a room stays in its shard while the shard is in the ring or draining
+    (out of the ring, finishing its games).
+    """
+
+    def __init__(self, path: str = None, shard_name: str = None):
+        self.path = path if path is not None else settings.SHARD_RING_FILE
+        self.shard_name = shard_name if shard_name is not None \
+            else settings.SHARD_NAME
+        self.ring = None
+        self.mtime = None
+        self.checked_at = None
+
+        # shard name -> public url, of the ring and draining shards
+        self.urls = {}
+
+    def load(self) -> HashRing | None:
+        """ Current ring, None when sharding is disabled """
+
+        if not self.path:
+            return None
+
+        now = time.monotonic()
+        if self.checked_at is not None \
+                and now - self.checked_at < settings.SHARD_RELOAD_SECONDS:
+            return self.ring
+        self.checked_at = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return self.ring
+        if mtime != self.mtime:
+            with open(self.path) as file:
+                data = json.load(file)
+            shards = data["shards"]
+            self.ring = HashRing(shards) if shards else None
+            self.urls = {**data.get("draining", {}), **shards}
+            self.mtime = mtime
+        return self.ring
+
+    def owner(self, room: str) -> tuple[str, str] | None:
+        """ Shard of a room in the current ring
+
+        Args:
+            room (str): room name
+
+        Returns:
+            tuple[str, str] | None: (shard name, shard url), None when
+            sharding is disabled
+        """
+
+        ring = self.load()
+        if ring is None:
+            return None
+        name = ring.shard(room)
+        return name, ring.shards[name]
+
+    def is_local(self, room: str) -> bool:
+        """ Whether the room belongs to the current process """
+
+        owner = self.owner(room)
+        return owner is None or owner[0] == self.shard_name
+
+    async def pin(self, room: str) -> tuple[str, str] | None:
+        """ Keep a new room in its current shard until the room expires (see
+        rooms.RoomRegistry.pin)
+
+        Returns:
+            tuple[str, str] | None: (shard name, shard url), None when
+            sharding is disabled
+        """
+
+        owner = self.owner(room)
+        if owner is not None:
+            await get_room_registry().pin(room, owner[0])
+        return owner
+
+    async def room_owner(self, room: str) -> tuple[str, str] | None:
+        """ Shard serving a room: the shard it is pinned to while that shard
+        is running, else its shard in the current ring
+
+        Returns:
+            tuple[str, str] | None: (shard name, shard url), None when
+            sharding is disabled
+        """
+
+        owner = self.owner(room)
+        if owner is None:
+            return None
+
+        pinned = await get_room_registry().pinned(room)
+        if pinned is not None and pinned in self.urls:
+            return pinned, self.urls[pinned]
+        return owner
+
+
+def write_ring(path: str, shards: dict[str, str], draining: dict[str, str] = None):
+    """ Replace the ring file atomically
+
+    Args:
+        path (str): ring file
+        shards (dict[str, str]): shard name -> public url
+        draining (dict[str, str]): shard name -> public url of the shards
+            out of the ring that still serve their pinned rooms
+    """
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        json.dump({"shards": shards, "draining": draining or {}}, file, indent=4)
+    os.replace(temporary, path)
+
+
+shard_map = None
+
+
+def get_shard_map() -> ShardMap:
+    """ Get the shard map of the current process
+
+    Returns:
+        ShardMap: shard map shared by the current process
+    """
+
+    global shard_map
+    if shard_map is None:
+        shard_map = ShardMap()
+    return shard_map
@@ -0,0 +1,163 @@
+import numpy as np
+
+from .rules import (
+    CARDS_PER_HAND, DRAW, FIRST_WINS, OUTCOMES, SECOND_WINS, TURNS_PER_ROUND,
+    TURNS_TO_WIN_ROUND,
+)
+from .state import CARDS
+
+# OUTCOMES as [middle card, first card, second card]
+OUTCOMES_TABLE = np.frombuffer(OUTCOMES, dtype=np.uint8).reshape(
+    len(CARDS), len(CARDS), len(CARDS)
+)
+
+
+def simulate_rounds(rng: np.random.Generator, games: int, rounds: int) -> np.ndarray:
+    """ Play rounds of many games at once, with the players using their
+    cards in the dealt order
+
+    Args:
+        rng (np.random.Generator): random generator
+        games (int): number of games
+        rounds (int): rounds per game
+
+    Returns:
+        np.ndarray: (games, rounds, turns) turn outcomes (rules.DRAW,
+        rules.FIRST_WINS or rules.SECOND_WINS)
+    """
+
+    # A shuffled deck per round: middle card, first hand, second hand
+    decks = np.tile(np.arange(len(CARDS), dtype=np.int8), (games, rounds, 1))
+    decks = rng.permuted(decks, axis=2)[:, :, :1 + 2 * CARDS_PER_HAND]
+    middle_cards = decks[:, :, :1]
+    first_cards = decks[:, :, 1:1 + CARDS_PER_HAND]
+    second_cards = decks[:, :, 1 + CARDS_PER_HAND:]
+
+    return OUTCOMES_TABLE[middle_cards, first_cards, second_cards]
+
+
+def simulate_batch(rng: np.random.Generator, games: int, max_points: int,
+                   batch_rounds: int) -> dict:
+    """ Play full games at once (see simulate_games) """
+
+    rounds = np.zeros(games, dtype=np.int64)
+    points = np.zeros((games, 2), dtype=np.int64)
+    pending = np.arange(games)
+    turn_draws = 0
+    round_draws = 0
+
+    while pending.size:
+        outcomes = simulate_rounds(rng, pending.size, batch_rounds)
+        first_wins = (outcomes == FIRST_WINS).sum(axis=2) >= TURNS_TO_WIN_ROUND
+        second_wins = (outcomes == SECOND_WINS).sum(axis=2) >= TURNS_TO_WIN_ROUND
+
+        # Points after each round of the chunk
+        first_points = points[pending, 0:1] + np.cumsum(first_wins, axis=1)
+        second_points = points[pending, 1:2] + np.cumsum(second_wins, axis=1)
+        over = (first_points >= max_points) | (second_points >= max_points)
+
+        # Rounds played in the chunk by each game
+        finished = over.any(axis=1)
+        played = np.where(finished, over.argmax(axis=1) + 1, batch_rounds)
+        last = played - 1
+
+        # Only count the rounds that were played
+        played_mask = np.arange(batch_rounds) < played[:, None]
+        turn_draws += int(((outcomes == DRAW).sum(axis=2) * played_mask).sum())
+        round_draws += int((~(first_wins | second_wins) & played_mask).sum())
+
+        rounds[pending] += played
+        points[pending, 0] = first_points[np.arange(pending.size), last]
+        points[pending, 1] = second_points[np.arange(pending.size), last]
+        pending = pending[~finished]
+
+    return {
+        "rounds": rounds,
+        "turn_draws": turn_draws,
+        "round_draws": round_draws,
+    }
+
+
+def simulate_games(games: int, max_points: int, seed: int = None,
+                   batch_games: int = 100_000) -> dict:
+    """ Play full games with the rules of match.game, in batched arrays
+
+    Each batch of games is simulated a chunk of rounds at a time for every
+    unfinished game, so python only loops over batches and chunks (a few
+    per batch), never over games or turns.
+
+    Args:
+        games (int): number of games
+        max_points (int): round wins needed to win the game
+        seed (int): random seed
+        batch_games (int): games simulated together (bounds memory)
+
+    Returns:
+        dict: "rounds" (rounds of each game), "turn_draws" and
+        "round_draws" (total counts)
+    """
+
+    rng = np.random.default_rng(seed)
+    results = [
+        simulate_batch(
+            rng, min(batch_games, games - start), max_points, 2 * max_points
+        )
+        for start in range(0, games, batch_games)
+    ]
+
+    return {
+        "rounds": np.concatenate([result["rounds"] for result in results]),
+        "turn_draws": sum(result["turn_draws"] for result in results),
+        "round_draws": sum(result["round_draws"] for result in results),
+    }
+
+
+def messages_per_game(rounds: np.ndarray, protocol_version: int = 2) -> dict:
+    """ Messages exchanged by a game with the consumers protocol
+
+    Args:
+        rounds (np.ndarray): rounds of each game
+        protocol_version (int): websocket protocol version of the players
+
+    Returns:
+        dict: arrays per game of websocket frames received ("inbound") and
+        sent ("outbound"), channel layer "group_send" calls and channel
+        layer operations ("layer_ops", adding group_add/group_discard)
+    """
+
+    turns = rounds * TURNS_PER_ROUND
+    new_rounds = rounds - 1
+
+    # "username" x2, "use card" x2 per turn, "more cards" x2 per new round
+    inbound = 2 + 2 * turns + 2 * new_rounds
+
+    group_sends = (
+        1  # matchmaker match start
+        + 4  # middle card and usernames on each join
+        + turns  # turn result
+        + 2 * new_rounds  # middle card on each "more cards"
+    )
+
+    # Frames per player of the group sends
+    if protocol_version < 2:
+        group_frames = (
+            group_sends - turns
+            + 2 * (turns - rounds)  # turn played cards and turn winner
+            + 3 * new_rounds  # turn played cards, round winner and points
+            + 2  # last turn: turn played cards and game winner
+        )
+    else:
+        group_frames = group_sends
+
+    # Group sends reach both players, plus the direct "round cards"
+    outbound = 2 * group_frames + 2 + 2 * new_rounds
+
+    # group_add x2 in the matchmaker and x2 in the room, group_discard x2
+    layer_ops = group_sends + 6
+
+    return {
+        "inbound": inbound,
+        "outbound": outbound,
+        "group_sends": group_sends,
+        "layer_ops": layer_ops,
+    }
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+
+from django.conf import settings
+
+from .actors import room_actors
+from .frames import dumps, frame_value, json_frame
+from .game import snapshot
+from .rooms import FINISHED, get_room_registry, room_group_name
+from .state import RoomState
+from .store import get_room_state_store
+
+logger = logging.getLogger(__name__)
+
+# Room name -> broadcast of the room to its spectators in this process
+broadcasts = {}
+
+FINISHED_FRAME = dumps({"type": "finished", "value": ""})
+
+
+class RoomBroadcast:
+    """ Task that sends the spectators of a room a snapshot of it every
+    settings.SPECTATOR_TICK_SECONDS, when it changed
+
+    Spectators are not in the room group: the task reads the room state by
+    itself (from the room actor of this process or the room store), encodes
+    one frame per tick and sends it to every spectator of this process, so
+    the players never wait for the spectators.
+    """
+
+    def __init__(self, room_name: str):
+        self.room_name = room_name
+        self.room_group_name = room_group_name(room_name)
+        self.spectators = set()
+        self.seq = None
+        self.frame = None
+        self.task = asyncio.create_task(self.run())
+
+    async def state(self) -> RoomState | None:
+        """ Current room data (not a copy: encode it before awaiting) """
+
+        actor = room_actors.get(self.room_group_name)
+        if actor is not None and actor.room_data is not None:
+            return actor.room_data
+        return await get_room_state_store().get(self.room_group_name)
+
+    async def publish(self, frame: str):
+        await asyncio.gather(
+            *(spectator.send(text_data=frame) for spectator in list(self.spectators)),
+            return_exceptions=True,
+        )
+
+    async def tick(self) -> bool:
+        """ Send the room snapshot if it changed
+
+        Returns:
+            bool: False when the game is over
+        """
+
+        room_data = await self.state()
+        if room_data is None:
+
+            # Finished games leave the room store
+            if await get_room_registry().state(self.room_name) == FINISHED:
+                await self.publish(FINISHED_FRAME)
+                return False
+            return True
+
+        if room_data.seq != self.seq:
+            self.seq = room_data.seq
+            event = snapshot(room_data, None)
+            self.frame = json_frame("snapshot", frame_value(event), self.seq)
+            await self.publish(self.frame)
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                if not await self.tick():
+                    break
+            except Exception:
+                logger.exception("Spectators tick of room %s failed", self.room_name)
+            await asyncio.sleep(settings.SPECTATOR_TICK_SECONDS)
+
+        # The game is over, the spectators leave
+        if broadcasts.get(self.room_name) is self:
+            del broadcasts[self.room_name]
+        for spectator in list(self.spectators):
+            await spectator.close()
+
+
+async def watch_room(room_name: str, spectator) -> RoomBroadcast:
+    """ Add a spectator to the broadcast of a room, sending it the last
+    snapshot at once
+
+    Args:
+        room_name (str): room name
+        spectator (SpectatorConsumer): consumer of the spectator
+
+    Returns:
+        RoomBroadcast: broadcast, leave it with unwatch_room
+    """
+
+    broadcast = broadcasts.get(room_name)
+    if broadcast is None:
+        broadcast = broadcasts[room_name] = RoomBroadcast(room_name)
+
+    broadcast.spectators.add(spectator)
+    if broadcast.frame is not None:
+        await spectator.send(text_data=broadcast.frame)
+    return broadcast
+
+
+def unwatch_room(broadcast: RoomBroadcast, spectator):
+    """ Remove a spectator, stopping the broadcast after the last one """
+
+    broadcast.spectators.discard(spectator)
+    if not broadcast.spectators:
+        broadcast.task.cancel()
+        if broadcasts.get(broadcast.room_name) is broadcast:
+            del broadcasts[broadcast.room_name]
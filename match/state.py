@@ -0,0 +1,140 @@
+import random
+import struct
+
+from dataclasses import dataclass, field
+
+# Cards are coded as ints 0-39: card type * 10 + card value index
+CARDS_TYPES = ["clubs", "cups", "gold", "swords"]
+CARDS_VALUES = ["1", "2", "3", "4", "5", "6", "7", "10", "11", "12"]
+CARDS = [
+    f"{card_value} {card_type}"
+    for card_type in CARDS_TYPES
+    for card_value in CARDS_VALUES
+]
+CARDS_CODES = {card: code for code, card in enumerate(CARDS)}
+CARDS_NUMBERS = [int(card.split(" ")[0]) for card in CARDS]
+CARDS_SUITS = [code // len(CARDS_VALUES) for code in range(len(CARDS))]
+
+# Code of "no card"
+NO_CARD = -1
+
+# Binary layout (little endian): format version, middle card, turn, round,
+# players, seed, sequence, deck length and deck cards; then per player:
+# wins round, wins turn, current card, ready, hand mask, round cards mask,
+# username length and utf-8 username
+ROOM_FORMAT = struct.Struct("<BbBHBQIB")
+PLAYER_FORMAT = struct.Struct("<HBb?QQH")
+FORMAT_VERSION = 3
+
+
+def card_name(code: int) -> str:
+    """ Name of a card code, "" for NO_CARD """
+    return "" if code == NO_CARD else CARDS[code]
+
+
+def card_code(name: str) -> int:
+    """ Code of a card name (raises KeyError for unknown cards) """
+    return CARDS_CODES[name]
+
+
+def hand_mask(codes) -> int:
+    """ Bitmask with the given card codes """
+
+    mask = 0
+    for code in codes:
+        mask |= 1 << code
+    return mask
+
+
+def hand_cards(mask: int) -> list[int]:
+    """ Card codes in a bitmask, lowest first """
+
+    codes = []
+    while mask:
+        lowest = mask & -mask
+        codes.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return codes
+
+
+@dataclass(slots=True)
+class PlayerState:
+    username: str
+    wins_round: int = 0
+    wins_turn: int = 0
+    current_card: int = NO_CARD
+    ready: bool = False
+
+    # Bitmasks of card codes
+    hand: int = 0
+    round_cards: int = 0
+
+
+@dataclass(slots=True)
+class RoomState:
+    players: list[PlayerState] = field(default_factory=list)
+    middle_card: int = NO_CARD
+    turn: int = 0
+    round: int = 0
+
+    # Cards left to deal in the round (see rules.Deck)
+    deck: bytearray = field(default_factory=bytearray)
+
+    # Random seed of the room decks, so a room can be replayed
+    seed: int = field(default_factory=lambda: random.getrandbits(64))
+
+    # Number of messages applied to the room
+    seq: int = 0
+
+    def player(self, username: str) -> PlayerState:
+        """ Get a player by username (raises KeyError if missing) """
+
+        for player in self.players:
+            if player.username == username:
+                return player
+        raise KeyError(username)
+
+    def usernames(self) -> list[str]:
+        return [player.username for player in self.players]
+
+    def encode(self) -> bytes:
+        """ Fixed binary encoding of the room (see ROOM_FORMAT) """
+
+        chunks = [ROOM_FORMAT.pack(
+            FORMAT_VERSION, self.middle_card, self.turn, self.round,
+            len(self.players), self.seed, self.seq, len(self.deck)
+        ), self.deck]
+        for player in self.players:
+            username = player.username.encode()
+            chunks.append(PLAYER_FORMAT.pack(
+                player.wins_round, player.wins_turn, player.current_card,
+                player.ready, player.hand, player.round_cards, len(username)
+            ))
+            chunks.append(username)
+        return b"".join(chunks)
+
+    @classmethod
+    def decode(cls, data: bytes) -> "RoomState":
+        """ Rebuild a room from RoomState.encode() output """
+
+        version, middle_card, turn, round_number, players_count, seed, \
+            seq, deck_length = ROOM_FORMAT.unpack_from(data)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unknown room format version {version}")
+
+        offset = ROOM_FORMAT.size + deck_length
+        room = cls(
+            middle_card=middle_card, turn=turn, round=round_number,
+            deck=bytearray(data[ROOM_FORMAT.size:offset]), seed=seed, seq=seq
+        )
+        for _ in range(players_count):
+            wins_round, wins_turn, current_card, ready, hand, round_cards, \
+                username_length = PLAYER_FORMAT.unpack_from(data, offset)
+            offset += PLAYER_FORMAT.size
+            username = data[offset:offset + username_length].decode()
+            offset += username_length
+            room.players.append(PlayerState(
+                username, wins_round, wins_turn, current_card, ready,
+                hand, round_cards
+            ))
+        return room
@@ -0,0 +1,182 @@
+from abc import ABC, abstractmethod
+from typing import Callable
+
+from django.conf import settings
+
+from .metrics import STORE_SECONDS
+from .redis_client import get_redis
+from .state import RoomState
+
+
+class RoomStateConflict(Exception):
+    """ The room state kept changing while trying to update it """
+
+
+class RoomStateStore(ABC):
+    """ Async storage of the rooms data with optimistic versioning
+
+    Every saved state has a version number. update() reads the state,
+    applies a mutation and saves it only if nobody saved a newer version in
+    the meantime (compare and set), retrying the mutation otherwise. So the
+    mutation must only depend on the state it receives.
+    """
+
+    max_retries = 20
+
+    def dumps(self, state: RoomState) -> bytes:
+        """ Serialize a room state """
+        return state.encode()
+
+    def loads(self, data: bytes) -> RoomState:
+        """ Deserialize a room state """
+        return RoomState.decode(data)
+
+    @abstractmethod
+    async def load(self, room: str) -> tuple[int, bytes | None]:
+        """ Read the raw state of a room
+
+        Returns:
+            tuple[int, bytes | None]: (version, data). Version 0 and no data
+            when the room does not exist
+        """
+
+    @abstractmethod
+    async def compare_and_set(self, room: str, version: int, data: bytes) -> bool:
+        """ Save the raw state of a room if it is still in the given version
+
+        Returns:
+            bool: True if the state was saved
+        """
+
+    @abstractmethod
+    async def delete(self, room: str):
+        """ Remove the state of a room """
+
+    async def get(self, room: str) -> RoomState | None:
+        """ Get the state of a room
+
+        Args:
+            room (str): Room group name
+
+        Returns:
+            RoomState | None: Room state, or None if the room does not exist
+        """
+
+        with STORE_SECONDS.time(operation="load"):
+            _, data = await self.load(room)
+        if data is None:
+            return None
+        return self.loads(data)
+
+    async def update(self, room: str, mutate: Callable[[RoomState | None], tuple]):
+        """ Apply a mutation to the state of a room
+
+        Args:
+            room (str): Room group name
+            mutate (Callable): function that receives the current state
+                (None if the room does not exist) and returns
+                (new_state, result). A None new_state saves nothing. It can
+                be called more than once.
+
+        Returns:
+            result returned by the mutation that was saved
+        """
+
+        for _ in range(self.max_retries):
+            with STORE_SECONDS.time(operation="load"):
+                version, data = await self.load(room)
+            state = None if data is None else self.loads(data)
+            state, result = mutate(state)
+            if state is None:
+                return result
+            with STORE_SECONDS.time(operation="compare_and_set"):
+                saved = await self.compare_and_set(
+                    room, version, self.dumps(state)
+                )
+            if saved:
+                return result
+
+        raise RoomStateConflict(f"Too many concurrent updates in {room}")
+
+
+class MemoryRoomStateStore(RoomStateStore):
+    """ Rooms of the current process. Loads and saves never wait, so every
+    update runs without interruptions in the event loop """
+
+    def __init__(self):
+        # room -> (version, data)
+        self.rooms = {}
+
+    async def load(self, room: str) -> tuple[int, bytes | None]:
+        return self.rooms.get(room, (0, None))
+
+    async def compare_and_set(self, room: str, version: int, data: bytes) -> bool:
+        current_version, _ = self.rooms.get(room, (0, None))
+        if current_version != version:
+            return False
+        self.rooms[room] = (version + 1, data)
+        return True
+
+    async def delete(self, room: str):
+        self.rooms.pop(room, None)
+
+
+class RedisRoomStateStore(RoomStateStore):
+    """ Rooms shared by every web process through redis hashes with
+    "version" and "data" fields """
+
+    # KEYS: room key. ARGV: expected version, data, ttl
+    compare_and_set_script = """
+        local version = redis.call("HGET", KEYS[1], "version") or "0"
+        if version ~= ARGV[1] then
+            return 0
+        end
+        redis.call("HSET", KEYS[1], "version", tonumber(ARGV[1]) + 1, "data", ARGV[2])
+        redis.call("EXPIRE", KEYS[1], ARGV[3])
+        return 1
+    """
+
+    def __init__(self, ttl: int = None, prefix: str = "rooms"):
+        if ttl is None:
+            ttl = settings.ROOM_STORE_TTL
+        self.ttl = ttl
+        self.prefix = prefix
+        self.redis = get_redis()
+        self.compare_and_set_command = self.redis.register_script(
+            self.compare_and_set_script
+        )
+
+    def key(self, room: str) -> str:
+        return f"{self.prefix}:{room}"
+
+    async def load(self, room: str) -> tuple[int, bytes | None]:
+        version, data = await self.redis.hmget(self.key(room), "version", "data")
+        return int(version or 0), data
+
+    async def compare_and_set(self, room: str, version: int, data: bytes) -> bool:
+        saved = await self.compare_and_set_command(
+            keys=[self.key(room)], args=[version, data, self.ttl]
+        )
+        return bool(saved)
+
+    async def delete(self, room: str):
+        await self.redis.delete(self.key(room))
+
+
+room_state_store = None
+
+
+def get_room_state_store() -> RoomStateStore:
+    """ Get the room store configured in settings.ROOM_STORE_BACKEND
+
+    Returns:
+        RoomStateStore: store instance shared by the current process
+    """
+
+    global room_state_store
+    if room_state_store is None:
+        if settings.ROOM_STORE_BACKEND == "redis":
+            room_state_store = RedisRoomStateStore()
+        else:
+            room_state_store = MemoryRoomStateStore()
+    return room_state_store
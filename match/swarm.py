@@ -0,0 +1,369 @@
+import asyncio
+import collections
+import json
+import os
+import random
+import resource
+import time
+
+import websockets
+
+from .bench import TURN_END_TYPES, percentile, turn_end_type
+
+# Clock ticks per second of the /proc cpu times, and bytes per memory page
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_BYTES = os.sysconf("SC_PAGE_SIZE")
+
+
+class SwarmError(Exception):
+    """ Failed game of a swarm client, by kind ("connect", "no match"...) """
+
+    def __init__(self, kind: str):
+        super().__init__(kind)
+        self.kind = kind
+
+
+class SwarmStats:
+    """ Timings and errors of the swarm clients """
+
+    def __init__(self):
+        self.connect_seconds = []
+        self.match_wait_seconds = []
+        self.turn_seconds = []
+        self.errors = collections.Counter()
+        self.games = 0
+        self.turns = 0
+        self.open_sockets = 0
+
+    def summary(self) -> dict:
+        """ Percentiles in milliseconds of each timing, counts and errors """
+
+        summary = {}
+        for name in ("connect_seconds", "match_wait_seconds", "turn_seconds"):
+            values = sorted(getattr(self, name))
+            if not values:
+                continue
+            summary[name.replace("_seconds", "")] = {
+                "count": len(values),
+                "p50_ms": percentile(values, 50) * 1e3,
+                "p90_ms": percentile(values, 90) * 1e3,
+                "p99_ms": percentile(values, 99) * 1e3,
+                "max_ms": values[-1] * 1e3,
+            }
+        failed = sum(self.errors.values())
+        summary["games"] = {
+            "count": self.games,
+            "turns": self.turns,
+            "failed": failed,
+            "error_rate": failed / max(1, self.games + failed),
+            "errors": dict(self.errors),
+        }
+        return summary
+
+
+class ProcessSampler:
+    """ CPU and resident memory of server processes, read from /proc """
+
+    def __init__(self, pids: list[int]):
+        self.pids = pids
+        self.cpu = self.cpu_seconds()
+        self.sampled_at = time.monotonic()
+
+    def cpu_seconds(self) -> float:
+        seconds = 0
+        for pid in self.pids:
+            try:
+                with open(f"/proc/{pid}/stat") as file:
+                    stat = file.read()
+            except FileNotFoundError:
+                continue
+            # Fields after the command name, utime and stime are 14 and 15
+            fields = stat[stat.rindex(")") + 2:].split()
+            seconds += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+        return seconds
+
+    def rss_bytes(self) -> int:
+        rss = 0
+        for pid in self.pids:
+            try:
+                with open(f"/proc/{pid}/statm") as file:
+                    rss += int(file.read().split()[1]) * PAGE_BYTES
+            except FileNotFoundError:
+                continue
+        return rss
+
+    def sample(self) -> tuple[float, int]:
+        """ CPU use since the last sample and current memory
+
+        Returns:
+            tuple[float, int]: (percent of a core, resident bytes)
+        """
+
+        cpu = self.cpu_seconds()
+        now = time.monotonic()
+        percent = (cpu - self.cpu) / max(now - self.sampled_at, 1e-9) * 100
+        self.cpu, self.sampled_at = cpu, now
+        return percent, self.rss_bytes()
+
+
+class SwarmClient:
+    """ Real websocket client of a player: matchmaker, then the room """
+
+    def __init__(self, swarm, username: str):
+        self.swarm = swarm
+        self.username = username
+        self.cards = []
+        self.websocket = None
+
+    async def connect(self, url: str):
+        """ Open a websocket, timing the handshake """
+
+        start = time.perf_counter()
+        try:
+            websocket = await websockets.connect(
+                url, open_timeout=self.swarm.timeout, compression=None
+            )
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+            raise SwarmError("connect")
+        self.swarm.stats.connect_seconds.append(time.perf_counter() - start)
+        self.swarm.stats.open_sockets += 1
+        return websocket
+
+    async def close(self, websocket):
+        self.swarm.stats.open_sockets -= 1
+        await websocket.close()
+
+    async def receive(self, websocket) -> dict:
+        try:
+            frame = await asyncio.wait_for(websocket.recv(), self.swarm.timeout)
+        except asyncio.TimeoutError:
+            raise SwarmError("timeout")
+        except websockets.ConnectionClosed:
+            raise SwarmError("closed")
+        message = json.loads(frame)
+        if "error" in message or message.get("type") == "error":
+            raise SwarmError("error frame")
+        return message
+
+    async def find_match(self) -> dict:
+        """ Wait in the matchmaker until a room is assigned
+
+        Returns:
+            dict: match start frame (room name, username, ticket and the
+            shard url when rooms are sharded)
+        """
+
+        matchmaker = await self.connect(
+            f"{self.swarm.url}/ws/pericon/matchmaker/?username={self.username}"
+        )
+        start = time.perf_counter()
+        try:
+            match_start = await self.receive(matchmaker)
+        except SwarmError as error:
+            raise SwarmError("no match" if error.kind == "error frame" else error.kind)
+        finally:
+            await self.close(matchmaker)
+        self.swarm.stats.match_wait_seconds.append(time.perf_counter() - start)
+        return match_start
+
+    async def join(self, match_start: dict):
+        """ Join the room of the match with its ticket """
+
+        url = match_start.get("shard", self.swarm.url)
+        url = url.replace("http://", "ws://").replace("https://", "wss://")
+        self.username = match_start["username"]
+        self.websocket = await self.connect(
+            f"{url}/ws/pericon/match/{match_start['room_name']}/"
+            f"?v={self.swarm.protocol_version}&ticket={match_start['ticket']}"
+        )
+        await self.send("username", self.username)
+        await self.receive_until({"round cards"})
+
+    async def receive_until(self, types: set[str]) -> dict:
+        """ Read frames until one of the given types (keeps the cards) """
+
+        while True:
+            message = await self.receive(self.websocket)
+            if message["type"] == "round cards":
+                self.cards = message["value"]
+            if message["type"] in types:
+                return message
+
+    async def send(self, message_type: str, message_value):
+        try:
+            await self.websocket.send(json.dumps({
+                "type": message_type,
+                "value": message_value
+            }))
+        except websockets.ConnectionClosed:
+            raise SwarmError("closed")
+
+    async def leave(self):
+        if self.websocket is not None:
+            await self.close(self.websocket)
+            self.websocket = None
+
+
+class Swarm:
+    """ Many websocket clients playing full games against a running server
+
+    Each client queues in the matchmaker, joins the room it is assigned
+    and plays, game after game. The two players of a room are usually both
+    swarm clients: the second to join plays the game for both, so the turn
+    round trip is measured from the last card of the turn to the turn
+    results of both players. A player whose opponent is not a swarm client
+    (a bot, or a player of another swarm) plays alone after pair_seconds.
+
+    Clients wait think_seconds (randomized by up to 50%) before each move,
+    a move per turn is far below the message rate limits of the server.
+    """
+
+    def __init__(self, url: str, clients: int, games: int, spawn_rate: float,
+                 think_seconds: float, protocol_version: int = 2,
+                 timeout: float = 30, pair_seconds: float = 5):
+        self.url = url.rstrip("/")
+        self.clients = clients
+        self.games = games
+        self.spawn_rate = spawn_rate
+        self.think_seconds = think_seconds
+        self.protocol_version = protocol_version
+        self.timeout = timeout
+        self.pair_seconds = pair_seconds
+        self.stats = SwarmStats()
+
+        # Room name -> (client waiting for its opponent, future of the game)
+        self.waiting = {}
+
+    async def think(self):
+        await asyncio.sleep(self.think_seconds * random.uniform(0.5, 1.5))
+
+    async def play_game(self, players: list[SwarmClient]):
+        """ Play a game with the swarm players of a room, to the end """
+
+        end_types = TURN_END_TYPES | {"turn result"}
+        while True:
+            await self.think()
+            for player in players:
+                if not player.cards:
+                    raise SwarmError("protocol")
+                await player.send("use card", player.cards.pop(0))
+
+            start = time.perf_counter()
+            ends = [
+                turn_end_type(message)
+                for message in await asyncio.gather(
+                    *(player.receive_until(end_types) for player in players)
+                )
+            ]
+            self.stats.turn_seconds.append(time.perf_counter() - start)
+            self.stats.turns += 1
+
+            if "game winner" in ends:
+                return
+
+            # New round
+            if "points" in ends:
+                await self.think()
+                for player in players:
+                    await player.send("more cards", "")
+                    await player.receive_until({"round cards"})
+
+    async def play_match(self, client: SwarmClient, room_name: str):
+        """ Play the game of a room, with the other swarm client of the room
+        when there is one """
+
+        loop = asyncio.get_running_loop()
+        waiting = self.waiting.pop(room_name, None)
+        if waiting is not None and not waiting[1].cancelled():
+            opponent, future = waiting
+            game = loop.create_task(self.play_game([opponent, client]))
+            future.set_result(game)
+            await game
+            return
+
+        # First of the room: the opponent plays the game for both
+        future = loop.create_future()
+        self.waiting[room_name] = (client, future)
+        try:
+            game = await asyncio.wait_for(future, self.pair_seconds)
+        except asyncio.TimeoutError:
+            self.waiting.pop(room_name, None)
+            await self.play_game([client])
+            return
+
+        # Both players get the result of the game
+        await game
+
+    async def run_client(self, index: int):
+        for game in range(self.games):
+            client = SwarmClient(self, f"swarm{index}g{game}")
+            try:
+                match_start = await client.find_match()
+                await client.join(match_start)
+                await self.play_match(client, match_start["room_name"])
+                self.stats.games += 1
+            except SwarmError as error:
+                self.stats.errors[error.kind] += 1
+            finally:
+                await client.leave()
+
+    async def run(self, report=None, report_seconds: float = 5,
+                  server_pids: list[int] = ()) -> dict:
+        """ Spawn the clients at spawn_rate per second and wait for their
+        games
+
+        Args:
+            report: function called with a progress line every
+                report_seconds (sockets, games, errors, CPU and memory of
+                the server processes and of the swarm)
+            server_pids (list[int]): server processes to sample
+
+        Returns:
+            dict: summary of the swarm (see SwarmStats.summary)
+        """
+
+        server = ProcessSampler(list(server_pids))
+        swarm = ProcessSampler([os.getpid()])
+        start = time.monotonic()
+        peaks = {"server_cpu_percent": 0, "server_rss_bytes": 0}
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(report_seconds)
+                server_cpu, server_rss = server.sample()
+                swarm_cpu, _ = swarm.sample()
+                peaks["server_cpu_percent"] = max(peaks["server_cpu_percent"], server_cpu)
+                peaks["server_rss_bytes"] = max(peaks["server_rss_bytes"], server_rss)
+                if report is not None:
+                    report(
+                        f"{time.monotonic() - start:7.1f}s "
+                        f"sockets {self.stats.open_sockets:>6} "
+                        f"games {self.stats.games:>6} "
+                        f"errors {sum(self.stats.errors.values()):>5} "
+                        f"server cpu {server_cpu:6.1f}% "
+                        f"rss {server_rss / 2 ** 20:7.1f} MB "
+                        f"swarm cpu {swarm_cpu:6.1f}%"
+                    )
+
+        reporting = asyncio.create_task(reporter())
+        try:
+            tasks = []
+            for index in range(self.clients):
+                tasks.append(asyncio.create_task(self.run_client(index)))
+                await asyncio.sleep(1 / self.spawn_rate)
+            await asyncio.gather(*tasks)
+        finally:
+            reporting.cancel()
+
+        summary = self.stats.summary()
+        summary["games"]["seconds"] = time.monotonic() - start
+        summary["server"] = peaks
+        return summary
+
+
+def raise_open_files_limit():
+    """ Allow as many open sockets as the hard limit of the process """
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
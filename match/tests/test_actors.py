@@ -0,0 +1,71 @@
+from django.test import SimpleTestCase
+
+from match import rooms, store
+from match.actors import acquire_room_actor, release_room_actor, room_actors
+from match.state import hand_cards
+from match.store import MemoryRoomStateStore
+
+
+class FakeConsumer:
+    """ Consumer that keeps the direct messages the actor sends it """
+
+    def __init__(self, username: str):
+        self.username = username
+        self.room_name = "abcdef"
+        self.messages = []
+
+    async def __send_messages__(self, messages: list):
+        self.messages.extend(messages)
+
+
+class RoomActorTests(SimpleTestCase):
+
+    def setUp(self):
+        store.room_state_store = MemoryRoomStateStore()
+        self.addCleanup(setattr, store, "room_state_store", None)
+        rooms.room_registry = rooms.MemoryRoomRegistry()
+        self.addCleanup(setattr, rooms, "room_registry", None)
+
+    async def test_players_join_and_snapshot_is_saved(self):
+        ana, bob = FakeConsumer("ana"), FakeConsumer("bob")
+        first = acquire_room_actor("abcdef")
+        second = acquire_room_actor("abcdef")
+        self.assertIs(first, second)
+
+        self.assertFalse(await first.ask(ana, "connect", None))
+        disconnect, events = await first.ask(ana, "username", "ana")
+        self.assertFalse(disconnect)
+        self.assertEqual([event["type"] for event in events], ["join"])
+        self.assertFalse((await second.ask(bob, "username", "bob"))[0])
+        self.assertEqual(
+            [message["type"] for _, message in bob.messages],
+            ["send.round_cards", "send.middile_card", "send_usernames"]
+        )
+
+        self.assertEqual(
+            await rooms.room_registry.state("abcdef"), rooms.PLAYING
+        )
+
+        release_room_actor(first)
+        release_room_actor(second)
+        await first.task
+        self.assertNotIn("room_abcdef", room_actors)
+
+        room_data = await store.room_state_store.get("room_abcdef")
+        self.assertEqual(room_data.usernames(), ["ana", "bob"])
+        self.assertEqual(
+            hand_cards(room_data.player("bob").hand),
+            sorted(bob.messages[0][1]["value"])
+        )
+
+    async def test_third_player_leaves(self):
+        actor = acquire_room_actor("abcdef")
+        for username in ("ana", "bob"):
+            await actor.ask(FakeConsumer(username), "username", username)
+
+        carla = FakeConsumer("carla")
+        self.assertEqual(await actor.ask(carla, "username", "carla"), (True, []))
+        self.assertEqual(carla.messages[0][1]["value"], "La sala está llena")
+
+        release_room_actor(actor)
+        await actor.task
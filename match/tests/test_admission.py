@@ -0,0 +1,78 @@
+import json
+
+from django.test import SimpleTestCase, override_settings
+
+from match import admission
+from match.admission import (
+    MATCH_SCHEMAS, MessageAdmission, MessageRejected, TokenBucket,
+    acquire_socket, release_socket,
+)
+
+
+class SocketLimitTests(SimpleTestCase):
+
+    @override_settings(MAX_SOCKETS=2)
+    def test_max_sockets(self):
+        open_sockets = admission.open_sockets
+        self.addCleanup(setattr, admission, "open_sockets", open_sockets)
+        admission.open_sockets = 0
+
+        self.assertTrue(acquire_socket("match"))
+        self.assertTrue(acquire_socket("match"))
+        self.assertFalse(acquire_socket("match"))
+        release_socket()
+        self.assertTrue(acquire_socket("match"))
+        self.assertEqual(admission.open_sockets, 2)
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=0, capacity=3)
+        self.assertEqual([bucket.take() for _ in range(4)], [True] * 3 + [False])
+
+    def test_refill(self):
+        bucket = TokenBucket(rate=10, capacity=1)
+        self.assertTrue(bucket.take())
+        self.assertFalse(bucket.take())
+        bucket.updated -= 0.1
+        self.assertTrue(bucket.take())
+
+
+@override_settings(MESSAGE_RATE=0, MESSAGE_BURST=100, MAX_FRAME_BYTES=64)
+class MessageAdmissionTests(SimpleTestCase):
+
+    def setUp(self):
+        self.admission = MessageAdmission("match", MATCH_SCHEMAS)
+
+    def frame(self, message_type: str, message_value) -> str:
+        return json.dumps({"type": message_type, "value": message_value})
+
+    def assert_rejected(self, reason: str, text_data: str):
+        with self.assertRaises(MessageRejected) as context:
+            self.admission.admit(text_data)
+        self.assertEqual(context.exception.reason, reason)
+
+    def test_admitted(self):
+        self.assertEqual(
+            self.admission.admit(self.frame("use card", "1 gold")),
+            ("use card", 20)
+        )
+        self.assertEqual(
+            self.admission.admit(self.frame("username", "ana")), ("username", "ana")
+        )
+
+    def test_rejected(self):
+        self.assert_rejected("frame size", self.frame("username", "a" * 64))
+        self.assert_rejected("malformed", "{")
+        self.assert_rejected("malformed", self.frame("use card", 20))
+        self.assert_rejected("schema", self.frame("username", ""))
+        self.assert_rejected("schema", self.frame("chat", "hi"))
+        self.assert_rejected(
+            "schema", self.frame("resume", {"username": "ana", "seq": -1})
+        )
+
+    def test_rate_limit(self):
+        self.admission.bucket = TokenBucket(rate=0, capacity=1)
+        self.admission.admit(self.frame("more cards", ""))
+        self.assert_rejected("rate limit", self.frame("more cards", ""))
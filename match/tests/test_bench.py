@@ -0,0 +1,20 @@
+from django.test import SimpleTestCase
+
+from match.bench import compare
+
+
+class CompareTests(SimpleTestCase):
+
+    def test_compare(self):
+        baseline = {
+            "games": {"count": 20, "turns": 276, "alloc_bytes_per_turn": 100},
+            "use card": {"count": 552, "p50_us": 80, "store_ops": 0},
+        }
+        summary = {
+            "games": {"count": 20, "turns": 300, "alloc_bytes_per_turn": 125},
+            "use card": {"count": 600, "p50_us": 60, "store_ops": 2},
+        }
+        self.assertEqual(compare(summary, baseline), {
+            "games alloc_bytes_per_turn": 25,
+            "use card p50_us": -25,
+        })
@@ -0,0 +1,110 @@
+from django.test import SimpleTestCase
+
+from match.binary import (
+    NO_CARD_BYTE, SEQ_FLAG, SEQ_FORMAT, decode_message, encode_event,
+)
+from match.frames import BINARY_VERSION, PROTOCOL_VERSIONS, with_frames
+from match.state import NO_CARD, card_code
+
+
+class EncodeEventTests(SimpleTestCase):
+
+    def test_cards(self):
+        self.assertEqual(
+            encode_event({"type": "send.round_cards", "value": [0, 17, 39]}),
+            bytes((1, 3, 0, 17, 39))
+        )
+        self.assertEqual(
+            encode_event({"type": "send.middile_card", "value": NO_CARD}),
+            bytes((3, NO_CARD_BYTE))
+        )
+
+    def test_names(self):
+        self.assertEqual(
+            encode_event({"type": "send_usernames", "value": ["ana", "bjørn"]}),
+            b"\x04\x02\x03ana\x06bj\xc3\xb8rn"
+        )
+        self.assertEqual(
+            encode_event({"type": "send.game_winner", "value": "draw"}),
+            b"\x09\x00"
+        )
+
+    def test_turn_result(self):
+        frame = encode_event({
+            "type": "send.turn_result",
+            "value": [
+                {"type": "send.turn_played_cards", "value": [
+                    {"player": "ana", "card": 1}, {"player": "bob", "card": 2},
+                ]},
+                {"type": "send.round_winner", "value": "ana"},
+                {"type": "send.points", "value": [
+                    {"player": "ana", "points": 1}, {"player": "bob", "points": 0},
+                ]},
+            ],
+            "middle_card": 5,
+        })
+        self.assertEqual(frame, (
+            b"\x0a"
+            b"\x05\x02\x03ana\x01\x03bob\x02"
+            b"\x07\x03ana"
+            b"\x08\x02\x03ana\x01\x00\x03bob\x00\x00"
+            b"\x03\x05"
+        ))
+
+    def test_seq(self):
+        self.assertEqual(
+            encode_event({"type": "send.game_winner", "value": "ana", "seq": 7}),
+            bytes((9 | SEQ_FLAG,)) + SEQ_FORMAT.pack(7) + b"\x03ana"
+        )
+
+    def test_snapshot(self):
+        frame = encode_event({
+            "type": "send.snapshot",
+            "seq": 3,
+            "value": {
+                "usernames": ["ana", "bob"],
+                "middle_card": 5,
+                "round_cards": [1, 2],
+                "turn_played_cards": [{"player": "ana", "card": 4}],
+                "points": [
+                    {"player": "ana", "points": 1}, {"player": "bob", "points": 0},
+                ],
+                "turn_wins": [
+                    {"player": "ana", "wins": 1}, {"player": "bob", "wins": 0},
+                ],
+                "round": 2,
+                "turn": 1,
+            },
+        })
+        self.assertEqual(frame, (
+            bytes((11 | SEQ_FLAG,)) + SEQ_FORMAT.pack(3)
+            + b"\x02\x03ana\x03bob"
+            b"\x05"
+            b"\x02\x01\x02"
+            b"\x01\x03ana\x04"
+            b"\x02\x03ana\x01\x00\x03bob\x00\x00"
+            b"\x02\x03ana\x01\x03bob\x00"
+            b"\x02\x00\x01"
+        ))
+
+    def test_published_frames(self):
+        event = with_frames({"type": "send.middile_card", "value": card_code("4 swords")})
+        frames = event["frames"][PROTOCOL_VERSIONS.index(BINARY_VERSION)]
+        self.assertEqual(frames, [bytes((3, card_code("4 swords")))])
+
+
+class DecodeMessageTests(SimpleTestCase):
+
+    def test_messages(self):
+        self.assertEqual(decode_message(b"\x01ana"), ("username", "ana"))
+        self.assertEqual(decode_message(b"\x02\x11"), ("use card", 17))
+        self.assertEqual(decode_message(b"\x03"), ("more cards", ""))
+        self.assertEqual(
+            decode_message(b"\x05" + SEQ_FORMAT.pack(9) + b"ana"),
+            ("resume", {"username": "ana", "seq": 9})
+        )
+
+    def test_invalid_messages(self):
+        for data in (b"", b"\x63", b"\x02", b"\x02\x01\x02", b"\x05\x01"):
+            with self.assertRaises(ValueError):
+                decode_message(data)
@@ -0,0 +1,71 @@
+import asyncio
+
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from match import bots, consumers, matchmaker
+from match.bench import ScriptedPlayer
+from match.bots import choose_card, start_bot
+from match.rooms import FINISHED, get_room_registry
+from match.state import card_code
+from match.tests.test_consumers import MatchConsumerTestCase
+from match.tickets import issue_ticket
+
+
+class ChooseCardTests(SimpleTestCase):
+
+    def test_strongest_card_for_the_trump(self):
+        hand = [card_code("1 cups"), card_code("12 gold"), card_code("3 swords")]
+        self.assertEqual(choose_card(hand, card_code("4 gold")), card_code("12 gold"))
+
+
+class BotPlayerTests(MatchConsumerTestCase):
+
+    async def test_bot_plays_a_game(self):
+        room_name = await get_room_registry().allocate()
+        start_bot(room_name)
+        player = ScriptedPlayer(self.application, "human", 2)
+        player.ticket = issue_ticket(room_name, "human")
+        await player.join(room_name)
+
+        for _ in range(100):
+            await player.send("use card", player.cards.pop(0))
+            message = await player.receive_until({"turn result"})
+            if "game winner" in message["value"]:
+                break
+            if "points" in message["value"]:
+                await player.send("more cards", "")
+                await player.receive_until({"round cards"})
+        else:
+            self.fail("The game did not end")
+
+        await player.leave()
+        await asyncio.sleep(0.05)
+        self.assertEqual(bots.bots, set())
+
+    @override_settings(MATCHMAKING_BOT_JOIN_SECONDS=0.05)
+    async def test_bot_leaves_when_the_player_does_not_join(self):
+        room_name = await get_room_registry().allocate()
+        start_bot(room_name)
+        await asyncio.sleep(0.3)
+
+        self.assertEqual(bots.bots, set())
+        self.assertEqual(consumers.room_sockets, {})
+        self.assertEqual(await get_room_registry().state(room_name), FINISHED)
+
+    async def test_rooms_of_other_shards_are_released(self):
+        shard_map = mock.Mock()
+        shard_map.is_local.side_effect = [False, False, True]
+        shard_map.pin = mock.AsyncMock(return_value=None)
+        channel_layer = mock.AsyncMock()
+
+        with mock.patch("match.matchmaker.get_shard_map", return_value=shard_map), \
+                mock.patch("match.matchmaker.start_bot") as start:
+            started = await matchmaker.start_bot_match(channel_layer, "player")
+
+        self.assertTrue(started)
+        registry = get_room_registry()
+        self.assertEqual(registry.size(), 1)
+        room_name = start.call_args.args[0]
+        self.assertIsNotNone(await registry.state(room_name))
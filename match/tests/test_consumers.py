@@ -0,0 +1,270 @@
+import asyncio
+import json
+
+from unittest import mock
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+
+from match import admission, consumers, journal, rooms
+from match.bench import TURN_END_TYPES, ScriptedPlayer, in_memory_backends
+from match.binary import BINARY_SUBPROTOCOL, FRAME_CODES, SEQ_FLAG, SEQ_FORMAT
+from match.metrics import REJECTED
+from match.routing import websocket_urlpatterns
+from match.state import CARDS
+from match.tests.test_journal import play
+from match.tickets import TicketAuthMiddleware, issue_ticket
+
+
+class StaleJournal(journal.NullJournal):
+    """ Journal with the game of an older room of the same name """
+
+    async def read_written(self, room: str) -> list[dict]:
+        return play([("old0", "username", "old0"), ("old1", "username", "old1")])
+
+
+@override_settings(
+    TURN_SECONDS=0.2, TIMER_TICK_SECONDS=0.01, MATCHMAKING_BOT_SECONDS=0,
+)
+class MatchConsumerTestCase(SimpleTestCase):
+    """ Games through the websocket consumers, with in-memory backends """
+
+    def setUp(self):
+        self.enterContext(in_memory_backends())
+        journal.journal = journal.NullJournal()
+        self.addCleanup(setattr, journal, "journal", None)
+        self.addCleanup(consumers.room_sockets.clear)
+        self.addCleanup(consumers.idle_rooms.clear)
+        self.addCleanup(consumers.vacant_seats.clear)
+        self.application = TicketAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    async def start_match(
+        self, protocol_version: int = 2, usernames: tuple = ("player0", "player1")
+    ) -> list[ScriptedPlayer]:
+        players = [
+            ScriptedPlayer(self.application, username, protocol_version)
+            for username in usernames
+        ]
+        room_names = await asyncio.gather(
+            *(player.find_match() for player in players)
+        )
+        self.assertEqual(room_names[0], room_names[1])
+        self.room_name = room_names[0]
+        for player in players:
+            await player.join(room_names[0])
+        return players
+
+
+class TurnDeadlineTests(MatchConsumerTestCase):
+
+    async def test_left_player_moves_are_played(self):
+        await self.play_without_opponent()
+
+    @override_settings(MATCH_ENGINE="actor")
+    async def test_left_player_moves_are_played_by_actor(self):
+        await self.play_without_opponent()
+
+    async def play_without_opponent(self):
+        player, left = await self.start_match()
+        await left.leave()
+
+        # The game goes on without the player that left
+        end_types = TURN_END_TYPES | {"turn result"}
+        for _ in range(100):
+            await player.send("use card", player.cards.pop(0))
+            message = await player.receive_until(end_types)
+            if "game winner" in message["value"]:
+                break
+            if "points" in message["value"]:
+                await player.send("more cards", "")
+                await player.receive_until({"round cards"})
+        else:
+            self.fail("The game did not end")
+
+        await player.leave()
+        self.assertEqual(consumers.vacant_seats, {})
+
+
+class MatchmakingTests(MatchConsumerTestCase):
+
+    async def test_players_with_the_same_username(self):
+        player, opponent = await self.start_match(usernames=("ana", "ana"))
+        self.assertEqual(
+            sorted([player.username, opponent.username]), ["ana", "ana2"]
+        )
+
+        # Both players have their own cards and play the turn
+        await player.send("use card", player.cards.pop(0))
+        await opponent.send("use card", opponent.cards.pop(0))
+        message = await player.receive_until({"turn result"})
+        self.assertEqual(
+            await opponent.receive_until({"turn result"}), message
+        )
+        await player.leave()
+        await opponent.leave()
+
+
+class RoomRecoveryTests(MatchConsumerTestCase):
+
+    async def test_new_room_ignores_an_old_journal(self):
+        await self.play_in_new_room()
+
+    @override_settings(MATCH_ENGINE="actor")
+    async def test_new_room_ignores_an_old_journal_by_actor(self):
+        await self.play_in_new_room()
+
+    async def play_in_new_room(self):
+        journal.journal = StaleJournal()
+        player, opponent = await self.start_match()
+        self.assertEqual(len(player.cards), 3)
+        self.assertEqual(len(opponent.cards), 3)
+        await player.leave()
+        await opponent.leave()
+
+
+class ResumeTests(MatchConsumerTestCase):
+
+    async def reconnect(self, player: ScriptedPlayer,
+                        **kwargs) -> WebsocketCommunicator:
+        await player.leave()
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/pericon/match/{self.room_name}/?v=2&ticket={player.ticket}",
+            **kwargs
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_json_resume(self):
+        player, opponent = await self.start_match()
+        communicator = await self.reconnect(player)
+        await communicator.send_to(text_data=json.dumps({
+            "type": "resume", "value": {"username": player.username, "seq": 0}
+        }))
+
+        # The journal has no events: a snapshot of the room
+        message = json.loads(await communicator.receive_from())
+        self.assertEqual(message["type"], "snapshot")
+        self.assertEqual(message["seq"], 2)
+        self.assertEqual(message["value"]["round cards"], player.cards)
+        await communicator.disconnect()
+        await opponent.leave()
+
+    async def test_binary_resume(self):
+        player, opponent = await self.start_match()
+        communicator = await self.reconnect(
+            player, subprotocols=[BINARY_SUBPROTOCOL]
+        )
+        await communicator.send_to(
+            bytes_data=bytes((5,)) + SEQ_FORMAT.pack(0) + player.username.encode()
+        )
+
+        frame = await communicator.receive_from()
+        self.assertIsInstance(frame, bytes)
+        self.assertEqual(frame[0], FRAME_CODES["send.snapshot"] | SEQ_FLAG)
+        self.assertEqual(SEQ_FORMAT.unpack_from(frame, 1), (2,))
+        await communicator.disconnect()
+        await opponent.leave()
+
+
+class IllegalMoveTests(MatchConsumerTestCase):
+
+    def illegal_count(self) -> float:
+        key = (("consumer", "match"), ("reason", "illegal"))
+        return REJECTED.values.get(key, 0)
+
+    async def assert_rejected(self, player: ScriptedPlayer, card: str):
+        rejected = self.illegal_count()
+        await player.send("use card", card)
+        message = await player.receive_until({"error"})
+        self.assertEqual(message["value"], "Movimiento no válido")
+        self.assertEqual(self.illegal_count(), rejected + 1)
+
+    async def test_card_not_in_hand(self):
+        player, opponent = await self.start_match()
+        card = next(card for card in CARDS if card not in player.cards)
+        await self.assert_rejected(player, card)
+
+        # The player can still play
+        await player.send("use card", player.cards.pop(0))
+        await opponent.send("use card", opponent.cards.pop(0))
+        await player.receive_until({"turn result"})
+        await player.leave()
+        await opponent.leave()
+
+    async def test_two_cards_in_a_turn(self):
+        player, opponent = await self.start_match()
+        await player.send("use card", player.cards.pop(0))
+        await self.assert_rejected(player, player.cards[0])
+        await player.leave()
+        await opponent.leave()
+
+    async def test_alone_in_the_room(self):
+        player = ScriptedPlayer(self.application, "alone", 2)
+        room_name = "aloneroom"
+        player.ticket = issue_ticket(room_name, "alone")
+        await player.join(room_name)
+        await self.assert_rejected(player, player.cards[0])
+        await player.leave()
+
+    async def test_card_before_username(self):
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/pericon/match/early/?v=2&ticket={issue_ticket('early', 'early')}"
+        )
+        await communicator.connect()
+        rejected = self.illegal_count()
+        await communicator.send_to(text_data=json.dumps({
+            "type": "use card", "value": CARDS[0]
+        }))
+        message = json.loads(await communicator.receive_from())
+        self.assertEqual(message["type"], "error")
+        self.assertEqual(self.illegal_count(), rejected + 1)
+        await communicator.disconnect()
+        self.assertEqual(admission.open_sockets, 0)
+
+    async def test_card_after_the_game(self):
+        player, opponent = await self.start_match()
+        await rooms.get_room_registry().finish(self.room_name)
+
+        # The state of finished rooms left the store
+        for message_type in ("use card", "middle card"):
+            await player.send(message_type, player.cards[0])
+            message = await player.receive_until({"error"})
+            self.assertEqual(message["value"], "La partida terminó")
+        await player.leave()
+        await opponent.leave()
+
+
+class ConsumerFailureTests(MatchConsumerTestCase):
+
+    async def test_failed_consumer_releases_its_socket(self):
+        player, opponent = await self.start_match()
+        self.assertEqual(admission.open_sockets, 2)
+
+        with mock.patch(
+            "match.consumers.MatchConsumer.__handle_message__",
+            side_effect=RuntimeError("handler failed"),
+        ):
+            await player.send("use card", player.cards.pop(0))
+            with self.assertRaises(RuntimeError):
+                await player.communicator.wait(1)
+
+        self.assertEqual(admission.open_sockets, 1)
+        await opponent.leave()
+        self.assertEqual(admission.open_sockets, 0)
+        self.assertEqual(consumers.room_sockets, {})
+
+    async def test_rejected_handshake(self):
+        # A ticket of another room
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/pericon/match/early/?v=2&ticket={issue_ticket('other', 'early')}"
+        )
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+        await communicator.disconnect()
+        self.assertEqual(admission.open_sockets, 0)
+        self.assertEqual(consumers.vacant_seats, {})
@@ -0,0 +1,86 @@
+import json
+
+from django.test import SimpleTestCase
+
+from match.consumers import MatchConsumer
+from match.frames import with_frames
+from match.state import card_code
+
+TURN_RESULT = {
+    "type": "send.turn_result",
+    "value": [
+        {"type": "send.turn_played_cards", "value": [
+            {"player": "ana", "card": card_code("1 gold")},
+            {"player": "bob", "card": card_code("7 cups")},
+        ]},
+        {"type": "send.round_winner", "value": "ana"},
+        {"type": "send.points", "value": [
+            {"player": "ana", "points": 1}, {"player": "bob", "points": 0},
+        ]},
+    ],
+    "middle_card": card_code("4 swords"),
+}
+
+
+class TurnResultFramesTests(SimpleTestCase):
+
+    async def frames(self, version: int, event: dict) -> list[dict]:
+        """ Frames sent by a consumer of the protocol version for the event """
+
+        consumer = MatchConsumer()
+        consumer.protocol_version = version
+        consumer.username = None
+        frames = []
+
+        async def send(text_data=None, bytes_data=None, close=False):
+            frames.append(json.loads(text_data))
+
+        consumer.send = send
+        await consumer.send_turn_result(event)
+        return frames
+
+    async def test_version_1_gets_a_frame_per_event(self):
+        frames = await self.frames(1, TURN_RESULT)
+        self.assertEqual(
+            [frame["type"] for frame in frames],
+            ["turn played cards", "round winner", "points"]
+        )
+        self.assertEqual(
+            frames[0]["value"],
+            [{"player": "ana", "card": "1 gold"}, {"player": "bob", "card": "7 cups"}]
+        )
+
+    async def test_version_2_gets_one_turn_result(self):
+        frames = await self.frames(2, TURN_RESULT)
+        self.assertEqual(frames, [{
+            "type": "turn result",
+            "value": {
+                "turn played cards": [
+                    {"player": "ana", "card": "1 gold"},
+                    {"player": "bob", "card": "7 cups"},
+                ],
+                "round winner": "ana",
+                "points": [
+                    {"player": "ana", "points": 1}, {"player": "bob", "points": 0},
+                ],
+                "middle card": "4 swords",
+            },
+        }])
+
+    async def test_published_frames(self):
+        # Frames encoded by the publisher are forwarded unchanged
+        event = with_frames(TURN_RESULT)
+        self.assertNotIn("value", event)
+        for version in (1, 2):
+            self.assertEqual(
+                await self.frames(version, event),
+                await self.frames(version, TURN_RESULT)
+            )
+
+    def test_other_events_share_their_frames(self):
+        event = with_frames({"type": "send.middile_card", "value": card_code("4 swords")})
+        self.assertIs(event["frames"][0], event["frames"][1])
+        self.assertEqual(
+            json.loads(event["frames"][0][0]),
+            {"type": "middle card", "value": "4 swords"}
+        )
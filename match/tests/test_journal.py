@@ -0,0 +1,80 @@
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from match.game import init_room
+from match.journal import SegmentFileJournal, apply_message
+
+
+def play(moves: list[tuple[str, str, object]]) -> list[dict]:
+    """ Journal events of the moves (player, message type, value) in a new
+    room """
+
+    room_data, _ = init_room(None)
+    events = []
+    for username, message_type, message_value in moves:
+        room_data, (_, _, message_events) = apply_message(
+            room_data, username, message_type, message_value
+        )
+        events.extend(message_events)
+    return events
+
+
+JOINS = [("ana", "username", "ana"), ("bob", "username", "bob")]
+
+
+@override_settings(ROOM_IDLE_SECONDS=600)
+class SegmentFileJournalTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = SegmentFileJournal(
+            directory.name, segment_bytes=1, max_segments=1
+        )
+
+    async def test_replay(self):
+        await self.journal.write_batch([("room_a", event) for event in play(JOINS)])
+        room_data = await self.journal.replay("room_a")
+        self.assertEqual(room_data.usernames(), ["ana", "bob"])
+        self.assertIsNone(await self.journal.replay("room_b"))
+
+    async def test_replay_buffered_events(self):
+        # Events not written yet are replayed too
+        events = play(JOINS)
+        await self.journal.write_batch([("room_a", events[0])])
+        self.journal.buffer.append(("room_a", events[1]))
+
+        room_data = await self.journal.replay("room_a")
+        self.assertEqual(room_data.usernames(), ["ana", "bob"])
+        self.assertEqual(room_data.seq, 2)
+
+    async def test_retention_keeps_unfinished_rooms(self):
+        # A segment per batch, the first one has the only events of room_a
+        events = play(JOINS)
+        await self.journal.write_batch([("room_a", events[0])])
+        await self.journal.write_batch([("room_a", events[1])])
+        for _ in range(3):
+            await self.journal.write_batch([("room_b", play(JOINS)[0])])
+        self.assertEqual(len(self.journal.segments()), 5)
+
+        room_data = await self.journal.replay("room_a")
+        self.assertEqual(room_data.usernames(), ["ana", "bob"])
+
+    async def test_retention_removes_expired_rooms(self):
+        await self.journal.write_batch([("room_a", play(JOINS)[0])])
+        with override_settings(ROOM_IDLE_SECONDS=-1):
+            for _ in range(3):
+                await self.journal.write_batch([("room_b", play(JOINS)[0])])
+        self.assertEqual(len(self.journal.segments()), 1)
+        self.assertEqual(list(self.journal.index), ["room_b"])
+
+    async def test_truncated_journal(self):
+        # The first join was removed: the room can not be replayed
+        events = play(JOINS)
+        await self.journal.write_batch([("room_a", events[1])])
+        with self.assertLogs("match.journal", "WARNING"):
+            self.assertIsNone(await self.journal.replay("room_a"))
+        self.assertEqual(
+            await self.journal.missed_messages("room_a", "bob", 0), (0, [])
+        )
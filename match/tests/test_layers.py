@@ -0,0 +1,75 @@
+import asyncio
+
+from unittest import mock
+
+from channels.exceptions import ChannelFull
+from channels_redis.core import RedisChannelLayer
+from django.test import SimpleTestCase
+
+from match.layers import HybridChannelLayer
+
+
+class HybridChannelLayerTests(SimpleTestCase):
+    """ Local routes of the layer, with the Redis calls mocked """
+
+    def setUp(self):
+        self.layer = HybridChannelLayer(hosts=[("localhost", 6379)], capacity=2)
+        self.redis = mock.Mock()
+        self.layer.connection = mock.Mock(return_value=self.redis)
+
+    async def local_channels(self, group: str, count: int) -> list[str]:
+        """ Channels of this process in a group, without Redis """
+
+        channels = [await self.layer.new_channel() for _ in range(count)]
+        for channel in channels:
+            self.layer.inbox(channel)
+            self.layer.local_groups.setdefault(group, set()).add(channel)
+            self.layer.channel_groups.setdefault(channel, set()).add(group)
+        return channels
+
+    async def test_local_group_send(self):
+        channels = await self.local_channels("room_abcdef", 2)
+        self.redis.zcard = mock.AsyncMock(return_value=2)
+        message = {"type": "send.points", "frames": [["{}"]]}
+
+        with mock.patch.object(RedisChannelLayer, "group_send") as group_send:
+            await self.layer.group_send("room_abcdef", message)
+        group_send.assert_not_called()
+
+        # The same message object reaches every local member
+        for channel in channels:
+            self.assertIs(self.layer.inboxes[channel].get_nowait(), message)
+
+    async def test_mixed_group_goes_through_redis(self):
+        channels = await self.local_channels("room_abcdef", 1)
+        self.redis.zcard = mock.AsyncMock(return_value=2)
+        message = {"type": "send.points"}
+
+        with mock.patch.object(
+            RedisChannelLayer, "group_send", new_callable=mock.AsyncMock
+        ) as group_send:
+            await self.layer.group_send("room_abcdef", message)
+        group_send.assert_awaited_once_with("room_abcdef", message)
+        self.assertTrue(self.layer.inboxes[channels[0]].empty())
+
+    async def test_local_send_and_receive(self):
+        channel, = await self.local_channels("room_abcdef", 1)
+        await self.layer.send(channel, {"type": "a"})
+        await self.layer.send(channel, {"type": "b"})
+        with self.assertRaises(ChannelFull):
+            await self.layer.send(channel, {"type": "c"})
+
+        # Nothing arrives from Redis: only the local messages are received
+        redis_receive = mock.AsyncMock(side_effect=asyncio.Event().wait)
+        with mock.patch.object(RedisChannelLayer, "receive", redis_receive):
+            self.assertEqual(await self.layer.receive(channel), {"type": "a"})
+            self.assertEqual(await self.layer.receive(channel), {"type": "b"})
+
+            # A consumer that stops closes its channel
+            receive = asyncio.create_task(self.layer.receive(channel))
+            await asyncio.sleep(0)
+            receive.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await receive
+        self.assertEqual(self.layer.inboxes, {})
+        self.assertEqual(self.layer.local_groups, {})
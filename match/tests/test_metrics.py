@@ -0,0 +1,38 @@
+from django.test import SimpleTestCase
+
+from match.metrics import Counter, Gauge, Histogram, Registry
+
+
+class MetricsTests(SimpleTestCase):
+
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        sends = registry.register(Counter("sends_total", "Group sends"))
+        depth = registry.register(Gauge("queue_depth", "Queue depth"))
+        sends.inc(type="send.points")
+        sends.inc(2, type="send.points")
+        depth.set(3)
+        depth.dec()
+
+        self.assertEqual(registry.render(), "\n".join([
+            "# HELP sends_total Group sends",
+            "# TYPE sends_total counter",
+            'sends_total{type="send.points"} 3',
+            "# HELP queue_depth Queue depth",
+            "# TYPE queue_depth gauge",
+            "queue_depth 2",
+        ]) + "\n")
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("seconds", "Seconds", buckets=(0.1, 1))
+        histogram.observe(0.05, type="use card")
+        histogram.observe(0.5, type="use card")
+        histogram.observe(5, type="use card")
+
+        self.assertEqual(histogram.render()[2:], [
+            'seconds_bucket{type="use card",le="0.1"} 1',
+            'seconds_bucket{type="use card",le="1"} 2',
+            'seconds_bucket{type="use card",le="+Inf"} 3',
+            'seconds_count{type="use card"} 3',
+            'seconds_sum{type="use card"} 5.55',
+        ])
@@ -0,0 +1,52 @@
+import sys
+import tempfile
+
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from match.profiling import RoomProfiler, StackSampler
+
+
+class StackSamplerTests(SimpleTestCase):
+
+    def test_collapsed_stacks(self):
+        sampler = StackSampler(0.01)
+
+        def leaf():
+            sampler.sample(0, sys._getframe())
+
+        leaf()
+        leaf()
+        (stack, count), = sampler.stacks.items()
+        self.assertEqual(count, 2)
+        self.assertTrue(stack.endswith(
+            "match/tests/test_profiling.py:StackSamplerTests.test_collapsed_stacks.<locals>.leaf"
+        ))
+        self.assertEqual(sampler.collapsed(), f"{stack} 2\n")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "profile" / "rooms.collapsed"
+            sampler.write(path)
+            self.assertEqual(path.read_text(), f"{stack} 2\n")
+
+
+class RoomProfilerTests(SimpleTestCase):
+
+    @override_settings(PROFILE_ROOM_RATE=0.5)
+    def test_stable_fraction_of_rooms(self):
+        profiler = RoomProfiler()
+        names = [f"room{number}" for number in range(1000)]
+        profiled = [name for name in names if profiler.profiled(name)]
+        self.assertTrue(350 < len(profiled) < 650)
+        self.assertEqual(profiled, [name for name in names if profiler.profiled(name)])
+
+    @override_settings(PROFILE_ROOM_RATE=0)
+    def test_samples_only_while_handling(self):
+        profiler = RoomProfiler()
+        profiler.threshold = 2 ** 32
+        profiler.running = True
+        self.assertFalse(profiler.should_sample())
+        with profiler.handling("abcdef"):
+            self.assertTrue(profiler.should_sample())
+        self.assertFalse(profiler.should_sample())
@@ -0,0 +1,81 @@
+from django.test import SimpleTestCase, override_settings
+
+from match.queues import MatchmakingPool, MemoryMatchmakingQueue, QueueEntry
+
+
+def entry(channel_name: str, rating: int, region: str = "eu",
+          queued_at: float = 0, last_seen: float = 0) -> QueueEntry:
+    return QueueEntry(
+        channel_name, rating, region, queued_at, last_seen, channel_name
+    )
+
+
+@override_settings(
+    MATCHMAKING_RATING_WINDOW=100, MATCHMAKING_WINDOW_GROWTH=10,
+    MATCHMAKING_MAX_WAIT_SECONDS=60, MATCHMAKING_BOT_SECONDS=0,
+)
+class MatchmakingPoolTests(SimpleTestCase):
+
+    def pool(self, *entries: QueueEntry) -> MatchmakingPool:
+        pool = MatchmakingPool()
+        for queue_entry in entries:
+            pool.add(queue_entry)
+        return pool
+
+    def channel_pairs(self, pairs: list) -> list[tuple[str, str]]:
+        return [(first.channel_name, second.channel_name) for first, second in pairs]
+
+    def test_pairs_the_closest_rating(self):
+        pool = self.pool(entry("a", 1000), entry("b", 1300), entry("c", 1050))
+        pairs, expired, stale = pool.pop_pairs(1, 30)
+        self.assertEqual(self.channel_pairs(pairs), [("a", "c")])
+        self.assertEqual((expired, stale), ([], []))
+        self.assertEqual(list(pool.entries), ["b"])
+
+    def test_window_widens_with_the_wait(self):
+        pool = self.pool(entry("a", 1000), entry("b", 1150))
+        self.assertEqual(pool.pop_pairs(1, 30)[0], [])
+        pairs, _, _ = pool.pop_pairs(10, 30)
+        self.assertEqual(self.channel_pairs(pairs), [("a", "b")])
+
+    def test_regions(self):
+        pool = self.pool(entry("a", 1000, "eu"), entry("b", 1000, "us"))
+        self.assertEqual(pool.pop_pairs(1, 100)[0], [])
+
+        # After the max wait, any region and rating
+        pairs, _, _ = pool.pop_pairs(60, 100)
+        self.assertEqual(self.channel_pairs(pairs), [("a", "b")])
+
+    def test_max_wait_without_opponents(self):
+        pool = self.pool(entry("a", 1000))
+        self.assertEqual(pool.pop_pairs(60, 100), ([], ["a"], []))
+        self.assertEqual(pool.entries, {})
+
+    @override_settings(MATCHMAKING_BOT_SECONDS=5)
+    def test_bot_wait(self):
+        pool = self.pool(entry("a", 1000), entry("b", 2000))
+        self.assertEqual(pool.pop_pairs(10, 30), ([], ["a", "b"], []))
+
+    def test_stale_entries(self):
+        pool = self.pool(entry("a", 1000), entry("b", 1000, last_seen=50))
+        self.assertEqual(pool.pop_pairs(40, 30), ([], [], ["a"]))
+        self.assertEqual(list(pool.entries), ["b"])
+
+
+class MemoryMatchmakingQueueTests(SimpleTestCase):
+
+    async def test_push_and_cancel(self):
+        queue = MemoryMatchmakingQueue()
+        await queue.push("a", 1000, "eu", "ana")
+        await queue.push("b", 1000, "eu", "bob")
+        await queue.push("c", 1000, "eu", "carla")
+        await queue.cancel("c")
+        self.assertEqual(await queue.size(), 2)
+
+        pairs, expired = await queue.pop_pairs()
+        self.assertEqual(
+            [(first.username, second.username) for first, second in pairs],
+            [("ana", "bob")]
+        )
+        self.assertEqual(expired, [])
+        self.assertEqual(await queue.size(), 0)
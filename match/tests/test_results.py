@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from match.metrics import CACHE_SECONDS
+from match.models import Match, PlayerStats
+from match.results import (
+    ResultsWriter, get_leaderboard, get_player_stats, update_leaderboard,
+)
+
+
+def usernames(leaderboard: list[dict]) -> list[str]:
+    return [stats["username"] for stats in leaderboard]
+
+
+def cache_operations(operation: str) -> int:
+    """ Cache operations observed by CACHE_SECONDS """
+
+    counts = CACHE_SECONDS.values.get((("operation", operation),))
+    return sum(counts[:-1]) if counts else 0
+
+
+@override_settings(LEADERBOARD_SIZE=2)
+class LeaderboardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        PlayerStats.objects.bulk_create([
+            PlayerStats(username="ana", games=3, wins=2, points=9),
+            PlayerStats(username="bob", games=3, wins=1, points=6),
+            PlayerStats(username="carla", games=3, wins=2, points=7),
+        ])
+
+    def test_cached_leaderboard(self):
+        gets, sets = cache_operations("get"), cache_operations("set")
+        leaderboard = get_leaderboard()
+        self.assertEqual(usernames(leaderboard), ["ana", "carla"])
+
+        # The second read only hits the cache
+        with self.assertNumQueries(0):
+            self.assertEqual(get_leaderboard(), leaderboard)
+        self.assertEqual(cache_operations("get"), gets + 2)
+        self.assertEqual(cache_operations("set"), sets + 1)
+
+    def test_player_stats(self):
+        self.assertEqual(get_player_stats("bob")["points"], 6)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_player_stats("bob")["points"], 6)
+        self.assertIsNone(get_player_stats("dan"))
+
+    def test_write_batch(self):
+        get_leaderboard()
+        event = {
+            "type": "game winner", "value": "bob", "round": 4,
+            "points": {"bob": 4, "bot-1": 1},
+        }
+        changed = ResultsWriter().write([("abcdef", event, timezone.now())])
+        self.assertEqual(
+            changed, [{"username": "bob", "games": 4, "wins": 2, "points": 10}]
+        )
+        self.assertEqual(Match.objects.get().winner, "bob")
+        self.assertFalse(PlayerStats.objects.filter(username="bot-1").exists())
+
+        # bob enters the cached leaderboard, with the stats of the batch
+        update_leaderboard(changed)
+        with self.assertNumQueries(0):
+            self.assertEqual(usernames(get_leaderboard()), ["bob", "ana"])
+            self.assertEqual(get_player_stats("bob")["games"], 4)
+
+    def test_results_of_several_writers(self):
+        get_leaderboard()
+
+        # Two processes save a game each: both results reach the leaderboard
+        for winner, loser in (("bob", "ana"), ("bob", "carla")):
+            event = {
+                "value": winner, "round": 2, "points": {winner: 3, loser: 1}
+            }
+            changed = ResultsWriter().write([("room", event, timezone.now())])
+            update_leaderboard(changed)
+
+        self.assertEqual(
+            [(stats["username"], stats["wins"]) for stats in get_leaderboard()],
+            [("bob", 3), ("ana", 2)]
+        )
+        self.assertEqual(get_player_stats("carla")["games"], 4)
@@ -0,0 +1,62 @@
+import json
+import tempfile
+
+from django.test import SimpleTestCase
+
+from match.frames import event_frames
+from match.game import init_room, snapshot
+from match.journal import SegmentFileJournal, apply_message
+from match.state import card_name, hand_cards
+
+
+class ResumeTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = SegmentFileJournal(directory.name)
+
+        # Both players joined and ana played a card
+        self.room_data, _ = init_room(None)
+        self.card = None
+        for username, message_type in (("ana", "username"), ("bob", "username"),
+                                       ("ana", "use card")):
+            if message_type == "use card":
+                self.card = hand_cards(self.room_data.player("ana").hand)[0]
+            self.room_data, (_, _, events) = apply_message(
+                self.room_data, username, message_type,
+                self.card if message_type == "use card" else username
+            )
+            self.journal.buffer.extend(("room", event) for event in events)
+
+    async def test_missed_messages(self):
+        last_seq, missed = await self.journal.missed_messages("room", "bob", 1)
+        self.assertEqual(last_seq, 3)
+
+        # bob's join (direct and room messages), not ana's card (no messages)
+        self.assertEqual(
+            [message["type"] for message in missed],
+            ["send.round_cards", "send.middile_card", "send_usernames"]
+        )
+        self.assertTrue(all(message["seq"] == 2 for message in missed))
+
+        self.assertEqual(
+            await self.journal.missed_messages("room", "bob", 3), (3, [])
+        )
+
+    def test_snapshot(self):
+        event = snapshot(self.room_data, "bob")
+        self.assertEqual(event["seq"], 3)
+
+        frame = json.loads(event_frames(event, 1)[0])
+        self.assertEqual(frame["type"], "snapshot")
+        self.assertEqual(frame["seq"], 3)
+        self.assertEqual(frame["value"]["usernames"], ["ana", "bob"])
+        self.assertEqual(
+            frame["value"]["round cards"],
+            [card_name(card) for card in hand_cards(self.room_data.player("bob").hand)]
+        )
+        self.assertEqual(
+            frame["value"]["turn played cards"],
+            [{"player": "ana", "card": card_name(self.card)}]
+        )
@@ -0,0 +1,61 @@
+from django.test import SimpleTestCase
+
+from match import store
+from match.rooms import (
+    ABANDONED, FINISHED, PLAYING, WAITING, MemoryRoomRegistry,
+    room_group_name, room_name,
+)
+from match.state import RoomState
+from match.store import MemoryRoomStateStore
+
+
+class RoomNameTests(SimpleTestCase):
+
+    def test_names_do_not_repeat(self):
+        names = [room_name(number) for number in range(10000)]
+        self.assertEqual(len(set(names)), len(names))
+        self.assertTrue(all(len(name) == 6 and name.isalpha() for name in names))
+
+
+class MemoryRoomRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        store.room_state_store = MemoryRoomStateStore()
+        self.addCleanup(setattr, store, "room_state_store", None)
+        self.registry = MemoryRoomRegistry(
+            max_rooms=3, idle_seconds=60, finished_seconds=10
+        )
+
+    async def test_lifecycle(self):
+        name = await self.registry.allocate()
+        self.assertEqual(await self.registry.state(name), WAITING)
+
+        await store.room_state_store.update(
+            room_group_name(name), lambda _: (RoomState(), None)
+        )
+        await self.registry.set_state(name, PLAYING)
+        await self.registry.finish(name)
+        self.assertIsNone(await store.room_state_store.get(room_group_name(name)))
+
+        # Finished rooms keep their state
+        await self.registry.set_state(name, ABANDONED)
+        self.assertEqual(await self.registry.state(name), FINISHED)
+
+    async def test_evict(self):
+        names = [await self.registry.allocate() for _ in range(3)]
+        await self.registry.set_state(names[0], PLAYING)
+        await self.registry.finish(names[2])
+
+        # Full: the finished room goes first
+        fourth = await self.registry.allocate()
+        self.assertIsNone(await self.registry.state(names[2]))
+        self.assertEqual(self.registry.size(), 3)
+
+        # Expired rooms, whatever the limit
+        evicted = await self.registry.evict(now=self.registry.rooms[WAITING][fourth] + 61)
+        self.assertEqual(sorted(evicted), sorted([names[0], names[1], fourth]))
+
+    async def test_names_after_a_restart(self):
+        # Each registry starts at a random point of the names
+        first, second = MemoryRoomRegistry(), MemoryRoomRegistry()
+        self.assertNotEqual(await first.allocate(), await second.allocate())
@@ -0,0 +1,66 @@
+import random
+
+from django.test import SimpleTestCase
+
+from match.rules import (
+    DRAW, FIRST_WINS, OUTCOMES, SECOND_WINS, Deck, card_strength,
+    compare_cards, turn_outcome,
+)
+from match.state import CARDS, card_code
+
+
+class OutcomeTests(SimpleTestCase):
+
+    def test_trump_beats_other_suits(self):
+        middle = card_code("4 gold")
+        self.assertEqual(
+            compare_cards(middle, card_code("1 gold"), card_code("12 swords")),
+            FIRST_WINS
+        )
+        self.assertEqual(
+            compare_cards(middle, card_code("12 cups"), card_code("2 gold")),
+            SECOND_WINS
+        )
+
+    def test_highest_number_wins(self):
+        middle = card_code("4 gold")
+        self.assertEqual(
+            compare_cards(middle, card_code("7 cups"), card_code("10 swords")),
+            SECOND_WINS
+        )
+        self.assertEqual(
+            compare_cards(middle, card_code("3 gold"), card_code("2 gold")),
+            FIRST_WINS
+        )
+        self.assertEqual(
+            compare_cards(middle, card_code("5 cups"), card_code("5 clubs")),
+            DRAW
+        )
+
+    def test_outcomes_table(self):
+        self.assertEqual(len(OUTCOMES), len(CARDS) ** 3)
+        rng = random.Random(0)
+        for _ in range(2000):
+            middle, first, second = (rng.randrange(len(CARDS)) for _ in range(3))
+            self.assertEqual(
+                turn_outcome(middle, first, second),
+                compare_cards(middle, first, second)
+            )
+
+    def test_card_strength(self):
+        middle = card_code("4 gold")
+        self.assertEqual(card_strength(middle, card_code("12 gold")), 39)
+        self.assertEqual(card_strength(middle, card_code("1 clubs")), 0)
+
+
+class DeckTests(SimpleTestCase):
+
+    def test_deals_every_card_once(self):
+        deck = Deck.shuffled(random.Random(0))
+        cards = deck.draw_many(3) + [deck.draw() for _ in range(37)]
+        self.assertEqual(sorted(cards), list(range(len(CARDS))))
+        self.assertEqual(len(deck), 0)
+        with self.assertRaises(IndexError):
+            deck.draw()
+        with self.assertRaises(IndexError):
+            deck.draw_many(1)
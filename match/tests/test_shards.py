@@ -0,0 +1,94 @@
+import tempfile
+
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from match import rooms
+from match.shards import HashRing, ShardMap, write_ring
+
+SHARDS = {
+    "worker0": "http://127.0.0.1:8001",
+    "worker1": "http://127.0.0.1:8002",
+}
+
+
+class HashRingTests(SimpleTestCase):
+
+    def test_new_shard_only_takes_rooms(self):
+        names = [rooms.room_name(number) for number in range(2000)]
+        ring = HashRing({"worker0": "", "worker1": ""})
+        bigger = HashRing({"worker0": "", "worker1": "", "worker2": ""})
+
+        moved = [name for name in names if ring.shard(name) != bigger.shard(name)]
+        self.assertTrue(moved)
+        self.assertTrue(all(bigger.shard(name) == "worker2" for name in moved))
+
+        # Each shard gets a fair share of the rooms
+        counts = [list(map(bigger.shard, names)).count(f"worker{index}")
+                  for index in range(3)]
+        self.assertTrue(all(count > len(names) / 6 for count in counts))
+
+
+@override_settings(SHARD_RELOAD_SECONDS=0)
+class ShardMapTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = str(Path(directory.name) / "shards.json")
+
+        rooms.room_registry = rooms.MemoryRoomRegistry()
+        self.addCleanup(setattr, rooms, "room_registry", None)
+
+    def room_of(self, shard: str, shards: dict[str, str]) -> str:
+        """ A room name of a shard in the ring of the shards """
+
+        ring = HashRing(shards)
+        return next(
+            name for name in map(rooms.room_name, range(1000))
+            if ring.shard(name) == shard
+        )
+
+    async def test_without_ring_file(self):
+        shard_map = ShardMap("", "worker0")
+        self.assertIsNone(await shard_map.pin("abcdef"))
+        self.assertIsNone(await shard_map.room_owner("abcdef"))
+        self.assertTrue(shard_map.is_local("abcdef"))
+
+    def test_ring_file_changes(self):
+        shard_map = ShardMap(self.path, "worker0")
+        self.assertTrue(shard_map.is_local("abcdef"))
+
+        write_ring(self.path, {"worker1": SHARDS["worker1"]})
+        self.assertEqual(shard_map.owner("abcdef"), ("worker1", SHARDS["worker1"]))
+        self.assertFalse(shard_map.is_local("abcdef"))
+
+    async def test_pinned_room_stays_when_a_shard_is_added(self):
+        shard_map = ShardMap(self.path, "worker0")
+        write_ring(self.path, {"worker0": SHARDS["worker0"]})
+        room = self.room_of("worker1", SHARDS)
+        self.assertEqual(await shard_map.pin(room), ("worker0", SHARDS["worker0"]))
+
+        write_ring(self.path, SHARDS)
+        self.assertEqual(shard_map.owner(room), ("worker1", SHARDS["worker1"]))
+        self.assertEqual(
+            await shard_map.room_owner(room), ("worker0", SHARDS["worker0"])
+        )
+
+    async def test_pinned_room_moves_when_its_shard_stops(self):
+        shard_map = ShardMap(self.path, "worker1")
+        write_ring(self.path, SHARDS)
+        room = self.room_of("worker1", SHARDS)
+        await shard_map.pin(room)
+
+        # Draining shards keep their rooms, until they stop
+        write_ring(self.path, {"worker0": SHARDS["worker0"]},
+                   {"worker1": SHARDS["worker1"]})
+        self.assertEqual(
+            await shard_map.room_owner(room), ("worker1", SHARDS["worker1"])
+        )
+        write_ring(self.path, {"worker0": SHARDS["worker0"]})
+        self.assertEqual(
+            await shard_map.room_owner(room), ("worker0", SHARDS["worker0"])
+        )
@@ -0,0 +1,45 @@
+import unittest
+
+from django.test import SimpleTestCase
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "simulate_games needs numpy (requirements-bench.txt)")
+class SimulatorTests(SimpleTestCase):
+
+    def test_games_reach_the_max_points(self):
+        from match.simulator import simulate_games
+
+        results = simulate_games(1000, 3, seed=0, batch_games=300)
+        rounds = results["rounds"]
+        self.assertEqual(rounds.shape, (1000,))
+
+        # Draws do not give points, so a game lasts at least max points rounds
+        self.assertGreaterEqual(rounds.min(), 3)
+        self.assertLessEqual(results["round_draws"], int((rounds - 3).sum()))
+
+    def test_same_seed_same_games(self):
+        from match.simulator import simulate_games
+
+        first = simulate_games(100, 3, seed=1)
+        second = simulate_games(100, 3, seed=1)
+        self.assertTrue(np.array_equal(first["rounds"], second["rounds"]))
+        self.assertEqual(first["turn_draws"], second["turn_draws"])
+
+    def test_messages_per_game(self):
+        from match.simulator import messages_per_game
+
+        # One round: 2 usernames and 3 turns of 2 cards
+        messages = messages_per_game(np.array([1]))
+        self.assertEqual(messages["inbound"].tolist(), [8])
+        self.assertEqual(messages["group_sends"].tolist(), [8])
+        self.assertEqual(messages["outbound"].tolist(), [18])
+
+        # Version 1 players get the turn events in separate frames
+        messages = messages_per_game(np.array([1]), protocol_version=1)
+        self.assertEqual(messages["group_sends"].tolist(), [8])
+        self.assertEqual(messages["outbound"].tolist(), [24])
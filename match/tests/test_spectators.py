@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+from django.test import SimpleTestCase, override_settings
+
+from match import rooms, spectators, store
+from match.game import init_room, join_room
+from match.rooms import room_group_name
+from match.spectators import unwatch_room, watch_room
+from match.store import MemoryRoomStateStore
+
+
+class FakeSpectator:
+    """ Spectator consumer that keeps the frames it is sent """
+
+    def __init__(self):
+        self.frames = []
+        self.closed = False
+
+    async def send(self, text_data=None, bytes_data=None):
+        self.frames.append(json.loads(text_data))
+
+    async def close(self, code=None):
+        self.closed = True
+
+
+@override_settings(SPECTATOR_TICK_SECONDS=0.01)
+class RoomBroadcastTests(SimpleTestCase):
+
+    def setUp(self):
+        store.room_state_store = MemoryRoomStateStore()
+        self.addCleanup(setattr, store, "room_state_store", None)
+        rooms.room_registry = rooms.MemoryRoomRegistry()
+        self.addCleanup(setattr, rooms, "room_registry", None)
+
+    async def save_room(self, usernames: list[str]):
+        room_data, _ = init_room(None)
+        for username in usernames:
+            room_data, _ = join_room(room_data, username)
+            room_data.seq += 1
+        await store.room_state_store.update(
+            room_group_name("abcdef"), lambda _: (room_data, None)
+        )
+
+    async def test_snapshots_without_hands(self):
+        await self.save_room(["ana", "bob"])
+        first = FakeSpectator()
+        broadcast = await watch_room("abcdef", first)
+        await asyncio.sleep(0.05)
+
+        # One frame per change of the room
+        self.assertEqual(len(first.frames), 1)
+        frame = first.frames[0]
+        self.assertEqual((frame["type"], frame["seq"]), ("snapshot", 2))
+        self.assertEqual(frame["value"]["usernames"], ["ana", "bob"])
+        self.assertEqual(frame["value"]["round cards"], [])
+
+        # New spectators get the last frame at once
+        second = FakeSpectator()
+        self.assertIs(await watch_room("abcdef", second), broadcast)
+        self.assertEqual(second.frames, [frame])
+
+        unwatch_room(broadcast, first)
+        unwatch_room(broadcast, second)
+        self.assertEqual(spectators.broadcasts, {})
+
+    async def test_finished_game(self):
+        await self.save_room(["ana", "bob"])
+        spectator = FakeSpectator()
+        await watch_room("abcdef", spectator)
+        await asyncio.sleep(0.05)
+
+        await rooms.room_registry.finish("abcdef")
+        await asyncio.sleep(0.05)
+        self.assertEqual(spectator.frames[-1]["type"], "finished")
+        self.assertTrue(spectator.closed)
+        self.assertEqual(spectators.broadcasts, {})
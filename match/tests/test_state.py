@@ -0,0 +1,50 @@
+from django.test import SimpleTestCase
+
+from match.state import (
+    FORMAT_VERSION, NO_CARD, PlayerState, RoomState, card_code, card_name,
+    hand_cards, hand_mask,
+)
+
+
+class CardTests(SimpleTestCase):
+
+    def test_card_names(self):
+        self.assertEqual(card_name(card_code("10 swords")), "10 swords")
+        self.assertEqual(card_name(NO_CARD), "")
+        with self.assertRaises(KeyError):
+            card_code("13 gold")
+
+    def test_hand_masks(self):
+        self.assertEqual(hand_cards(hand_mask([39, 0, 17])), [0, 17, 39])
+        self.assertEqual(hand_cards(0), [])
+
+
+class RoomStateTests(SimpleTestCase):
+
+    def test_encode_decode(self):
+        room = RoomState(
+            players=[
+                PlayerState("ana", 1, 2, 5, True, hand_mask([1, 2]), hand_mask([5])),
+                PlayerState("bjørn", hand=hand_mask([39])),
+            ],
+            middle_card=12, turn=1, round=3, deck=bytearray([7, 8, 9]),
+            seed=2 ** 64 - 1, seq=42,
+        )
+        self.assertEqual(RoomState.decode(room.encode()), room)
+
+    def test_empty_room(self):
+        room = RoomState()
+        self.assertEqual(RoomState.decode(room.encode()), room)
+
+    def test_unknown_format_version(self):
+        data = bytearray(RoomState().encode())
+        data[0] = FORMAT_VERSION + 1
+        with self.assertRaises(ValueError):
+            RoomState.decode(bytes(data))
+
+    def test_player(self):
+        room = RoomState(players=[PlayerState("ana")])
+        self.assertEqual(room.player("ana").username, "ana")
+        self.assertEqual(room.usernames(), ["ana"])
+        with self.assertRaises(KeyError):
+            room.player("bob")
@@ -0,0 +1,58 @@
+from django.test import SimpleTestCase
+
+from match.state import PlayerState, RoomState
+from match.store import MemoryRoomStateStore, RoomStateConflict
+
+
+def add_player(username: str):
+    """ Mutation that adds a player to the room """
+
+    def mutate(state):
+        state = state or RoomState()
+        state.players.append(PlayerState(username))
+        return state, len(state.players)
+
+    return mutate
+
+
+class MemoryRoomStateStoreTests(SimpleTestCase):
+
+    async def test_update(self):
+        store = MemoryRoomStateStore()
+        self.assertIsNone(await store.get("room"))
+        self.assertEqual(await store.update("room", add_player("ana")), 1)
+        self.assertEqual(await store.update("room", add_player("bob")), 2)
+        self.assertEqual((await store.get("room")).usernames(), ["ana", "bob"])
+        self.assertEqual((await store.load("room"))[0], 2)
+
+        await store.delete("room")
+        self.assertIsNone(await store.get("room"))
+
+    async def test_update_retries_after_a_conflict(self):
+        store = MemoryRoomStateStore()
+        await store.update("room", add_player("ana"))
+        calls = []
+
+        def mutate(state):
+            # Another update saves a new version while this one runs
+            if not calls:
+                version, data = store.rooms["room"]
+                store.rooms["room"] = (version + 1, store.dumps(RoomState([PlayerState("bob")])))
+            calls.append(state)
+            return add_player("carla")(state)
+
+        self.assertEqual(await store.update("room", mutate), 2)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((await store.get("room")).usernames(), ["bob", "carla"])
+
+    async def test_too_many_conflicts(self):
+        store = MemoryRoomStateStore()
+        await store.update("room", add_player("ana"))
+
+        def mutate(state):
+            version, data = store.rooms["room"]
+            store.rooms["room"] = (version + 1, data)
+            return state, None
+
+        with self.assertRaises(RoomStateConflict):
+            await store.update("room", mutate)
@@ -0,0 +1,38 @@
+import os
+import unittest
+
+from django.test import SimpleTestCase
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+
+@unittest.skipIf(websockets is None, "swarm_match needs websockets (requirements-bench.txt)")
+class SwarmStatsTests(SimpleTestCase):
+
+    def test_summary(self):
+        from match.swarm import SwarmStats
+
+        stats = SwarmStats()
+        stats.turn_seconds = [0.003, 0.001, 0.002]
+        stats.games = 3
+        stats.errors["no match"] = 1
+
+        summary = stats.summary()
+        self.assertNotIn("connect", summary)
+        self.assertEqual(summary["turn"]["count"], 3)
+        self.assertAlmostEqual(summary["turn"]["max_ms"], 3)
+        self.assertEqual(summary["games"]["failed"], 1)
+        self.assertEqual(summary["games"]["error_rate"], 0.25)
+
+    @unittest.skipUnless(os.path.exists("/proc/self/stat"), "needs /proc")
+    def test_process_sampler(self):
+        from match.swarm import ProcessSampler
+
+        sampler = ProcessSampler([os.getpid(), 2 ** 22 + 1])
+        sum(range(10 ** 6))
+        cpu_percent, rss_bytes = sampler.sample()
+        self.assertGreaterEqual(cpu_percent, 0)
+        self.assertGreater(rss_bytes, 0)
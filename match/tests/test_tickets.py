@@ -0,0 +1,38 @@
+from django.test import SimpleTestCase, override_settings
+
+from match.tickets import TicketAuthMiddleware, issue_ticket, verify_ticket
+
+
+@override_settings(TICKET_SECRET="secret")
+class TicketTests(SimpleTestCase):
+
+    def test_verify(self):
+        ticket = issue_ticket("abcdef", "ana")
+        self.assertEqual(verify_ticket(ticket), ("abcdef", "ana"))
+
+    def test_expired(self):
+        self.assertIsNone(verify_ticket(issue_ticket("abcdef", "ana", -1)))
+
+    def test_forged(self):
+        payload, signature = issue_ticket("abcdef", "ana").split(".")
+        other_payload, _ = issue_ticket("abcdef", "bob").split(".")
+        self.assertIsNone(verify_ticket(f"{other_payload}.{signature}"))
+        with override_settings(TICKET_SECRET="other"):
+            self.assertIsNone(verify_ticket(f"{payload}.{signature}"))
+
+    def test_malformed(self):
+        self.assertIsNone(verify_ticket("ticket"))
+        self.assertIsNone(verify_ticket("a.b.c"))
+
+    async def test_middleware(self):
+        scopes = []
+
+        async def application(scope, receive, send):
+            scopes.append(scope)
+
+        middleware = TicketAuthMiddleware(application)
+        ticket = issue_ticket("abcdef", "ana")
+        await middleware({"query_string": f"v=2&ticket={ticket}".encode()}, None, None)
+        await middleware({"query_string": b"v=2"}, None, None)
+        self.assertEqual(scopes[0]["ticket"], ("abcdef", "ana"))
+        self.assertIsNone(scopes[1]["ticket"])
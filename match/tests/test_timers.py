@@ -0,0 +1,100 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from match.game import init_room
+from match.journal import apply_message
+from match.rules import card_strength
+from match.state import hand_cards
+from match.timers import WHEEL_SLOTS, TimerWheel
+
+
+class TimerWheelTests(SimpleTestCase):
+
+    async def test_timers_run_in_order(self):
+        wheel = TimerWheel(0.01)
+        fired = []
+        wheel.schedule(0.05, fired.append, "second")
+        wheel.schedule(0.02, fired.append, "first")
+        await asyncio.sleep(0.1)
+        self.assertEqual(fired, ["first", "second"])
+        self.assertEqual(len(wheel), 0)
+
+    async def test_cancelled_timer_does_not_run(self):
+        wheel = TimerWheel(0.01)
+        fired = []
+        timer = wheel.schedule(0.02, fired.append, "cancelled")
+        timer.cancel()
+        await asyncio.sleep(0.05)
+        self.assertEqual(fired, [])
+
+    async def test_schedule_while_the_wheel_sleeps(self):
+        # The task sleeps until the first timer: a timer scheduled meanwhile
+        # is due from the clock, not from the tick the wheel slept at
+        wheel = TimerWheel(0.01)
+        loop = asyncio.get_running_loop()
+        fired = {}
+        wheel.schedule(0.5, lambda: fired.setdefault("long", loop.time()))
+        await asyncio.sleep(0.2)
+        scheduled_at = loop.time()
+        wheel.schedule(0.1, lambda: fired.setdefault("short", loop.time()))
+        await asyncio.sleep(0.4)
+        self.assertGreaterEqual(fired["short"] - scheduled_at, 0.09)
+        self.assertIn("long", fired)
+
+    async def test_timers_beyond_the_first_level(self):
+        wheel = TimerWheel(0.001)
+        fired = []
+        wheel.schedule(WHEEL_SLOTS * 0.001 * 2, fired.append, "cascaded")
+        await asyncio.sleep(WHEEL_SLOTS * 0.001 * 2 + 0.05)
+        self.assertEqual(fired, ["cascaded"])
+
+    async def test_coroutine_callbacks_run_in_tasks(self):
+        wheel = TimerWheel(0.01)
+        fired = asyncio.Event()
+
+        async def callback():
+            fired.set()
+
+        wheel.schedule(0.01, callback)
+        await asyncio.wait_for(fired.wait(), 1)
+
+
+class TurnTimeoutTests(SimpleTestCase):
+
+    def setUp(self):
+        self.room_data, _ = init_room(None)
+        for username in ("ana", "bob"):
+            self.room_data, _ = apply_message(
+                self.room_data, username, "username", username
+            )
+
+    def test_timeout_plays_the_weakest_card(self):
+        hand = hand_cards(self.room_data.player("ana").hand)
+        weakest = min(
+            hand, key=lambda card: card_strength(self.room_data.middle_card, card)
+        )
+        room_data, (_, _, events) = apply_message(
+            self.room_data, "ana", "timeout", self.room_data.seq
+        )
+        self.assertEqual(events[0]["type"], "card")
+        self.assertEqual(events[0]["card"], weakest)
+        self.assertEqual(room_data.player("ana").current_card, weakest)
+
+        # ana already played: nothing to time out
+        self.assertEqual(
+            apply_message(room_data, "ana", "timeout", room_data.seq)[1],
+            ([], False, [])
+        )
+
+    def test_room_moved_since_the_deadline(self):
+        seq = self.room_data.seq
+        card = hand_cards(self.room_data.player("ana").hand)[0]
+        room_data, _ = apply_message(self.room_data, "ana", "use card", card)
+
+        # bob gets a new deadline instead of playing at once
+        _, (messages, _, events) = apply_message(room_data, "bob", "timeout", seq)
+        self.assertEqual(
+            messages, [(False, {"type": "turn.deadline", "seq": room_data.seq})]
+        )
+        self.assertEqual(events, [])
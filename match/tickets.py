@@ -0,0 +1,88 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from urllib.parse import parse_qs
+
+from django.conf import settings
+
+
+def ticket_signature(payload: bytes) -> bytes:
+    key = (settings.TICKET_SECRET or settings.SECRET_KEY).encode()
+    return hmac.new(key, payload, hashlib.sha256).digest()
+
+
+def encode_part(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def decode_part(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def issue_ticket(room_name: str, username: str, seconds: float = None) -> str:
+    """ Signed ticket that lets a player join a room
+
+    Args:
+        room_name (str): room name
+        username (str): username of the player in the room
+        seconds (float): validity, settings.TICKET_SECONDS by default
+
+    Returns:
+        str: url safe ticket
+    """
+
+    if seconds is None:
+        seconds = settings.TICKET_SECONDS
+    payload = json.dumps(
+        [room_name, username, int(time.time() + seconds)],
+        separators=(",", ":"),
+    ).encode()
+    return f"{encode_part(payload)}.{encode_part(ticket_signature(payload))}"
+
+
+def verify_ticket(ticket: str) -> tuple[str, str] | None:
+    """ Room and player of a ticket
+
+    Args:
+        ticket (str): ticket issued by issue_ticket
+
+    Returns:
+        tuple[str, str] | None: (room_name, username), None when the ticket
+        is malformed, forged or expired
+    """
+
+    try:
+        payload, signature = ticket.split(".")
+        payload = decode_part(payload)
+        signature = decode_part(signature)
+    except ValueError:
+        return None
+
+    if not hmac.compare_digest(signature, ticket_signature(payload)):
+        return None
+
+    room_name, username, expires_at = json.loads(payload)
+    if expires_at < time.time():
+        return None
+    return room_name, username
+
+
+class TicketAuthMiddleware:
+    """ Puts in scope["ticket"] the (room_name, username) of the "ticket"
+    query string parameter, or None without a valid one. Only checks the
+    signature: no database nor cache access """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        ticket = query.get("ticket", [None])[0]
+        scope = {
+            **scope,
+            "ticket": verify_ticket(ticket) if ticket else None,
+        }
+        return await self.inner(scope, receive, send)
@@ -0,0 +1,196 @@
+import asyncio
+import contextlib
+import inspect
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Slots of each wheel level, and levels: with 0.1 seconds ticks the levels
+# cover 6.4 seconds, 6.8 minutes, 7.3 hours and 19 days
+WHEEL_SLOTS = 64
+WHEEL_LEVELS = 4
+
+
+class Timer:
+    """ Callback scheduled in a TimerWheel, cancel it with cancel() """
+
+    __slots__ = ("due", "callback", "args", "slot")
+
+    def __init__(self, due: int, callback, args: tuple):
+        self.due = due
+        self.callback = callback
+        self.args = args
+        # Slot of the wheel that holds the timer, None once it ran
+        self.slot = None
+
+    def cancel(self):
+        if self.slot is not None:
+            del self.slot[self]
+            self.slot = None
+
+
+class TimerWheel:
+    """ Hierarchical timing wheel of the current process
+
+    Timers are kept in slots of settings.TIMER_TICK_SECONDS: a timer due in
+    less than WHEEL_SLOTS ticks is in the first level, where each slot is a
+    tick, the next levels have slots of WHEEL_SLOTS times the ticks of the
+    previous level. When a level completes a turn, the timers of its next
+    slot move down to the lower levels. Scheduling and cancelling are O(1)
+    (slots are dicts), and one task advances the wheel while there are
+    timers, instead of a sleeping task per timer. The task sleeps over the
+    ticks without timers due (waking up at least once per first level turn).
+
+    Callbacks run in the event loop, coroutine functions in a new task.
+    """
+
+    def __init__(self, tick_seconds: float = None):
+        self.tick_seconds = tick_seconds or settings.TIMER_TICK_SECONDS
+        self.levels = [
+            [{} for _ in range(WHEEL_SLOTS)] for _ in range(WHEEL_LEVELS)
+        ]
+        # Ticks since the wheel was created, and loop time of tick 0
+        self.current = 0
+        self.started = None
+        self.task = None
+        self.tasks = set()
+        # Tick the task sleeps until, and event that wakes it up earlier
+        self.wake_tick = 0
+        self.wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return sum(len(slot) for level in self.levels for slot in level)
+
+    def schedule(self, delay: float, callback, *args) -> Timer:
+        """ Run a callback after some seconds
+
+        Args:
+            delay (float): seconds, rounded up to the wheel ticks
+            callback: function or coroutine function
+            *args: callback arguments
+
+        Returns:
+            Timer: scheduled timer
+        """
+
+        loop = asyncio.get_running_loop()
+        if self.task is None:
+            self.started = loop.time() - self.current * self.tick_seconds
+
+        # The task may sleep over ticks without timers (the wheel did not
+        # advance to them yet): count the delay from the clock
+        ticks = max(1, -int(-delay // self.tick_seconds))
+        timer = Timer(max(self.current, self.clock_tick(loop)) + ticks, callback, args)
+        self.place(timer)
+
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        elif timer.due < self.wake_tick:
+            self.wakeup.set()
+        return timer
+
+    def clock_tick(self, loop: asyncio.AbstractEventLoop) -> int:
+        """ Tick of the loop clock, the wheel is at it or behind """
+        return int((loop.time() - self.started) / self.tick_seconds)
+
+    def place(self, timer: Timer):
+        """ Put a timer in the lowest level whose turn ends after it is due """
+
+        span = WHEEL_SLOTS
+        for level in self.levels:
+            if timer.due // span == self.current // span:
+                break
+            span *= WHEEL_SLOTS
+        else:
+            # Beyond the last level: run at the end of its turn
+            span //= WHEEL_SLOTS
+            timer.due = (self.current // span + 1) * span - 1
+        slot = level[(timer.due * WHEEL_SLOTS // span) % WHEEL_SLOTS]
+        slot[timer] = None
+        timer.slot = slot
+
+    def idle_ticks(self) -> int:
+        """ Ticks until the next one with timers due or moving down """
+
+        position = self.current % WHEEL_SLOTS
+        for ticks in range(1, WHEEL_SLOTS - position):
+            if self.levels[0][position + ticks]:
+                return ticks
+        return WHEEL_SLOTS - position
+
+    def advance(self):
+        """ Move the wheel one tick and run the timers due """
+
+        self.current += 1
+
+        # Levels that complete a turn move their next slot down
+        span = WHEEL_SLOTS
+        cascading = []
+        for level in self.levels[1:]:
+            if self.current % span:
+                break
+            cascading.append(level[(self.current // span) % WHEEL_SLOTS])
+            span *= WHEEL_SLOTS
+        for slot in reversed(cascading):
+            timers = list(slot)
+            slot.clear()
+            for timer in timers:
+                self.place(timer)
+
+        slot = self.levels[0][self.current % WHEEL_SLOTS]
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            timer.slot = None
+            self.fire(timer)
+
+    def fire(self, timer: Timer):
+        try:
+            result = timer.callback(*timer.args)
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self.tasks.add(task)
+                task.add_done_callback(self.done)
+        except Exception:
+            logger.exception("Timer %s failed", timer.callback)
+
+    def done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Timer task failed", exc_info=task.exception())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while len(self):
+                self.wake_tick = self.current + self.idle_ticks()
+                self.wakeup.clear()
+                delay = self.started + self.wake_tick * self.tick_seconds - loop.time()
+                if delay > 0:
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(self.wakeup.wait(), delay)
+
+                # Catch up with the clock
+                now = self.clock_tick(loop)
+                while self.current < now:
+                    self.advance()
+        finally:
+            self.task = None
+
+
+timer_wheel = None
+
+
+def get_timer_wheel() -> TimerWheel:
+    """ Get the timer wheel of the current process
+
+    Returns:
+        TimerWheel: timer wheel shared by the current process
+    """
+
+    global timer_wheel
+    if timer_wheel is None:
+        timer_wheel = TimerWheel()
+    return timer_wheel
@@ -7,4 +7,7 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("match/<str:room_name>/", views.room, name="room"),
     path('matchmaking/', views.matchmaking, name='matchmaking'),
+    path('metrics', views.metrics, name='metrics'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('stats/<str:username>/', views.player_stats, name='player_stats'),
 ]
\ No newline at end of file
@@ -1,5 +1,9 @@
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from .metrics import registry
+from .results import get_leaderboard, get_player_stats
+
 
 def index(request):
     return render(request, 'match/index.html')
@@ -10,4 +14,21 @@ def room(request, room_name):
 
 
 def matchmaking(request):
-    return render(request, "match/matchmaking.html")
\ No newline at end of file
+    return render(request, "match/matchmaking.html")
+
+
+def metrics(request):
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4"
+    )
+
+
+def leaderboard(request):
+    return JsonResponse({"players": get_leaderboard()})
+
+
+def player_stats(request, username):
+    stats = get_player_stats(username)
+    if stats is None:
+        raise Http404("Player without games")
+    return JsonResponse(stats)